@@ -0,0 +1,109 @@
+"""
+Quantifies tracking the eye points with optical flow between full shape predictions, on recorded clips.
+
+Every frame goes through the full predictor and through the flow backend. The flow backend's eye ratios are
+compared to the full ones, along with whether they agree on the eyes being closed, and what each costs per frame.
+
+    python -m benchmarks.eye_flow clip.mp4 [clip.mp4 ...] [--interval 5] [--threshold 6.5]
+"""
+import argparse
+import sys
+from time import perf_counter
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from controllers import DetectorBackend, DlibHogBackend, FlowEyeBackend
+from controllers.detector_backends import FLOW_PREDICT_INTERVAL, Detection
+from main import BLINK_DETECTION_RATIO
+from models import Eye, Face
+from utils import percentile
+
+
+def _ratio(detection: Detection) -> float:
+    face = Face(None, detection.face)
+    ratios = []
+    for eye_type, points in ((Eye.Type.LEFT, detection.left_eye), (Eye.Type.RIGHT, detection.right_eye)):
+        try:
+            ratios.append(Eye.get_from_points(None, face, eye_type, points).closeness_ratio)
+        except ZeroDivisionError:
+            ratios.append(float('inf'))  # fully closed
+
+    return sum(ratios) / 2
+
+
+def _run(backend: DetectorBackend, gray: np.ndarray) -> Tuple[Optional[float], float]:
+    """The average eye ratio of the frame, None without a face, and how long finding it took."""
+    started = perf_counter()
+    face = backend.locate_face(gray)
+    detection = backend.predict(gray, face) if face is not None else None
+    cost = perf_counter() - started
+
+    return (_ratio(detection) if detection else None), cost
+
+
+def compare(clip: str, interval: int, threshold: float) -> Dict[str, float]:
+    full, flow = DlibHogBackend(), FlowEyeBackend(DlibHogBackend(), interval)
+    full.load()
+    flow.load()
+
+    errors: List[float] = []
+    full_costs: List[float] = []
+    flow_costs: List[float] = []
+    agreed = compared = 0
+
+    capture_device = cv2.VideoCapture(clip)
+    frame = gray = filtered = None
+    while True:
+        successful, frame = capture_device.read(frame)
+        if not successful:
+            break
+
+        # same preprocessing as the live loop
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY, dst=gray)
+        filtered = cv2.bilateralFilter(gray, 5, 1, 1, dst=filtered)
+
+        full_ratio, full_cost = _run(full, filtered)
+        flow_ratio, flow_cost = _run(flow, filtered)
+        full_costs.append(full_cost)
+        flow_costs.append(flow_cost)
+
+        if full_ratio is None or flow_ratio is None:
+            continue
+
+        compared += 1
+        agreed += (full_ratio > threshold) == (flow_ratio > threshold)
+        if np.isfinite(full_ratio) and np.isfinite(flow_ratio):
+            errors.append(abs(flow_ratio - full_ratio))
+
+    capture_device.release()
+    if not compared:
+        sys.exit(f"No face was found in {clip}.")
+
+    return {
+        "frames": len(full_costs),
+        "tracked_share": flow.tracked_frames / max(flow.tracked_frames + flow.predicted_frames, 1),
+        "reanchored_frames": flow.reanchored_frames,
+        "ratio_error_mean": float(np.mean(errors)) if errors else 0.0,
+        "ratio_error_p95": percentile(errors, 95),
+        "closed_state_agreement": agreed / compared,
+        "full_cost_p50_ms": percentile(full_costs, 50) * 1000,
+        "flow_cost_p50_ms": percentile(flow_costs, 50) * 1000,
+        "full_cost_mean_ms": float(np.mean(full_costs)) * 1000,
+        "flow_cost_mean_ms": float(np.mean(flow_costs)) * 1000,
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('clips', nargs='+')
+    parser.add_argument('--interval', type=int, default=FLOW_PREDICT_INTERVAL, help="Frames between full predictions.")
+    parser.add_argument('--threshold', type=float, default=BLINK_DETECTION_RATIO)
+    args = parser.parse_args()
+
+    for clip in args.clips:
+        report = compare(clip, args.interval, args.threshold)
+        print(clip)
+        for key, value in report.items():
+            print(f"    {key}: {value:.3f}" if isinstance(value, float) else f"    {key}: {value}")
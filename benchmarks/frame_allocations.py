@@ -0,0 +1,109 @@
+"""
+Replays a clip through the camera loop, reading and processing each frame under tracemalloc, and fails when a frame
+allocates more than its budget or memory does not stay flat.
+
+    python -m benchmarks.frame_allocations clip.mp4 [--max-frame-bytes N]
+
+The budget is the most memory allocated and not yet freed at any point while one frame is read and processed.
+By default it is 1/64 of a BGR frame, less than the smallest image the loop works on (a quarter scale grayscale
+frame is 1/48), so any image-sized buffer allocated per frame fails it while detections and landmarks do not.
+"""
+import argparse
+import resource
+import sys
+import tracemalloc
+from typing import Dict, List, Optional
+
+from controllers import CameraControllerDlib, DetectorBackend, HaarBackend
+
+
+def rss_kb() -> int:
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * resource.getpagesize() // 1024
+
+
+def measure(clip: str, frames: int, warmup: int, backend: Optional[DetectorBackend] = None) -> Dict[str, int]:
+    camera = CameraControllerDlib(backend=backend or HaarBackend(), video_source=clip, show_preview=False)
+    camera.quality.level.backend.load()
+
+    # the buffers are allocated by the first frames
+    for _ in range(warmup):
+        if not camera._successfully_refreshed_frame():
+            sys.exit("The clip is shorter than the warm-up.")
+        camera.process_frame()
+
+    tracemalloc.start()
+    rss_before = rss_kb()
+    current_before, _ = tracemalloc.get_traced_memory()
+
+    worst_frame_peak = 0
+    processed = detected = 0
+    while processed < frames:
+        current, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+
+        # reading decodes into the frame buffer of the last read
+        if not camera._successfully_refreshed_frame():
+            break
+        camera.process_frame()
+
+        worst_frame_peak = max(worst_frame_peak, tracemalloc.get_traced_memory()[1] - current)
+        processed += 1
+        if camera._last_detection is not None:
+            detected += 1
+
+    current_after, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    camera.capture_device.release()
+
+    return {
+        "frames": processed,
+        "frames_with_eyes": detected,
+        "frame_bytes": camera.frame.nbytes,
+        "worst_frame_peak_bytes": worst_frame_peak,
+        "traced_growth_bytes": current_after - current_before,
+        "rss_growth_kb": rss_kb() - rss_before,
+    }
+
+
+def check(result: Dict[str, int], max_frame_bytes: Optional[int] = None, max_growth_per_frame: int = 1024,
+          max_rss_growth_kb: int = 4096) -> List[str]:
+    """The budgets `result` is over, none if it is within all of them."""
+    if not result["frames"]:
+        return ["no frame was processed"]
+
+    if max_frame_bytes is None:
+        max_frame_bytes = result["frame_bytes"] // 64
+
+    failures = []
+    if result["worst_frame_peak_bytes"] > max_frame_bytes:
+        failures.append(f"a frame allocated {result['worst_frame_peak_bytes']} bytes, "
+                        f"over its budget of {max_frame_bytes}")
+    if result["traced_growth_bytes"] > max_growth_per_frame * result["frames"]:
+        failures.append(f"traced memory grew by {result['traced_growth_bytes']} bytes")
+    if result["rss_growth_kb"] > max_rss_growth_kb:
+        failures.append(f"RSS grew by {result['rss_growth_kb']} KB")
+
+    return failures
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('clip')
+    parser.add_argument('--frames', type=int, default=500)
+    parser.add_argument('--warmup', type=int, default=30)
+    parser.add_argument('--max-frame-bytes', type=int, help="Per frame, 1/64 of a frame by default.")
+    # the timer keeps a few numbers per frame for its graph
+    parser.add_argument('--max-growth-per-frame', type=int, default=1024, help="In bytes.")
+    parser.add_argument('--max-rss-growth-kb', type=int, default=4096)
+    args = parser.parse_args()
+
+    result = measure(args.clip, args.frames, args.warmup)
+    for key, value in result.items():
+        print(f"{key}: {value}")
+
+    failures = check(result, args.max_frame_bytes, args.max_growth_per_frame, args.max_rss_growth_kb)
+    if failures:
+        sys.exit("FAILED: " + ", ".join(failures))
+
+    print("OK")
@@ -0,0 +1,154 @@
+"""
+Measures what the camera head-pose mode adds to a frame and how long a frame takes to move the cursor.
+
+Without a clip, only synthetic landmarks are used, to check the estimator's cost and accuracy.
+With a clip, the clip is replayed through the camera loop with the head pose moving a recording cursor.
+
+    python -m benchmarks.head_pose [clip.mp4]
+"""
+import argparse
+import math
+import sys
+from time import perf_counter
+from types import SimpleNamespace
+from typing import Dict, List
+
+import cv2
+import numpy as np
+
+from controllers import CameraControllerDlib, HeadPoseEstimator
+from controllers.head_pose import HEAD_MODEL_POINTS, HEAD_POSE_LANDMARKS, NO_DISTORTION
+from main import MainController
+from models.cursor_uinput import RecordingUInputDevice, UInputCursor
+from utils import TRACER, percentile
+
+FRAME_SIZE = (640, 480)
+
+
+class SyntheticLandmarks:
+    """Stands in for dlib's landmarks, with the model points projected at a known pose."""
+
+    def __init__(self, yaw: float, pitch: float) -> None:
+        width, height = FRAME_SIZE
+        camera_matrix = np.array([(width, 0, width / 2), (0, width, height / 2), (0, 0, 1)], dtype=np.float64)
+
+        # pitch around x, then yaw around y, the order the estimator reads them in
+        rotation = np.array([(math.cos(yaw), 0, math.sin(yaw)), (0, 1, 0), (-math.sin(yaw), 0, math.cos(yaw))]) \
+            @ np.array([(1, 0, 0), (0, math.cos(pitch), -math.sin(pitch)), (0, math.sin(pitch), math.cos(pitch))])
+        rvec, _ = cv2.Rodrigues(rotation)
+        points, _ = cv2.projectPoints(HEAD_MODEL_POINTS, rvec, np.array([0.0, 0.0, 1000.0]), camera_matrix,
+                                      NO_DISTORTION)
+
+        self._parts = {
+            index: SimpleNamespace(x=int(round(x)), y=int(round(y)))
+            for index, (x, y) in zip(HEAD_POSE_LANDMARKS, points.reshape(-1, 2))
+        }
+
+    def part(self, index: int) -> SimpleNamespace:
+        return self._parts[index]
+
+
+def measure_synthetic(frames: int) -> Dict[str, float]:
+    # the head sweeps slowly from side to side and up and down, like it would between frames
+    poses = [
+        (math.radians(25 * math.sin(i / 40)), math.radians(15 * math.sin(i / 55)))
+        for i in range(frames)
+    ]
+    landmarks = [SyntheticLandmarks(yaw, pitch) for yaw, pitch in poses]
+
+    estimator = HeadPoseEstimator()
+    costs, errors = [], []
+    failed = 0
+    for (yaw, pitch), points in zip(poses, landmarks):
+        started = perf_counter()
+        pose = estimator.estimate(points, FRAME_SIZE)
+        costs.append(perf_counter() - started)
+
+        # no solution, or one with the head behind the camera
+        if pose is None:
+            failed += 1
+            continue
+
+        estimated_yaw, estimated_pitch = pose
+        errors.append(max(abs(estimated_yaw - yaw), abs(estimated_pitch - pitch)))
+
+    return {
+        "estimate_p50_ms": percentile(costs, 50) * 1000,
+        "estimate_p95_ms": percentile(costs, 95) * 1000,
+        "failed_estimates": failed,
+        "max_error_degrees": math.degrees(max(errors, default=float('inf'))),
+    }
+
+
+def measure_clip(clip: str, frames: int) -> Dict[str, float]:
+    controller = MainController(cursor=UInputCursor(device=RecordingUInputDevice(), allow_external_movement=False),
+                                use_camera=False, use_sensor=False)
+
+    # from the frame being captured to the cursor having moved
+    latencies: List[float] = []
+
+    def handler(yaw: float, pitch: float) -> None:
+        controller.head_pose_handler(yaw, pitch)
+        latencies.append(perf_counter() - TRACER.captured_at)
+
+    camera = CameraControllerDlib(video_source=clip, show_preview=False, head_pose_callback=handler)
+    camera.load_models()
+
+    processed = 0
+    while processed < frames and camera._successfully_refreshed_frame():
+        camera.process_frame()
+        processed += 1
+    camera.capture_device.release()
+
+    # the timer keeps the last few thousand frames, more than are replayed here
+    head_pose: Dict[int, float] = dict(camera.timer._time_data.get("head_pose", ()))
+    total: Dict[int, float] = dict(camera.timer._time_data.get("total", ()))
+    if not head_pose:
+        sys.exit("No face was found in the clip.")
+
+    return {
+        "frames": processed,
+        "frames_with_pose": len(latencies),
+        "head_pose_p50_ms": percentile(head_pose.values(), 50) * 1000,
+        "head_pose_p95_ms": percentile(head_pose.values(), 95) * 1000,
+        "share_of_frame_percent": 100 * sum(head_pose.values()) / sum(total[frame] for frame in head_pose.keys()),
+        "motion_latency_p50_ms": percentile(latencies, 50) * 1000,
+        "motion_latency_p95_ms": percentile(latencies, 95) * 1000,
+    }
+
+
+def _print(title: str, result: Dict[str, float]) -> None:
+    print(title)
+    for key, value in result.items():
+        print(f"  {key}: {value:.3f}" if isinstance(value, float) else f"  {key}: {value}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('clip', nargs='?')
+    parser.add_argument('--frames', type=int, default=500)
+    parser.add_argument('--max-cost-ms', type=float, default=1.0, help="p95 cost of an estimate.")
+    parser.add_argument('--max-error-degrees', type=float, default=1.0)
+    args = parser.parse_args()
+
+    failures = []
+
+    synthetic = measure_synthetic(args.frames)
+    _print("synthetic landmarks", synthetic)
+    if synthetic["estimate_p95_ms"] > args.max_cost_ms:
+        failures.append("estimating the pose is too slow")
+    if synthetic["max_error_degrees"] > args.max_error_degrees:
+        failures.append("the estimated pose is off")
+    if synthetic["failed_estimates"]:
+        failures.append("some poses could not be estimated")
+
+    if args.clip:
+        clip = measure_clip(args.clip, args.frames)
+        _print(args.clip, clip)
+        if clip["head_pose_p95_ms"] > args.max_cost_ms:
+            failures.append("the head pose adds too much to a frame")
+
+    if failures:
+        sys.exit("FAILED: " + ", ".join(failures))
+
+    print("OK")
@@ -0,0 +1,67 @@
+"""
+Replays a clip through the low-cost camera loop and fails unless it keeps up with the clip's frame rate.
+
+    python -m benchmarks.low_cost clip.mp4 [--fps N]
+
+A frame keeps up when it is processed within one frame interval of the clip (or of --fps, for a camera that
+runs at a different rate than the clip was recorded at). The check is on the 95th percentile, so an
+occasional full search of the eyes may go over.
+"""
+import argparse
+import sys
+from typing import Dict, Optional
+
+import cv2
+
+from controllers import CameraControllerHaar
+from utils import percentile
+
+
+def measure(clip: str, frames: int, warmup: int, fps: Optional[float] = None) -> Dict[str, float]:
+    camera = CameraControllerHaar(video_source=clip, show_preview=False)
+    camera.load_models()
+    if not camera.open_device():
+        sys.exit(f"Could not open {clip}.")
+
+    fps = fps or camera.capture_device.get(cv2.CAP_PROP_FPS) or 30.0
+
+    processed = detected = 0
+    while processed < warmup + frames and camera._successfully_refreshed_frame():
+        camera.process_frame()
+        processed += 1
+        if processed > warmup and camera._last_detection is not None:
+            detected += 1
+    camera.capture_device.release()
+
+    # the timer keeps the last few thousand frames, more than are replayed here
+    total = [cost for frame, cost in camera.timer._time_data.get("total", ()) if frame > warmup]
+    if not total:
+        sys.exit("The clip is shorter than the warm-up.")
+
+    p95 = percentile(total, 95)
+    return {
+        "frames": len(total),
+        "frames_with_eyes": detected,
+        "frame_p50_ms": percentile(total, 50) * 1000,
+        "frame_p95_ms": p95 * 1000,
+        "frame_interval_ms": 1000 / fps,
+        "achievable_fps": 1 / p95 if p95 else float('inf'),
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('clip')
+    parser.add_argument('--frames', type=int, default=500)
+    parser.add_argument('--warmup', type=int, default=30)
+    parser.add_argument('--fps', type=float, help="The clip's own frame rate by default.")
+    args = parser.parse_args()
+
+    result = measure(args.clip, args.frames, args.warmup, args.fps)
+    for key, value in result.items():
+        print(f"{key}: {value:.3f}" if isinstance(value, float) else f"{key}: {value}")
+
+    if result["frame_p95_ms"] > result["frame_interval_ms"]:
+        sys.exit("FAILED: the low-cost camera does not keep up with the frame rate.")
+
+    print("OK")
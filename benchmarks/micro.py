@@ -0,0 +1,275 @@
+"""
+Micro-benchmarks of the per-frame and per-sample paths, with fake inputs and a recording cursor.
+
+Each benchmark's median time per call is divided by the median of a fixed calibration workload timed right
+before it, so the ratio says how slow the path is for this machine rather than in microseconds. Any benchmark whose
+ratio is over its threshold in micro_thresholds.json fails the run. The thresholds are kept in the repository and
+hold on any machine; after a deliberate change to a path, regenerate them:
+
+    python -m benchmarks.micro --update-thresholds 3.0  # thresholds = 3x the ratios measured now
+    python -m benchmarks.micro [-k name] [--json results.json]
+
+tests/test_micro_benchmarks.py runs the same checks with the other tests.
+"""
+import argparse
+import itertools
+import json
+import os
+import statistics
+import sys
+from time import perf_counter
+from typing import Callable, Dict, List, Optional, Tuple
+
+import dlib
+import numpy as np
+
+from controllers import CameraControllerDlib, LEFT_EYE_LANDMARKS, RIGHT_EYE_LANDMARKS
+from main import MainController
+from models import Eye, Face
+from models.cursor_recording import RecordingCursor
+from utils import TemporaryText
+
+THRESHOLDS_PATH = os.path.join(os.path.dirname(__file__), "micro_thresholds.json")
+FRAME_SHAPE = (480, 640, 3)
+
+# name -> setup, which returns the function to time
+BENCHMARKS: Dict[str, Callable[[], Callable[[], object]]] = {}
+
+
+def benchmark(name: str):
+    def decorator(setup: Callable[[], Callable[[], object]]):
+        BENCHMARKS[name] = setup
+        return setup
+
+    return decorator
+
+
+def _fake_landmarks(eyes_closed: bool = False) -> dlib.full_object_detection:
+    """68 landmarks of a face in the middle of the frame, only the eyes are where they would be."""
+    face = dlib.rectangle(220, 140, 420, 340)
+    points = [dlib.point(320, 240)] * 68
+
+    opening = 2 if eyes_closed else 8
+    for landmarks, x in ((LEFT_EYE_LANDMARKS, 260), (RIGHT_EYE_LANDMARKS, 340)):
+        outer, top1, top2, inner, bottom1, bottom2 = landmarks
+        points[outer] = dlib.point(x, 210)
+        points[top1] = dlib.point(x + 12, 210 - opening)
+        points[top2] = dlib.point(x + 28, 210 - opening)
+        points[inner] = dlib.point(x + 40, 210)
+        points[bottom1] = dlib.point(x + 28, 210 + opening)
+        points[bottom2] = dlib.point(x + 12, 210 + opening)
+
+    return dlib.full_object_detection(face, dlib.points(points))
+
+
+def _fake_eyes(image: np.ndarray, eyes_closed: bool) -> Tuple[Eye, Eye]:
+    landmarks = _fake_landmarks(eyes_closed)
+    face = Face.get_from_dlib_rectangle(image, landmarks.rect)
+
+    return (
+        Eye.get_from_dlib_landmarks(image, face, Eye.Type.LEFT, LEFT_EYE_LANDMARKS, landmarks),
+        Eye.get_from_dlib_landmarks(image, face, Eye.Type.RIGHT, RIGHT_EYE_LANDMARKS, landmarks),
+    )
+
+
+def _blinking_eyes() -> itertools.cycle:
+    """Open for 10 frames, closed for 4, over and over."""
+    image = np.zeros(FRAME_SHAPE, dtype=np.uint8)
+    open_eyes, closed_eyes = _fake_eyes(image, False), _fake_eyes(image, True)
+
+    return itertools.cycle([open_eyes] * 10 + [closed_eyes] * 4)
+
+
+def _controller() -> MainController:
+    return MainController(cursor=RecordingCursor(allow_external_movement=True), use_camera=False, use_sensor=False)
+
+
+@benchmark("eye_get_from_dlib_landmarks")
+def _():
+    image = np.zeros(FRAME_SHAPE, dtype=np.uint8)
+    landmarks = _fake_landmarks()
+    face = Face.get_from_dlib_rectangle(image, landmarks.rect)
+
+    return lambda: Eye.get_from_dlib_landmarks(image, face, Eye.Type.LEFT, LEFT_EYE_LANDMARKS, landmarks)
+
+
+@benchmark("eye_closeness_ratio")
+def _():
+    left_eye, _ = _fake_eyes(np.zeros(FRAME_SHAPE, dtype=np.uint8), False)
+
+    # skip the cache, every frame computes it once for a new eye
+    return lambda: Eye.closeness_ratio.func(left_eye)
+
+
+@benchmark("face_get_from_dlib_rectangle")
+def _():
+    image = np.zeros(FRAME_SHAPE, dtype=np.uint8)
+    rectangle = dlib.rectangle(220, 140, 420, 340)
+
+    return lambda: Face.get_from_dlib_rectangle(image, rectangle)
+
+
+@benchmark("sensor_data_handler")
+def _():
+    controller = _controller()
+    # a head slowly tilting back and forth, in g
+    samples = itertools.cycle([(i / 1000, -i / 2000) for i in range(-200, 200, 5)])
+
+    return lambda: controller.sensor_data_handler(*next(samples))
+
+
+@benchmark("state_driven_individual_blink_algorithm")
+def _():
+    controller, eyes = _controller(), _blinking_eyes()
+    return lambda: controller.state_driven_individual_blink_algorithm(*next(eyes))
+
+
+@benchmark("state_driven_double_blink_algorithm")
+def _():
+    controller, eyes = _controller(), _blinking_eyes()
+    return lambda: controller.state_driven_double_blink_algorithm(*next(eyes))
+
+
+@benchmark("event_driven_double_blink_algorithm")
+def _():
+    controller, eyes = _controller(), _blinking_eyes()
+    return lambda: controller.event_driven_double_blink_algorithm(*next(eyes))
+
+
+@benchmark("gesture_algorithm")
+def _():
+    controller, eyes = _controller(), _blinking_eyes()
+    return lambda: controller.gesture_algorithm(*next(eyes))
+
+
+@benchmark("draw_and_clean_temporary_texts")
+def _():
+    camera = CameraControllerDlib(show_preview=False)
+    camera.img = np.zeros(FRAME_SHAPE, dtype=np.uint8)
+
+    # what a double blink leaves on screen, plus one that has already expired every call
+    camera.temporary_texts = [TemporaryText("Double blink", duration_in_seconds=3600) for _ in range(2)]
+    expired = TemporaryText("Single blink", duration_in_seconds=-1)
+
+    def draw() -> None:
+        camera.temporary_texts.append(expired)
+        camera.draw_and_clean_temporary_texts()
+
+    return draw
+
+
+def _calibration() -> Callable[[], object]:
+    """The same kind of work as the benchmarked paths, a little arithmetic in Python and on small arrays."""
+    points = np.arange(12, dtype=np.float64).reshape(6, 2)
+
+    def work() -> float:
+        total = 0.0
+        for i in range(20):
+            total += (i * 3 % 7) / 2
+        return total + float(np.linalg.norm(points[1] - points[5])) + float(points[:, 0].mean())
+
+    return work
+
+
+def measure(function: Callable[[], object], rounds: int = 7, round_time: float = 0.05) -> Dict[str, float]:
+    """Times `function` in rounds of as many calls as fit in `round_time`, like pytest-benchmark does."""
+    # double the calls until a round takes long enough
+    calls = 1
+    while True:
+        started = perf_counter()
+        for _ in range(calls):
+            function()
+        if perf_counter() - started >= round_time:
+            break
+        calls *= 2
+
+    per_call: List[float] = []
+    for _ in range(rounds):
+        started = perf_counter()
+        for _ in range(calls):
+            function()
+        per_call.append((perf_counter() - started) / calls * 1e6)
+
+    return {
+        "min_us": min(per_call),
+        "median_us": statistics.median(per_call),
+        "max_us": max(per_call),
+        "calls_per_round": calls,
+    }
+
+
+def load_thresholds() -> Dict[str, float]:
+    try:
+        with open(THRESHOLDS_PATH) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def run(pattern: str = "", rounds: int = 7, thresholds: Optional[Dict[str, float]] = None,
+        verbose: bool = True) -> Tuple[Dict[str, Dict[str, float]], List[str]]:
+    """
+    Runs the benchmarks with `pattern` in their name, returns their results and the ones over their threshold.
+    Each result has its `ratio` to the calibration workload, which is what the thresholds are for.
+    """
+    thresholds = load_thresholds() if thresholds is None else thresholds
+    results: Dict[str, Dict[str, float]] = {}
+    failures = []
+
+    if verbose:
+        print(f"{'benchmark':<42} {'min us':>9} {'median us':>10} {'ratio':>8} {'threshold':>10}")
+    for name, setup in BENCHMARKS.items():
+        if pattern not in name:
+            continue
+
+        # timed next to the benchmark, so the machine is as busy for both
+        calibration_us = measure(_calibration(), rounds=rounds)["median_us"]
+        result = results[name] = measure(setup(), rounds=rounds)
+        result["calibration_us"] = calibration_us
+        result["ratio"] = result["median_us"] / calibration_us
+        threshold = thresholds.get(name)
+
+        failed = threshold is not None and result["ratio"] > threshold
+        if failed:
+            failures.append(name)
+
+        if verbose:
+            print(f"{name:<42} {result['min_us']:>9.2f} {result['median_us']:>10.2f} {result['ratio']:>8.2f} "
+                  f"{threshold if threshold is not None else '-':>10} {'SLOWER' if failed else ''}")
+
+    return results, failures
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-k', dest='pattern', default="", help="Only run benchmarks with this in their name.")
+    parser.add_argument('--rounds', type=int, default=7)
+    parser.add_argument('--json', help="Also write the results here.")
+    parser.add_argument('--update-thresholds', type=float, metavar='FACTOR',
+                        help="Set each threshold to FACTOR times the measured ratio instead of checking.")
+    args = parser.parse_args()
+
+    thresholds = load_thresholds()
+    results, failures = run(args.pattern, args.rounds, thresholds)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.update_thresholds:
+        thresholds.update({
+            name: round(result["ratio"] * args.update_thresholds, 2) for name, result in results.items()
+        })
+        with open(THRESHOLDS_PATH, "w") as f:
+            json.dump(thresholds, f, indent=2, sort_keys=True)
+            f.write("\n")
+
+        print(f"Updated {len(results)} thresholds in {THRESHOLDS_PATH}.")
+        sys.exit()
+
+    if not thresholds:
+        print(f"No thresholds in {THRESHOLDS_PATH} yet, generate them with --update-thresholds.")
+    if failures:
+        sys.exit("FAILED: slower than the threshold: " + ", ".join(failures))
+
+    print("OK")
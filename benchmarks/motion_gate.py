@@ -0,0 +1,102 @@
+"""
+Checks on recorded clips that reusing landmarks through the motion gate does not miss blinks.
+
+Each clip is replayed through the camera loop twice, inferring every frame and then with the gate.
+A blink is a run of frames whose average eye ratio is over the threshold. A blink of the first run is missed
+if no frame of it is closed in the second run. Fails if any blink is missed.
+
+    python -m benchmarks.motion_gate clip.mp4 [clip.mp4 ...] [--threshold 2.5] [--refresh 4]
+"""
+import argparse
+import sys
+import time
+from typing import Dict, List, Optional, Tuple
+
+from controllers import CameraControllerDlib
+from main import BLINK_DETECTION_RATIO, MOTION_GATE_REFRESH_FRAMES, MOTION_GATE_THRESHOLD
+from models import Eye
+from utils import MotionGate
+
+
+def replay(clip: str, motion_gate: Optional[MotionGate]) -> Tuple[Dict[int, float], int, float]:
+    """Returns the average eye ratio of every frame with a face, the number of frames and the CPU time spent."""
+    ratios: Dict[int, float] = {}
+
+    def record(left_eye: Eye, right_eye: Eye) -> None:
+        ratios[camera.frame_counter] = (left_eye.closeness_ratio + right_eye.closeness_ratio) / 2
+
+    camera = CameraControllerDlib(eye_callback=record, blink_threshold=BLINK_DETECTION_RATIO,
+                                  video_source=clip, show_preview=False, motion_gate=motion_gate)
+    camera.load_models()
+
+    started = time.process_time()
+    while camera.step():
+        pass
+    cpu_time = time.process_time() - started
+
+    camera.capture_device.release()
+    return ratios, camera.frame_counter, cpu_time
+
+
+def blinks(ratios: Dict[int, float], frames: int) -> List[Tuple[int, int]]:
+    """First and last frame of each run of closed frames."""
+    runs: List[Tuple[int, int]] = []
+    start = None
+    for frame in range(1, frames + 2):
+        closed = ratios.get(frame, 0.0) > BLINK_DETECTION_RATIO
+        if closed and start is None:
+            start = frame
+        elif not closed and start is not None:
+            runs.append((start, frame - 1))
+            start = None
+
+    return runs
+
+
+def compare(clip: str, threshold: float, refresh_interval: int) -> Dict[str, float]:
+    reference, frames, reference_cpu = replay(clip, None)
+    motion_gate = MotionGate(threshold, refresh_interval)
+    gated, _, gated_cpu = replay(clip, motion_gate)
+
+    expected = blinks(reference, frames)
+    delays, missed = [], 0
+    for start, end in expected:
+        closed = [frame for frame in range(start, end + 1) if gated.get(frame, 0.0) > BLINK_DETECTION_RATIO]
+        if closed:
+            delays.append(closed[0] - start)
+        else:
+            missed += 1
+
+    return {
+        "frames": frames,
+        "hit_rate": round(motion_gate.hit_rate, 3),
+        "forced_refreshes": motion_gate.refreshed_frames,
+        "estimated_cpu_saved_s": round(motion_gate.cpu_time_saved, 3),
+        "measured_cpu_saved_s": round(reference_cpu - gated_cpu, 3),
+        "blinks": len(expected),
+        "missed_blinks": missed,
+        "extra_blinks": max(0, len(blinks(gated, frames)) - len(expected) + missed),
+        "worst_blink_delay_frames": max(delays, default=0),
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('clips', nargs='+')
+    parser.add_argument('--threshold', type=float, default=MOTION_GATE_THRESHOLD)
+    parser.add_argument('--refresh', type=int, default=MOTION_GATE_REFRESH_FRAMES)
+    args = parser.parse_args()
+
+    missed_any = False
+    for clip in args.clips:
+        report = compare(clip, args.threshold, args.refresh)
+        missed_any |= report["missed_blinks"] > 0
+
+        print(clip)
+        for key, value in report.items():
+            print(f"    {key}: {value}")
+
+    if missed_any:
+        sys.exit("FAILED: the motion gate missed blinks.")
+
+    print("OK")
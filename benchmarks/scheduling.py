@@ -0,0 +1,136 @@
+"""
+Compares the jitter and tail latency of the sensor and camera paths under background CPU load,
+with default scheduling and with a scheduling profile.
+
+The sensor thread wakes up 100 times a second and moves a recording cursor, the camera thread filters
+a synthetic frame 30 times a second, while --load processes keep every core busy.
+
+    python -m benchmarks.scheduling [--seconds 20] [--load N] [--pin camera=1-3 --elevate sensor ...]
+
+Without --pin, --elevate or --opencv-threads the profile is the one run.py --realtime uses.
+Raising priorities needs CAP_SYS_NICE, without it only the placement is compared.
+"""
+import argparse
+import multiprocessing
+import os
+import threading
+from time import perf_counter, sleep
+from typing import Dict, List
+
+import cv2
+import numpy as np
+
+from main import MainController
+from models.cursor_recording import RecordingCursor
+from utils import SCHEDULING, parse_cpus, percentile
+
+SENSOR_INTERVAL_S = 0.01
+FRAME_INTERVAL_S = 1 / 30
+FRAME_SHAPE = (480, 640, 3)
+
+
+def _burn(stop: multiprocessing.Event) -> None:
+    while not stop.is_set():
+        sum(i * i for i in range(10000))
+
+
+def _sensor_loop(controller: MainController, stop: threading.Event, latencies: List[float]) -> None:
+    SCHEDULING.apply("sensor")
+
+    # a head slowly tilting back and forth, in g
+    samples = [(i / 1000, -i / 2000) for i in range(-200, 200, 5)]
+    due = perf_counter()
+    while not stop.is_set():
+        for x, y in samples:
+            due += SENSOR_INTERVAL_S
+            sleep(max(0.0, due - perf_counter()))
+
+            # from when the sample was due until the cursor has moved
+            controller.sensor_data_handler(x, y)
+            latencies.append(perf_counter() - due)
+
+
+def _camera_loop(stop: threading.Event, frame_times: List[float], lateness: List[float]) -> None:
+    SCHEDULING.apply("camera")
+
+    frame = np.random.randint(0, 255, FRAME_SHAPE, dtype=np.uint8)
+    gray = np.empty(FRAME_SHAPE[:2], dtype=np.uint8)
+    filtered = np.empty_like(gray)
+    small = np.empty((FRAME_SHAPE[0] // 4, FRAME_SHAPE[1] // 4), dtype=np.uint8)
+
+    due = perf_counter()
+    while not stop.is_set():
+        due += FRAME_INTERVAL_S
+        sleep(max(0.0, due - perf_counter()))
+
+        started = perf_counter()
+        lateness.append(started - due)
+        cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY, dst=gray)
+        cv2.bilateralFilter(gray, 5, 1, 1, dst=filtered)
+        cv2.resize(filtered, small.shape[::-1], dst=small, interpolation=cv2.INTER_AREA)
+        frame_times.append(perf_counter() - started)
+
+
+def measure(seconds: float, load: int) -> Dict[str, float]:
+    controller = MainController(cursor=RecordingCursor(allow_external_movement=True), use_camera=False,
+                                use_sensor=False)
+
+    stop_load = multiprocessing.Event()
+    burners = [multiprocessing.Process(target=_burn, args=(stop_load,), daemon=True) for _ in range(load)]
+    for burner in burners:
+        burner.start()
+
+    stop = threading.Event()
+    sensor_latencies: List[float] = []
+    frame_times: List[float] = []
+    frame_lateness: List[float] = []
+    threads = [
+        threading.Thread(target=_sensor_loop, args=(controller, stop, sensor_latencies)),
+        threading.Thread(target=_camera_loop, args=(stop, frame_times, frame_lateness)),
+    ]
+    for thread in threads:
+        thread.start()
+
+    sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    stop_load.set()
+    for burner in burners:
+        burner.join()
+
+    result = {}
+    for name, values in (("sensor_latency", sensor_latencies), ("frame_time", frame_times),
+                         ("frame_lateness", frame_lateness)):
+        result[f"{name}_p50_ms"] = percentile(values, 50) * 1000
+        result[f"{name}_p99_ms"] = percentile(values, 99) * 1000
+        result[f"{name}_max_ms"] = max(values, default=0.0) * 1000
+
+    return result
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--seconds', type=float, default=20.0, help="Per run.")
+    parser.add_argument('--load', type=int, default=os.cpu_count(), help="Busy background processes.")
+    parser.add_argument('--pin', action='append', default=[], metavar='STAGE=CPUS')
+    parser.add_argument('--elevate', action='append', default=[], metavar='STAGE')
+    parser.add_argument('--opencv-threads', type=int)
+    args = parser.parse_args()
+
+    default = measure(args.seconds, args.load)
+
+    if args.pin or args.elevate or args.opencv_threads is not None:
+        SCHEDULING.configure(
+            affinity={stage: parse_cpus(cpus) for stage, _, cpus in (pin.partition("=") for pin in args.pin)},
+            elevated=args.elevate, opencv_threads=args.opencv_threads)
+    else:
+        SCHEDULING.configure_realtime()
+    profiled = measure(args.seconds, args.load)
+
+    print(f"profile: {SCHEDULING.describe()}")
+    print(f"{'':<24} {'default':>10} {'profile':>10} {'change':>8}")
+    for key in default.keys():
+        change = (profiled[key] / default[key] - 1) * 100 if default[key] else 0.0
+        print(f"{key:<24} {default[key]:>10.2f} {profiled[key]:>10.2f} {change:>+7.0f}%")
@@ -0,0 +1,238 @@
+"""
+Replays recorded camera and sensor sessions in a loop through the whole MainController for hours, with a recording
+cursor, and fails if memory or latency drift past their budgets.
+
+    python -m benchmarks.soak --clip session.mp4 --sensor session.csv --hours 10 [--json soak.json]
+
+Sensor sessions are CSV files with timestamp_ms, x and y columns, in g, the way the sensor reports them.
+Both are replayed at their recorded pace, the camera on this thread and the sensor on its own, like the live app.
+
+Every --interval-s seconds RSS, traced memory and the p50/p99 of frame and sample handling are sampled.
+The samples of the first --drift-window intervals after --warmup-s are the baseline the last ones are compared to.
+"""
+import argparse
+import csv
+import json
+import statistics
+import sys
+import threading
+import time
+import tracemalloc
+from time import perf_counter
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+
+from benchmarks.frame_allocations import rss_kb
+from main import MainController
+from models.cursor_recording import RecordingCursor
+from utils import percentile
+
+
+class SensorReplay(threading.Thread):
+    """Feeds a recorded sensor session to a handler in a loop, at its recorded pace."""
+
+    def __init__(self, samples: List[Tuple[float, float, float]], controller: MainController, speed: float) -> None:
+        super(SensorReplay, self).__init__(name="sensor-replay", daemon=True)
+        self.samples = samples
+        self.controller = controller
+        self.speed = speed
+
+        self.stopped = threading.Event()
+        self._lock = threading.Lock()
+        self._latencies: List[float] = []
+
+    def take_latencies(self) -> List[float]:
+        with self._lock:
+            latencies, self._latencies = self._latencies, []
+        return latencies
+
+    def run(self) -> None:
+        duration_ms = self.samples[-1][0] - self.samples[0][0]
+        loop_start = perf_counter()
+
+        while not self.stopped.is_set():
+            for timestamp_ms, x, y in self.samples:
+                due = loop_start + (timestamp_ms - self.samples[0][0]) / 1000 / self.speed
+                if self.stopped.wait(max(0.0, due - perf_counter())):
+                    return
+
+                started = perf_counter()
+                self.controller.sensor_data_handler(x, y)
+                with self._lock:
+                    self._latencies.append(perf_counter() - started)
+
+            # the next loop starts one sample interval after the last sample
+            loop_start += (duration_ms + 10) / 1000 / self.speed
+
+
+def load_sensor_session(path: str) -> List[Tuple[float, float, float]]:
+    with open(path, newline='') as f:
+        return [(float(row['timestamp_ms']), float(row['x']), float(row['y'])) for row in csv.DictReader(f)]
+
+
+def soak(clip: Optional[str], sensor_session: Optional[str], duration_s: float, interval_s: float, warmup_s: float,
+         speed: float) -> List[Dict[str, float]]:
+    controller = MainController(cursor=RecordingCursor(allow_external_movement=True), use_camera=bool(clip),
+                                use_sensor=False, show_preview=False)
+
+    camera = controller.camera
+    frame_interval = 0.0
+    clip_frames = 0
+    if camera:
+        camera.video_source = clip
+        camera.load_models()
+        if not camera.open_device():
+            sys.exit(f"Could not open {clip}.")
+
+        frame_interval = 1 / (camera.capture_device.get(cv2.CAP_PROP_FPS) or 30) / speed
+        clip_frames = int(camera.capture_device.get(cv2.CAP_PROP_FRAME_COUNT))
+
+    sensor_replay = None
+    if sensor_session:
+        sensor_replay = SensorReplay(load_sensor_session(sensor_session), controller, speed)
+
+    tracemalloc.start()
+    started = perf_counter()
+    if sensor_replay:
+        sensor_replay.start()
+
+    samples: List[Dict[str, float]] = []
+    # taken once warmed up, every later snapshot is compared to it to find what grows
+    baseline_snapshot: Optional[tracemalloc.Snapshot] = None
+    growth: List[tracemalloc.StatisticDiff] = []
+    frame_latencies: List[float] = []
+    frames_in_clip = 0
+    next_frame = next_sample = started
+
+    try:
+        while perf_counter() - started < duration_s:
+            now = perf_counter()
+            if now >= next_sample:
+                next_sample += interval_s
+                sample = {
+                    "elapsed_s": now - started,
+                    "rss_kb": rss_kb(),
+                    "traced_kb": tracemalloc.get_traced_memory()[0] / 1024,
+                    "frames": len(frame_latencies),
+                    "frame_p50_ms": percentile(frame_latencies, 50) * 1000,
+                    "frame_p99_ms": percentile(frame_latencies, 99) * 1000,
+                }
+
+                if now - started >= warmup_s:
+                    snapshot = tracemalloc.take_snapshot()
+                    if baseline_snapshot is None:
+                        baseline_snapshot = snapshot
+                    growth = snapshot.compare_to(baseline_snapshot, "lineno")
+                    sample["top_line_growth_kb"] = max((diff.size_diff for diff in growth), default=0) / 1024
+
+                if sensor_replay:
+                    sensor_latencies = sensor_replay.take_latencies()
+                    sample["sensor_samples"] = len(sensor_latencies)
+                    sample["sensor_p50_ms"] = percentile(sensor_latencies, 50) * 1000
+                    sample["sensor_p99_ms"] = percentile(sensor_latencies, 99) * 1000
+
+                samples.append(sample)
+                frame_latencies = []
+                print(" ".join(f"{key}={value:.2f}" if isinstance(value, float) else f"{key}={value}"
+                               for key, value in sample.items()), flush=True)
+
+            if not camera:
+                time.sleep(max(0.0, min(next_sample - perf_counter(), 1.0)))
+                continue
+
+            time.sleep(max(0.0, next_frame - perf_counter()))
+            next_frame = max(next_frame + frame_interval, perf_counter() - frame_interval)
+
+            # rewound before the end, so the loop does not take the end of the clip for a broken camera
+            if frames_in_clip >= clip_frames > 0:
+                camera.capture_device.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                frames_in_clip = 0
+
+            step_started = perf_counter()
+            if not camera.step():
+                if not frames_in_clip:
+                    sys.exit(f"Could not read {clip}.")
+                frames_in_clip = clip_frames
+                continue
+
+            frame_latencies.append(perf_counter() - step_started)
+            frames_in_clip += 1
+    finally:
+        if sensor_replay:
+            sensor_replay.stopped.set()
+            sensor_replay.join()
+        if camera:
+            camera.capture_device.release()
+
+        tracemalloc.stop()
+
+    print("lines whose traced memory grew the most since the warm-up:")
+    for diff in growth[:10]:
+        print(f"    {diff}")
+
+    return samples
+
+
+def check(samples: List[Dict[str, float]], warmup_s: float, drift_window: int, max_rss_growth_mb: float,
+          max_traced_growth_mb: float, max_p99_drift: float) -> List[str]:
+    measured = [sample for sample in samples if sample["elapsed_s"] >= warmup_s]
+    if len(measured) < drift_window * 2:
+        return ["the run is too short for its warm-up and drift window"]
+
+    baseline, last = measured[:drift_window], measured[-drift_window:]
+
+    def mean(window: List[Dict[str, float]], key: str) -> float:
+        return statistics.mean(sample[key] for sample in window)
+
+    failures = []
+    rss_growth_mb = (mean(last, "rss_kb") - mean(baseline, "rss_kb")) / 1024
+    traced_growth_mb = (mean(last, "traced_kb") - mean(baseline, "traced_kb")) / 1024
+    print(f"RSS growth: {rss_growth_mb:.1f} MB, traced memory growth: {traced_growth_mb:.1f} MB")
+    if rss_growth_mb > max_rss_growth_mb:
+        failures.append(f"RSS grew by {rss_growth_mb:.1f} MB")
+    if traced_growth_mb > max_traced_growth_mb:
+        failures.append(f"traced memory grew by {traced_growth_mb:.1f} MB")
+
+    for key in ("frame_p99_ms", "sensor_p99_ms"):
+        if key not in samples[0] or not mean(baseline, key):
+            continue
+
+        drift = mean(last, key) / mean(baseline, key) - 1
+        print(f"{key} drift: {drift * 100:+.1f}%")
+        if drift > max_p99_drift:
+            failures.append(f"{key} drifted by {drift * 100:+.1f}%")
+
+    return failures
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--clip', help="Camera session to replay.")
+    parser.add_argument('--sensor', help="Sensor session to replay.")
+    parser.add_argument('--hours', type=float, default=10.0)
+    parser.add_argument('--interval-s', type=float, default=60.0)
+    parser.add_argument('--warmup-s', type=float, default=300.0)
+    parser.add_argument('--drift-window', type=int, default=3, help="Samples averaged at each end.")
+    parser.add_argument('--speed', type=float, default=1.0, help="Replay this many times faster than recorded.")
+    parser.add_argument('--max-rss-growth-mb', type=float, default=50.0)
+    parser.add_argument('--max-traced-growth-mb', type=float, default=10.0)
+    parser.add_argument('--max-p99-drift', type=float, default=0.25, help="Relative, 0.25 being 25%% slower.")
+    parser.add_argument('--json', help="Also write the samples here.")
+    args = parser.parse_args()
+
+    if not args.clip and not args.sensor:
+        parser.error("Nothing to replay, give --clip, --sensor or both.")
+
+    results = soak(args.clip, args.sensor, args.hours * 3600, args.interval_s, args.warmup_s, args.speed)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+    failures = check(results, args.warmup_s, args.drift_window, args.max_rss_growth_mb, args.max_traced_growth_mb,
+                     args.max_p99_drift)
+    if failures:
+        sys.exit("FAILED: " + ", ".join(failures))
+
+    print("OK")
@@ -1,3 +1,5 @@
-from .camera_controller_haar import *
+from .detector_backends import *
+from .head_pose import *
 from .camera_controller_dlib import *
+from .camera_controller_haar import *
 from .sensor_controller import *
@@ -1,60 +1,152 @@
 import logging
-from typing import Callable, List, Optional
+from time import perf_counter
+from typing import Callable, List, Optional, Tuple, Union
 
-import _dlib_pybind11
 import cv2
-import dlib
 import numpy as np
 
 from models import Eye, Face
-from utils import Color, TemporaryText, Timer, draw_text
-
-FACE_DETECTOR = dlib.get_frontal_face_detector()
-SHAPE_PREDICTOR = dlib.shape_predictor("./assets/shape_predictor_68_face_landmarks.dat")
-LEFT_EYE_LANDMARKS = [36, 37, 38, 39, 40, 41]
-RIGHT_EYE_LANDMARKS = [42, 43, 44, 45, 46, 47]
+from server.frame_publisher import FramePublisher
+from utils import AdaptiveQuality, CaptureRateGovernor, Color, METRICS, MotionGate, PROFILER, TRACER, TemporaryText, \
+    Timer, draw_text, eye_region
+from .detector_backends import Detection, DetectorBackend, QualityLevel, default_quality_levels, mirror_detection
+from .head_pose import HeadPoseEstimator
 
 __all__ = ['CameraControllerDlib']
 
+FRAMES_CAPTURED = METRICS.counter("camera_frames_captured_total", "Frames read from the camera.")
+FRAMES_DROPPED = METRICS.counter("camera_frames_dropped_total", "Frames read from the camera but not processed.",
+                                 {"reason": "governor"})
+CAPTURE_FPS = METRICS.gauge("camera_capture_fps", "Frames read from the camera per second.")
+MOTION_GATE_FRAMES = {
+    result: METRICS.counter("camera_motion_gate_frames_total",
+                            "Processed frames that reused the last landmarks or inferred new ones.", {"result": result})
+    for result in ("reused", "inferred")
+}
+MOTION_GATE_HIT_RATE = METRICS.gauge("camera_motion_gate_hit_rate", "Share of processed frames that reused landmarks.")
+MOTION_GATE_CPU_SAVED = METRICS.gauge("camera_motion_gate_cpu_saved_seconds",
+                                      "Estimated inference time saved by reusing landmarks.")
+
 
 class CameraControllerDlib:
-    def __init__(self, eye_callback: Callable = None, blink_threshold: float = 5.65):
-        # callback
+    def __init__(self, eye_callback: Callable = None, blink_threshold: float = 5.65,
+                 backend: Optional[DetectorBackend] = None, frame_budget_ms: Optional[float] = None,
+                 video_source: Union[int, str] = 0, show_preview: bool = True,
+                 rate_governor: Optional[CaptureRateGovernor] = None,
+                 head_pose_callback: Optional[Callable[[float, float], None]] = None,
+                 frame_publisher: Optional[FramePublisher] = None,
+                 motion_gate: Optional[MotionGate] = None,
+                 clock: Callable[[], float] = perf_counter):
+        # callbacks
         self.callback = eye_callback
+        self.head_pose_callback = head_pose_callback
         # blink threshold
         self.blink_threshold = blink_threshold
 
+        # detector backends.
+        # a fixed backend is used as is, otherwise we step through the default levels to stay within the budget
+        levels = [QualityLevel(backend)] if backend else default_quality_levels()
+        self.quality: AdaptiveQuality[QualityLevel] = AdaptiveQuality(levels, budget_ms=frame_budget_ms or float('inf'))
+
+        # reuses the landmarks to estimate yaw and pitch, only if someone listens
+        self.head_pose = HeadPoseEstimator() if head_pose_callback else None
+
+        # what the governor's decisions are based on, only replaced for offline runs
+        self.clock = clock
+
+        # decides which frames are worth processing
+        self.rate_governor = rate_governor
+        # and which of those need new landmarks
+        self.motion_gate = motion_gate
+        # the last inferred detection in the camera's own orientation and the head pose from it
+        self._last_detection: Optional[Detection] = None
+        self._last_pose: Optional[Tuple[float, float]] = None
+
         # our capture device and the last captured frame
+        self.video_source = video_source
+        self.show_preview = show_preview
+        # lets viewers in other processes see the frames
+        self.frame_publisher = frame_publisher
+        self.annotate = show_preview or (frame_publisher is not None and frame_publisher.annotated)
         self.capture_device = None
+        self.frame: Optional[np.ndarray] = None
+
+        # reused every frame instead of allocating new ones.
+        # detection runs on the camera's own orientation, only the preview is mirrored
+        self._gray: Optional[np.ndarray] = None
+        self._filtered: Optional[np.ndarray] = None
+        self._preview: Optional[np.ndarray] = None
+
+        # the mirrored and annotated preview, None if nothing shows it
         self.img: Optional[np.ndarray] = None
 
         # timer to show graph
         self.frame_counter = 0
-        self.timer = Timer()
+        self.timer = Timer("camera")
+
+        # capture rate
+        self._fps_window_start = perf_counter()
+        self._fps_window_frames = 0
 
         self.temporary_texts: List[TemporaryText] = []
 
+    def open_device(self) -> bool:
+        """Opens the capture device, returns whether it could be opened."""
+        self.capture_device = cv2.VideoCapture(self.video_source)
+        self.capture_device.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
+        self.capture_device.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
+
+        return self.capture_device.isOpened()
+
+    def load_models(self) -> None:
+        """Loads the models of every detector backend, so the first frames do not wait for them."""
+        for level in self.quality.levels:
+            level.backend.load()
+
     def _successfully_refreshed_frame(self) -> bool:
         """Refreshes the frame."""
         if not self.capture_device:
-            self.capture_device = cv2.VideoCapture(0)
-            self.capture_device.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
-            self.capture_device.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
+            self.open_device()
 
         if not self.capture_device.isOpened():
             logging.error("Camera could not be found/opened. Exiting.")
-            self.stop()
+            return False
 
-        successful, self.img = self.capture_device.read()
+        started = perf_counter()
+        successful, self.frame = self.capture_device.read(self.frame)
+        captured_at = perf_counter()
 
         if not successful:
             logging.error("Could not capture any frame. Exiting.")
-            self.stop()
+            return False
 
         self.frame_counter += 1
 
+        # every span from here on belongs to this frame
+        TRACER.begin_frame(self.frame_counter, captured_at)
+        TRACER.record("capture", started, captured_at)
+        self._count_captured_frame()
+
         return True
 
+    def _count_captured_frame(self) -> None:
+        FRAMES_CAPTURED.inc()
+
+        self._fps_window_frames += 1
+        now = perf_counter()
+        if now - self._fps_window_start >= 1.0:
+            CAPTURE_FPS.set(self._fps_window_frames / (now - self._fps_window_start))
+            self._fps_window_start, self._fps_window_frames = now, 0
+
+    def _prepare_buffers(self) -> None:
+        """(Re)allocates the buffers when the frame size changes, which normally happens only once."""
+        if self._gray is not None and self._gray.shape == self.frame.shape[:2]:
+            return
+
+        self._gray = np.empty(self.frame.shape[:2], dtype=np.uint8)
+        self._filtered = np.empty_like(self._gray)
+        self._preview = np.empty_like(self.frame)
+
     def draw_and_clean_temporary_texts(self):
         expired_texts = []
         for temporary_text in self.temporary_texts:
@@ -66,85 +158,188 @@ class CameraControllerDlib:
         for expired in expired_texts:
             self.temporary_texts.remove(expired)
 
-    def start_capturing(self):
-        """Main loop."""
-        while self._successfully_refreshed_frame():
-            # capturing frame is kept out of time frame
-            # because it is inconsistent and takes too much time compared to others
-            # _capturing_frame_time = perf_counter() - _base_time
-            # processing_times["capturing_frame"][frame_counter] = _capturing_frame_time
+    def process_frame(self) -> None:
+        """Runs detection on the last captured frame and calls the callback with both eyes."""
+        # capturing frame is kept out of time frame
+        # because it is inconsistent and takes too much time compared to others
 
-            # filtering
-            self.timer.start(set_beginning=True)
+        # filtering
+        self.timer.start(set_beginning=True)
+        self._prepare_buffers()
 
+        cv2.cvtColor(self.frame, cv2.COLOR_BGR2GRAY, dst=self._gray)  # convert to grayscale
+        cv2.bilateralFilter(self._gray, 5, 1, 1, dst=self._filtered)  # remove impurities
+
+        self.timer.capture("filtering", self.frame_counter)
+
+        if self.annotate:
             # flip the image (this might vary on camera device)
             self.img = cv2.flip(
-                self.img,
-                1  # 0 = flip around x, 1 = flip around y, -1 = both
+                self.frame,
+                1,  # 0 = flip around x, 1 = flip around y, -1 = both
+                dst=self._preview
             )
 
             # draw and clean the temporary texts
             # (has to be done after flipping)
             self.draw_and_clean_temporary_texts()
 
-            gray = cv2.cvtColor(self.img, cv2.COLOR_BGR2GRAY)  # convert to grayscale
-            gray = cv2.bilateralFilter(gray, 5, 1, 1)  # remove impurities
+        # face detection and landmarks, unless the eyes look the same as when they were last found
+        level = self.quality.level
+        reused = self.motion_gate is not None and self.motion_gate.should_reuse(self._filtered)
+        if reused:
+            detection = self._last_detection
+        else:
+            detection = self._detect(level)
 
-            self.timer.capture("filtering", self.frame_counter)
+        if self.motion_gate:
+            MOTION_GATE_FRAMES["reused" if reused else "inferred"].inc()
 
-            # face detection
-            self.timer.start()
-            faces: Optional[List[Face]] = [
-                Face.get_from_dlib_rectangle(self.img, coord)
-                for coord in
-                FACE_DETECTOR.run(image=gray, upsample_num_times=0, adjust_threshold=0.0)[0]
-            ]
-            self.timer.capture("face_detection", self.frame_counter)
-
-            if len(faces) <= 0:
+        # the handlers may click, which is not the detector's time
+        handler_time = 0.0
+
+        ratio = None
+        if detection is None:
+            if self.head_pose:
+                self.head_pose.reset()
+
+            if self.annotate:
                 draw_text(
                     self.img,
                     text="No face detected",
                     color=Color.RED)
-            else:
-                # use the first detected face
-                face = faces[0]
-
-                # detect face landmarks
+        else:
+            # head pose from the same landmarks, in the camera's own orientation
+            # frames without landmarks (reused, or only the eyes tracked) keep the last pose
+            if self.head_pose:
                 self.timer.start()
-                face_landmarks: _dlib_pybind11.full_object_detection = SHAPE_PREDICTOR(gray, face.get_dlib_rectangle())
-                self.timer.capture("landmark_detection", self.frame_counter)
-
-                # create eye objects
-                left_eye = Eye.get_from_dlib_landmarks(self.img, face, Eye.Type.LEFT, LEFT_EYE_LANDMARKS,
-                                                       face_landmarks, state_threshold=self.blink_threshold)
-                right_eye = Eye.get_from_dlib_landmarks(self.img, face, Eye.Type.RIGHT, RIGHT_EYE_LANDMARKS,
-                                                        face_landmarks, state_threshold=self.blink_threshold)
-                # labels
+                if not reused and detection.landmarks is not None:
+                    self._last_pose = self.head_pose.estimate(detection.landmarks,
+                                                              (self.frame.shape[1], self.frame.shape[0]))
+                # sent every frame either way, the cursor keeps moving while the head is held still
+                if self._last_pose is not None:
+                    started = perf_counter()
+                    self.head_pose_callback(*self._last_pose)
+                    handler_time += perf_counter() - started
+                self.timer.capture("head_pose", self.frame_counter)
+
+            # mirror the coordinates instead of the pixels, so the eyes are where the user sees them
+            detection = mirror_detection(detection, self.frame.shape[1])
+
+            # create face and eye objects
+            face = Face(self.img, detection.face)
+            left_eye = Eye.get_from_points(self.img, face, Eye.Type.LEFT, detection.left_eye,
+                                           state_threshold=self.blink_threshold)
+            right_eye = Eye.get_from_points(self.img, face, Eye.Type.RIGHT, detection.right_eye,
+                                            state_threshold=self.blink_threshold)
+            # labels
+            if self.annotate:
                 face.draw()
                 left_eye.draw()
                 right_eye.draw()
 
-                # callback
-                if self.callback:
-                    self.callback(left_eye, right_eye)
+            ratio = (left_eye.closeness_ratio + right_eye.closeness_ratio) / 2
+
+            # callback
+            if self.callback:
+                self.timer.start()
+                self.callback(left_eye, right_eye)
+                handler_time += self.timer.capture("callback", self.frame_counter)
+
+        total = self.timer.capture("total", self.frame_counter, use_beginning=True)
+
+        if self.rate_governor:
+            self.rate_governor.observe(ratio, self.clock(), cost=total)
+
+        # step the detector down or up depending on how long the frames take without the handlers.
+        # reused frames say nothing about the detector
+        if not reused and self.quality.record((total - handler_time) * 1000):
+            self.quality.level.backend.reset()
+
+        if self.motion_gate:
+            MOTION_GATE_HIT_RATE.set(self.motion_gate.hit_rate)
+            MOTION_GATE_CPU_SAVED.set(self.motion_gate.cpu_time_saved)
+
+        if self.annotate:
+            draw_text(self.img, str(self.quality.level), (10, self.img.shape[0] - 10), font_size=1.0, thickness=1)
+
+    def _detect(self, level: QualityLevel) -> Optional[Detection]:
+        """Finds the face and its landmarks on the filtered frame, and makes them the motion gate's reference."""
+        started = perf_counter()
+
+        self.timer.start()
+        face_coordinates = level.backend.locate_face(self._filtered, scale=level.scale, interval=level.interval)
+        self.timer.capture("face_detection", self.frame_counter)
+
+        detection = None
+        if face_coordinates is not None:
+            # detect face landmarks
+            self.timer.start()
+            detection = level.backend.predict(self._filtered, face_coordinates)
+            self.timer.capture("landmark_detection", self.frame_counter)
+
+        self._last_detection = detection
+        if self.motion_gate:
+            region = eye_region(detection.left_eye, detection.right_eye, self._filtered.shape) if detection else None
+            self.motion_gate.set_reference(self._filtered, region, cost=perf_counter() - started)
 
-            self.timer.capture("total", self.frame_counter, use_beginning=True)
+        return detection
 
-            # show the image
+    def step(self) -> bool:
+        """Processes the next frame, or only grabs it if the governor skips it. False once there are no more frames."""
+        if self.capture_device and self.rate_governor and not self.rate_governor.should_process(self.clock()):
+            # keep the driver's buffer fresh without decoding the frame
+            if not self.capture_device.grab():
+                return False
+
+            self._count_captured_frame()
+            FRAMES_DROPPED.inc()
+            return True
+
+        if not self._successfully_refreshed_frame():
+            return False
+
+        PROFILER.begin("camera")
+        self.process_frame()
+        PROFILER.end("camera")
+
+        if self.frame_publisher:
+            self.frame_publisher.publish(self.img if self.frame_publisher.annotated else self.frame,
+                                         self.frame_counter)
+
+        return True
+
+    def show(self) -> bool:
+        """Shows the preview, returns False if the user pressed q."""
+        if self.img is not None:
             cv2.imshow('img', self.img)
 
-            # if the user presses q, break
-            # TODO move this to main key detection thread?
-            if cv2.waitKey(1) == ord('q'):
+        return cv2.waitKey(1) != ord('q')
+
+    def start_capturing(self):
+        """Main loop."""
+        self.load_models()
+
+        while self.step():
+            if self.show_preview and not self.show():
                 break
 
         self.stop()
 
     def stop(self):
         cv2.destroyAllWindows()
-        self.capture_device.release()
+        if self.frame_publisher:
+            self.frame_publisher.close()
+        if self.capture_device:
+            self.capture_device.release()
         self.timer.show_graph()
 
+        if self.rate_governor:
+            self.rate_governor.log_summary()
+        if self.motion_gate:
+            self.motion_gate.log_summary()
+
     def add_temporary_text(self, text: TemporaryText):
-        self.temporary_texts.append(text)
+        # texts are only cleaned up while drawing, and nothing would ever draw them
+        if self.annotate:
+            self.temporary_texts.append(text)
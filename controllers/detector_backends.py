@@ -0,0 +1,503 @@
+import functools
+from abc import ABC, abstractmethod
+from typing import List, NamedTuple, Optional, Tuple
+
+import _dlib_pybind11
+import cv2
+import dlib
+import numpy as np
+
+SHAPE_PREDICTOR_PATH = "./assets/shape_predictor_68_face_landmarks.dat"
+FACE_CASCADE_PATH = cv2.data.haarcascades + 'haarcascade_frontalface_default.xml'
+EYE_CASCADE_PATH = cv2.data.haarcascades + 'haarcascade_eye_tree_eyeglasses.xml'
+LEFT_EYE_LANDMARKS = [36, 37, 38, 39, 40, 41]
+RIGHT_EYE_LANDMARKS = [42, 43, 44, 45, 46, 47]
+
+# correlation tracker confidence below which we stop trusting it and detect again
+TRACKING_MIN_CONFIDENCE = 7.0
+
+# haar eye search. the face is scaled to a fixed width and eyes are only searched in its upper part
+HAAR_FACE_WIDTH = 128
+HAAR_EYE_REGION_BOTTOM = 0.55  # the upper half, plus some room for the lower lids
+HAAR_FACE_DETECTION_WIDTH = 96  # faces are detected on a frame scaled so the last face is about this wide
+HAAR_RESCAN_INTERVAL = 30  # frames between full searches of the eye region
+HAAR_EYE_WINDOW_MARGIN = 0.5  # of the eye's size, around its last position
+# eyes have no landmarks here, so the points are synthesized to give these closeness ratios
+HAAR_OPEN_EYE_RATIO = 3.5
+HAAR_CLOSED_EYE_RATIO = 12.0
+
+# eye landmark tracking between full predictions
+FLOW_PREDICT_INTERVAL = 5  # frames between full shape predictions
+FLOW_WINDOW_SIZE = (11, 11)
+FLOW_PYRAMID_LEVELS = 2
+FLOW_MAX_ERROR = 0.75  # forward-backward error in pixels above which the points are predicted again
+FLOW_CROP_MARGIN = 0.3  # of the distance between the outer eye corners, around both eyes
+
+# mirroring turns the other eye into this one, and its points into this order:
+# outer corner, top points and inner corner swap places horizontally
+MIRRORED_EYE_ORDER = [3, 2, 1, 0, 5, 4]
+
+__all__ = [
+    'Detection', 'QualityLevel',
+    'DetectorBackend', 'DlibHogBackend', 'FlowEyeBackend', 'HaarBackend', 'HaarEyeBackend', 'TrackedBackend',
+    'default_quality_levels', 'mirror_detection', 'get_face_detector', 'get_shape_predictor', 'get_face_cascade',
+    'get_eye_cascade',
+    'LEFT_EYE_LANDMARKS', 'RIGHT_EYE_LANDMARKS'
+]
+
+Rectangle = Tuple[int, int, int, int]  # x1, y1, x2, y2
+Points = List[Tuple[int, int]]
+
+
+@functools.lru_cache(maxsize=None)
+def get_face_detector() -> dlib.fhog_object_detector:
+    return dlib.get_frontal_face_detector()
+
+
+@functools.lru_cache(maxsize=None)
+def get_shape_predictor() -> dlib.shape_predictor:
+    return dlib.shape_predictor(SHAPE_PREDICTOR_PATH)
+
+
+@functools.lru_cache(maxsize=None)
+def get_face_cascade() -> cv2.CascadeClassifier:
+    return cv2.CascadeClassifier(FACE_CASCADE_PATH)
+
+
+@functools.lru_cache(maxsize=None)
+def get_eye_cascade() -> cv2.CascadeClassifier:
+    return cv2.CascadeClassifier(EYE_CASCADE_PATH)
+
+
+class Detection(NamedTuple):
+    face: Rectangle
+    left_eye: Points
+    right_eye: Points
+    # all 68 landmarks, if the backend computed them
+    landmarks: Optional[_dlib_pybind11.full_object_detection] = None
+
+
+def mirror_detection(detection: Detection, width: int) -> Detection:
+    """Maps a detection from a frame to the same frame flipped around the y axis."""
+    x1, y1, x2, y2 = detection.face
+
+    def mirror_eye(points: Points) -> Points:
+        return [(width - 1 - points[i][0], points[i][1]) for i in MIRRORED_EYE_ORDER]
+
+    return Detection(
+        (width - 1 - x2, y1, width - 1 - x1, y2),
+        mirror_eye(detection.right_eye),
+        mirror_eye(detection.left_eye),
+        detection.landmarks
+    )
+
+
+class DetectorBackend(ABC):
+    """Finds the face in a grayscale frame and the 6 landmarks of each eye in it."""
+    name = "abstract"
+
+    def __init__(self) -> None:
+        self._last_face: Optional[Rectangle] = None
+        self._frames_since_detection = 0
+
+        # reused for downscaled detection
+        self._scaled: Optional[np.ndarray] = None
+
+    def load(self) -> None:
+        """Loads the models in advance so the first frame does not pay for it."""
+        get_shape_predictor()
+
+    def reset(self) -> None:
+        self._last_face = None
+        self._frames_since_detection = 0
+
+    def locate_face(self, gray: np.ndarray, scale: float = 1.0, interval: int = 1) -> Optional[Rectangle]:
+        """Runs the detector every `interval` frames on a `scale` sized frame, and tracks the face in between."""
+        self._frames_since_detection += 1
+
+        face = None
+        if self._last_face is not None and self._frames_since_detection < interval:
+            face = self.track(gray, self._last_face)
+
+        if face is None:
+            self._frames_since_detection = 0
+            faces = self.detect_faces(gray, scale)
+            face = faces[0] if faces else None
+
+            if face is not None:
+                self.start_tracking(gray, face)
+
+        self._last_face = face
+        return face
+
+    def predict(self, gray: np.ndarray, face: Rectangle) -> Detection:
+        landmarks = get_shape_predictor()(gray, _dlib_pybind11.rectangle(*face))
+
+        return Detection(
+            face,
+            [(landmarks.part(i).x, landmarks.part(i).y) for i in LEFT_EYE_LANDMARKS],
+            [(landmarks.part(i).x, landmarks.part(i).y) for i in RIGHT_EYE_LANDMARKS],
+            landmarks
+        )
+
+    def detect_faces(self, gray: np.ndarray, scale: float = 1.0) -> List[Rectangle]:
+        if scale != 1.0:
+            height, width = int(gray.shape[0] * scale), int(gray.shape[1] * scale)
+            if self._scaled is None or self._scaled.shape != (height, width):
+                self._scaled = np.empty((height, width), dtype=np.uint8)
+
+            gray = cv2.resize(gray, (width, height), dst=self._scaled, interpolation=cv2.INTER_AREA)
+
+        return [
+            (int(x1 / scale), int(y1 / scale), int(x2 / scale), int(y2 / scale))
+            for x1, y1, x2, y2 in self._detect_faces(gray)
+        ]
+
+    @abstractmethod
+    def _detect_faces(self, gray: np.ndarray) -> List[Rectangle]:
+        raise NotImplementedError
+
+    def start_tracking(self, gray: np.ndarray, face: Rectangle) -> None:
+        pass
+
+    def track(self, gray: np.ndarray, last_face: Rectangle) -> Optional[Rectangle]:
+        # the shape predictor does not need an exact box, so reuse the last one
+        return last_face
+
+
+class DlibHogBackend(DetectorBackend):
+    name = "hog"
+
+    def load(self) -> None:
+        super(DlibHogBackend, self).load()
+        get_face_detector()
+
+    def _detect_faces(self, gray: np.ndarray) -> List[Rectangle]:
+        return [
+            (rect.left(), rect.top(), rect.right(), rect.bottom())
+            for rect in get_face_detector().run(image=gray, upsample_num_times=0, adjust_threshold=0.0)[0]
+        ]
+
+
+class HaarBackend(DetectorBackend):
+    name = "haar"
+
+    def load(self) -> None:
+        super(HaarBackend, self).load()
+        get_face_cascade()
+
+    def _detect_faces(self, gray: np.ndarray) -> List[Rectangle]:
+        # minimum face size is kept relative to the frame so downscaling does not hide faces
+        min_size = gray.shape[0] // 3
+        return [
+            (x, y, x + w, y + h)
+            for x, y, w, h in get_face_cascade().detectMultiScale(
+                gray,
+                scaleFactor=1.3,  # the higher, the faster but less accurate
+                minNeighbors=5,  # the higher, the less false positives but higher chance of missing
+                minSize=(min_size, min_size)
+            )
+        ]
+
+
+class TrackedBackend(DetectorBackend):
+    """Detects with another backend and follows the face with a correlation tracker in between."""
+    name = "tracked"
+
+    def __init__(self, detector: DetectorBackend) -> None:
+        super(TrackedBackend, self).__init__()
+        self.detector = detector
+        self.tracker = dlib.correlation_tracker()
+
+    def load(self) -> None:
+        self.detector.load()
+
+    def _detect_faces(self, gray: np.ndarray) -> List[Rectangle]:
+        return self.detector._detect_faces(gray)
+
+    def start_tracking(self, gray: np.ndarray, face: Rectangle) -> None:
+        self.tracker.start_track(gray, _dlib_pybind11.rectangle(*face))
+
+    def track(self, gray: np.ndarray, last_face: Rectangle) -> Optional[Rectangle]:
+        if self.tracker.update(gray) < TRACKING_MIN_CONFIDENCE:
+            return None
+
+        position: _dlib_pybind11.drectangle = self.tracker.get_position()
+        return int(position.left()), int(position.top()), int(position.right()), int(position.bottom())
+
+
+class FlowEyeBackend(DetectorBackend):
+    """
+    Runs another backend's shape prediction every `interval` frames, and in between only follows
+    the 12 eye points with pyramidal Lucas-Kanade flow on a crop around both eyes.
+
+    Each point is tracked forward and back again. If any comes back further than `FLOW_MAX_ERROR` from where
+    it started, as happens when the lids move fast, the frame is predicted in full instead. Tracked frames
+    carry no 68 landmarks, so whatever needs them (the head pose) only gets the full predictions.
+    """
+    name = "flow"
+
+    def __init__(self, detector: Optional[DetectorBackend] = None, interval: int = FLOW_PREDICT_INTERVAL) -> None:
+        super(FlowEyeBackend, self).__init__()
+        self.detector = detector or DlibHogBackend()
+        self.interval = interval
+
+        # the last eye points, left then right as floats, and the frame they were found on
+        self._points: Optional[np.ndarray] = None
+        self._previous: Optional[np.ndarray] = None
+        self._frames_since_prediction = 0
+
+        # stats
+        self.predicted_frames = 0
+        self.tracked_frames = 0
+        self.reanchored_frames = 0
+
+    def load(self) -> None:
+        self.detector.load()
+
+    def reset(self) -> None:
+        super(FlowEyeBackend, self).reset()
+        self.detector.reset()
+        self._points = None
+
+    def locate_face(self, gray: np.ndarray, scale: float = 1.0, interval: int = 1) -> Optional[Rectangle]:
+        if self._points is not None and self._frames_since_prediction + 1 < self.interval:
+            # the face moves with the eyes, see predict
+            return self._last_face
+
+        self._last_face = self.detector.locate_face(gray, scale, interval)
+        if self._last_face is None:
+            self._points = None
+        return self._last_face
+
+    def _detect_faces(self, gray: np.ndarray) -> List[Rectangle]:
+        return self.detector._detect_faces(gray)
+
+    def _track_points(self, gray: np.ndarray) -> Optional[np.ndarray]:
+        """The eye points moved from the previous frame to this one, None if they can not be trusted."""
+        points = self._points
+        margin = (points[:, 0].max() - points[:, 0].min()) * FLOW_CROP_MARGIN
+        x1, y1 = (points.min(axis=0) - margin).astype(int).clip(0)
+        x2, y2 = (points.max(axis=0) + margin).astype(int) + 1
+
+        previous, current = self._previous[y1:y2, x1:x2], gray[y1:y2, x1:x2]
+        start = (points - (x1, y1)).astype(np.float32).reshape(-1, 1, 2)
+
+        forward, status, _ = cv2.calcOpticalFlowPyrLK(previous, current, start, None, winSize=FLOW_WINDOW_SIZE,
+                                                      maxLevel=FLOW_PYRAMID_LEVELS)
+        backward, back_status, _ = cv2.calcOpticalFlowPyrLK(current, previous, forward, None,
+                                                            winSize=FLOW_WINDOW_SIZE, maxLevel=FLOW_PYRAMID_LEVELS)
+
+        if not status.all() or not back_status.all() or np.abs(backward - start).max() > FLOW_MAX_ERROR:
+            return None
+
+        return (forward.reshape(-1, 2) + (x1, y1)).astype(np.float32)
+
+    def predict(self, gray: np.ndarray, face: Rectangle) -> Optional[Detection]:
+        if self._previous is None or self._previous.shape != gray.shape:
+            self._previous = np.empty_like(gray)
+
+        self._frames_since_prediction += 1
+        if self._points is not None and self._frames_since_prediction < self.interval:
+            points = self._track_points(gray)
+            if points is not None:
+                # the face box follows the eyes, the shape predictor does not need it exact
+                dx, dy = (points - self._points).mean(axis=0)
+                face = (int(face[0] + dx), int(face[1] + dy), int(face[2] + dx), int(face[3] + dy))
+
+                self._points, self._last_face = points, face
+                np.copyto(self._previous, gray)
+                self.tracked_frames += 1
+
+                eye_points = [(int(round(x)), int(round(y))) for x, y in points]
+                return Detection(face, eye_points[:6], eye_points[6:])
+
+            self.reanchored_frames += 1
+
+        detection = self.detector.predict(gray, face)
+        if detection is None:
+            self._points = None
+            return None
+
+        self._points = np.array(detection.left_eye + detection.right_eye, dtype=np.float32)
+        self._frames_since_prediction = 0
+        np.copyto(self._previous, gray)
+        self.predicted_frames += 1
+
+        return detection
+
+
+def synthesize_eye_points(box: Rectangle, ratio: float) -> Points:
+    """Six points in the dlib order for an eye box, spaced so the eye's closeness ratio comes out as `ratio`."""
+    x1, y1, x2, y2 = box
+    width, center_y = x2 - x1, (y1 + y2) // 2
+    half_height = max(1, int(width / ratio / 2))
+
+    return [
+        (x1, center_y),
+        (x1 + width // 3, center_y - half_height),
+        (x1 + 2 * width // 3, center_y - half_height),
+        (x2, center_y),
+        (x1 + 2 * width // 3, center_y + half_height),
+        (x1 + width // 3, center_y + half_height),
+    ]
+
+
+class HaarEyeBackend(HaarBackend):
+    """
+    Finds the eyes with a Haar cascade instead of the shape predictor, for machines that can not afford it.
+
+    Eyes are searched in the upper part of the face scaled to a fixed width. Between full searches, which
+    happen every `HAAR_RESCAN_INTERVAL` frames or when an eye is lost, each eye is only searched in a small
+    window around where it was. An eye that is not found there is taken as closed. The points given for each
+    eye are synthesized from its box, so the same eye and blink logic works on them.
+    """
+    name = "haar-eyes"
+
+    def __init__(self) -> None:
+        super(HaarEyeBackend, self).__init__()
+
+        self._region_size = (HAAR_FACE_WIDTH, int(HAAR_FACE_WIDTH * HAAR_EYE_REGION_BOTTOM))
+        self._region = np.empty(self._region_size[::-1], dtype=np.uint8)
+
+        # image left and image right eyes in region coordinates, and for how many frames each was not found
+        self._eyes: List[Optional[Rectangle]] = [None, None]
+        self._misses = [0, 0]
+        self._frames_since_rescan = 0
+
+    def load(self) -> None:
+        get_face_cascade()
+        get_eye_cascade()
+
+    def reset(self) -> None:
+        super(HaarEyeBackend, self).reset()
+        self._eyes = [None, None]
+        self._misses = [0, 0]
+        self._frames_since_rescan = 0
+
+    def locate_face(self, gray: np.ndarray, scale: float = 1.0, interval: int = 1) -> Optional[Rectangle]:
+        if self._last_face is not None:
+            # no need to look for the face in more detail than the cascade's own window
+            last_width = self._last_face[2] - self._last_face[0]
+            scale = min(scale, max(0.25, int(HAAR_FACE_DETECTION_WIDTH / last_width * 8) / 8))
+
+        return super(HaarEyeBackend, self).locate_face(gray, scale, interval)
+
+    def _search(self, region: np.ndarray, min_width: int, max_width: int) -> List[Rectangle]:
+        return [
+            (x, y, x + w, y + h)
+            for x, y, w, h in get_eye_cascade().detectMultiScale(
+                region,
+                scaleFactor=1.15,
+                minNeighbors=3,
+                minSize=(min_width, min_width),
+                maxSize=(max_width, max_width)
+            )
+        ]
+
+    def _rescan(self) -> List[bool]:
+        """Searches the whole eye region, returns which eyes were found."""
+        self._frames_since_rescan = 0
+
+        middle = self._region_size[0] // 2
+        found = self._search(self._region, HAAR_FACE_WIDTH // 8, HAAR_FACE_WIDTH // 2)
+
+        opened = [False, False]
+        for side in (0, 1):
+            # the biggest one on each side of the face
+            candidates = [eye for eye in found if ((eye[0] + eye[2]) // 2 >= middle) == bool(side)]
+            if candidates:
+                self._eyes[side] = max(candidates, key=lambda eye: eye[2] - eye[0])
+                self._misses[side] = 0
+                opened[side] = True
+
+        return opened
+
+    def _track(self, side: int) -> bool:
+        """Looks for an eye around its last position, returns whether it was found."""
+        x1, y1, x2, y2 = self._eyes[side]
+        width = x2 - x1
+        margin = int(width * HAAR_EYE_WINDOW_MARGIN)
+
+        left, top = max(0, x1 - margin), max(0, y1 - margin)
+        window = self._region[top:y2 + margin, left:x2 + margin]
+        found = self._search(window, int(width * 0.75), int(width * 1.3) + 1)
+        if not found:
+            return False
+
+        center_x, center_y = (x1 + x2) / 2 - left, (y1 + y2) / 2 - top
+        x1, y1, x2, y2 = min(found, key=lambda eye: abs((eye[0] + eye[2]) / 2 - center_x) +
+                                                    abs((eye[1] + eye[3]) / 2 - center_y))
+        self._eyes[side] = (x1 + left, y1 + top, x2 + left, y2 + top)
+        return True
+
+    def predict(self, gray: np.ndarray, face: Rectangle) -> Optional[Detection]:
+        # the face box can reach past the frame's edges
+        x1, y1 = max(0, face[0]), max(0, face[1])
+        x2 = min(face[2], gray.shape[1])
+        region_bottom = min(face[1] + int((face[3] - face[1]) * HAAR_EYE_REGION_BOTTOM), gray.shape[0])
+        if x2 <= x1 or region_bottom <= y1:
+            return None
+
+        cv2.resize(gray[y1:region_bottom, x1:x2], self._region_size, dst=self._region, interpolation=cv2.INTER_AREA)
+
+        opened = [False, False]
+        self._frames_since_rescan += 1
+        if None in self._eyes or self._frames_since_rescan >= HAAR_RESCAN_INTERVAL or \
+                max(self._misses) >= HAAR_RESCAN_INTERVAL:
+            opened = self._rescan()
+
+        for side in (0, 1):
+            if self._eyes[side] is None or opened[side]:
+                continue
+
+            opened[side] = self._track(side)
+            self._misses[side] = 0 if opened[side] else self._misses[side] + 1
+
+        # back to frame coordinates
+        scale_x = (x2 - x1) / self._region_size[0]
+        scale_y = (region_bottom - y1) / self._region_size[1]
+
+        def to_frame(box: Rectangle) -> Rectangle:
+            return (x1 + int(box[0] * scale_x), y1 + int(box[1] * scale_y),
+                    x1 + int(box[2] * scale_x), y1 + int(box[3] * scale_y))
+
+        points = []
+        for side in (0, 1):
+            eye = self._eyes[side]
+            if eye is None:
+                # never found yet, so assume an open eye where eyes usually are
+                offset = self._region_size[0] // 5 + side * self._region_size[0] * 2 // 5
+                eye = (offset, self._region_size[1] * 2 // 5, offset + self._region_size[0] // 5,
+                       self._region_size[1] * 3 // 5)
+                opened[side] = True
+
+            points.append(synthesize_eye_points(to_frame(eye),
+                                                HAAR_OPEN_EYE_RATIO if opened[side] else HAAR_CLOSED_EYE_RATIO))
+
+        return Detection(face, points[0], points[1])
+
+
+class QualityLevel(NamedTuple):
+    backend: DetectorBackend
+    scale: float = 1.0
+    interval: int = 1
+
+    def __str__(self) -> str:
+        return f"{self.backend.name} x{self.scale} every {self.interval}"
+
+
+def default_quality_levels() -> List[QualityLevel]:
+    """From the most accurate to the cheapest."""
+    hog, haar = DlibHogBackend(), HaarBackend()
+    tracked = TrackedBackend(HaarBackend())
+
+    return [
+        QualityLevel(hog, 1.0, 1),
+        QualityLevel(hog, 0.75, 1),
+        QualityLevel(hog, 0.5, 1),
+        QualityLevel(haar, 0.5, 1),
+        QualityLevel(haar, 0.5, 3),
+        QualityLevel(tracked, 0.5, 5),
+        QualityLevel(tracked, 0.5, 15),
+    ]
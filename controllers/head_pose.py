@@ -0,0 +1,94 @@
+import math
+from typing import Optional, Tuple
+
+import _dlib_pybind11
+import cv2
+import numpy as np
+
+__all__ = ['HeadPoseEstimator', 'HEAD_POSE_LANDMARKS']
+
+# nose tip, chin, outer eye corners and mouth corners
+HEAD_POSE_LANDMARKS = [30, 8, 36, 45, 48, 54]
+
+# where those landmarks are on an average head, in mm.
+# x to the right of the image, y down and z away from the camera, so a frontal face has no rotation
+HEAD_MODEL_POINTS = np.array([
+    (0.0, 0.0, 0.0),
+    (0.0, 330.0, 65.0),
+    (-225.0, -170.0, 135.0),
+    (225.0, -170.0, 135.0),
+    (-150.0, 150.0, 125.0),
+    (150.0, 150.0, 125.0),
+], dtype=np.float64)
+
+NO_DISTORTION = np.zeros((4, 1), dtype=np.float64)
+
+
+class HeadPoseEstimator:
+    """
+    Estimates the yaw and pitch of the head from the landmarks the shape predictor has already found.
+
+    Yaw is positive when the user turns to their right and pitch is positive when they look down, both in radians.
+    Each frame starts from the last pose, so solvePnP only needs a couple of iterations.
+    """
+
+    def __init__(self) -> None:
+        self._frame_size: Optional[Tuple[int, int]] = None
+        self._camera_matrix: Optional[np.ndarray] = None
+
+        # reused every frame
+        self._image_points = np.empty((len(HEAD_POSE_LANDMARKS), 2), dtype=np.float64)
+        self._rotation = np.empty((3, 3), dtype=np.float64)
+
+        # last pose, None until the first estimate
+        self._rvec: Optional[np.ndarray] = None
+        self._tvec: Optional[np.ndarray] = None
+
+    def _prepare(self, frame_size: Tuple[int, int]) -> None:
+        width, height = frame_size
+
+        # webcams are not calibrated, but a pinhole with a focal length as long as the frame is wide is close enough
+        self._camera_matrix = np.array([
+            (width, 0, width / 2),
+            (0, width, height / 2),
+            (0, 0, 1)
+        ], dtype=np.float64)
+        self._frame_size = frame_size
+        self.reset()
+
+    def reset(self) -> None:
+        """Forgets the last pose, to be called when the face is lost."""
+        self._rvec = self._tvec = None
+
+    def estimate(self, landmarks: _dlib_pybind11.full_object_detection,
+                 frame_size: Tuple[int, int]) -> Optional[Tuple[float, float]]:
+        """Returns (yaw, pitch) of the head in a `frame_size` (width, height) frame, or None if there is no solution."""
+        if frame_size != self._frame_size:
+            self._prepare(frame_size)
+
+        for row, index in enumerate(HEAD_POSE_LANDMARKS):
+            point = landmarks.part(index)
+            self._image_points[row, 0] = point.x
+            self._image_points[row, 1] = point.y
+
+        if self._rvec is None:
+            successful, rvec, tvec = cv2.solvePnP(HEAD_MODEL_POINTS, self._image_points, self._camera_matrix,
+                                                  NO_DISTORTION, flags=cv2.SOLVEPNP_EPNP)
+        else:
+            successful, rvec, tvec = cv2.solvePnP(HEAD_MODEL_POINTS, self._image_points, self._camera_matrix,
+                                                  NO_DISTORTION, rvec=self._rvec, tvec=self._tvec,
+                                                  useExtrinsicGuess=True, flags=cv2.SOLVEPNP_ITERATIVE)
+
+        # a head behind the camera means the landmarks were off
+        if not successful or tvec[2, 0] <= 0:
+            self.reset()
+            return None
+
+        self._rvec, self._tvec = rvec, tvec
+
+        cv2.Rodrigues(rvec, dst=self._rotation)
+        r = self._rotation
+        pitch = math.atan2(r[2, 1], r[2, 2])
+        yaw = math.atan2(-r[2, 0], math.hypot(r[2, 1], r[2, 2]))
+
+        return yaw, pitch
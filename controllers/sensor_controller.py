@@ -1,15 +1,21 @@
 # https://github.com/mbientlab/MetaWear-SDK-Python
 
 import logging
+import time
 from typing import Callable
 
 from mbientlab.metawear import libmetawear, parse_value
 from mbientlab.metawear.cbindings import *
 
 from models.sensor import Sensor
+from utils import METRICS, SCHEDULING
 
 __all__ = ['SensorController']
 
+SENSOR_SAMPLES = METRICS.counter("sensor_samples_total", "Accelerometer samples received.")
+SENSOR_SAMPLE_RATE = METRICS.gauge("sensor_sample_rate_hz", "Accelerometer samples received per second.")
+SENSOR_BACKLOG = METRICS.gauge("sensor_backlog_seconds", "How long ago the last handled sample was taken.")
+
 
 class SensorController(object):
     def __init__(self, address: str, acc_callback: Callable = None, gyro_callback: Callable = None) -> None:
@@ -23,7 +29,30 @@ class SensorController(object):
         self._acc_preprocessor = FnVoid_VoidP_DataP(self.acc_preprocessor)
         self._gyro_preprocessor = FnVoid_VoidP_DataP(self.gyro_preprocessor)
 
+        # the callbacks come from the BLE library's own thread, which is set up on its first sample
+        self._thread_configured = False
+
+        # sample rate
+        self._rate_window_start = time.perf_counter()
+        self._rate_window_samples = 0
+
+    def _count_sample(self, epoch_ms: int) -> None:
+        SENSOR_SAMPLES.inc()
+        SENSOR_BACKLOG.set(time.time() - epoch_ms / 1000)
+
+        self._rate_window_samples += 1
+        now = time.perf_counter()
+        if now - self._rate_window_start >= 1.0:
+            SENSOR_SAMPLE_RATE.set(self._rate_window_samples / (now - self._rate_window_start))
+            self._rate_window_start, self._rate_window_samples = now, 0
+
     def acc_preprocessor(self, ctx: None, data) -> None:
+        if not self._thread_configured:
+            SCHEDULING.apply("sensor")
+            self._thread_configured = True
+
+        self._count_sample(data.contents.epoch)
+
         data: CartesianFloat = parse_value(data)
         logging.info(f"{self.sensor.address} -> {data}")
 
@@ -37,8 +66,11 @@ class SensorController(object):
         if self.gyro_callback:
             self.gyro_callback(data.y, data.z)
 
-    def connect(self) -> None:
-        self.sensor.connect()
+    def connect(self) -> bool:
+        return self.sensor.connect()
+
+    def cancel_connect(self) -> None:
+        self.sensor.cancel_connect()
 
     def start_acc_capturing(self) -> None:
         self.__setup_acc()
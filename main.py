@@ -1,13 +1,21 @@
+import functools
 import logging
+import math
 import time
+from concurrent.futures import Executor, ThreadPoolExecutor
+from time import perf_counter
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Tuple
+from typing import Callable, Dict, List, Optional, Tuple
 import threading
-import cv2
 
-from controllers import CameraControllerDlib, SensorController
+from controllers import CameraControllerDlib, CameraControllerHaar, FlowEyeBackend, SensorController
 from models import Cursor, Eye
-from utils import TemporaryText
+from models.cursor import AbstractCursor
+from server.event_bus import EventType, GestureEventBus
+from server.frame_publisher import FramePublisher
+from utils import Calibration, CalibrationStore, CaptureRateGovernor, EyeTokenizer, Gesture, GestureRecognizer, \
+    HeadTokenizer, METRICS, MotionGate, PROFILER, SCHEDULING, TRACER, TemporaryText, TimeoutScheduler, Token, calibration_key, \
+    compile_gestures
 
 SENSOR_ADDRESS = "FA:49:1B:40:C1:DF"
 SENSOR_DEADZONE = 30
@@ -16,19 +24,113 @@ BLINK_SHORT_THRESHOLD_MS = 135  # average blink duration is between 100 and 400
 BLINK_LONG_THRESHOLD_MS = 550
 BLINK_DETECTION_RATIO = 6.5
 EVENT_DETECTION_DURATION_MS = 750
+FRAME_BUDGET_MS = 50  # p95 processing time per frame before the camera steps down to a cheaper detector
+IDLE_CAPTURE_INTERVAL_MS = 50  # time between processed frames while the eyes are steadily open
+CPU_CEILING = 0.75  # in cores
+HEAD_POSE_GAIN = 3  # the sensor sends about 3 samples per camera frame
+HEAD_GESTURE_THRESHOLD = 250  # in the same units as the sensor dead-zone
+MOTION_GATE_THRESHOLD = 2.5  # average gray level change in the eye region before the landmarks are inferred again
+MOTION_GATE_REFRESH_FRAMES = 4  # landmarks are inferred at least every this many frames
+
+GESTURES = [
+    Gesture("single_blink", (Token.BLINK,)),
+    Gesture("double_blink", (Token.BLINK, Token.BLINK)),
+    Gesture("multiple_blinks", (Token.BLINK, Token.BLINK, Token.BLINK), repeat_last=True),
+    Gesture("long_close", (Token.LONG_CLOSE,)),
+    Gesture("left_wink", (Token.WINK_LEFT,)),
+    Gesture("right_wink", (Token.WINK_RIGHT,)),
+    Gesture("nod", (Token.HEAD_DOWN, Token.HEAD_DOWN)),
+    Gesture("shake", (Token.HEAD_LEFT, Token.HEAD_RIGHT)),
+    Gesture("shake", (Token.HEAD_RIGHT, Token.HEAD_LEFT)),
+]
+# gesture -> cursor command and blink type.
+# the other gestures are only shown and published until they get a command
+GESTURE_COMMANDS = {
+    "single_blink"   : ("left_click", "single"),
+    "double_blink"   : ("double_left_click", "double"),
+    "multiple_blinks": ("right_click", "multiple"),
+    # a long closure was a blink like any other before there were gestures
+    "long_close"     : ("left_click", "single"),
+}
+# blink gestures are also published as BLINK events, with the number of blinks they were made of,
+# which is what the bus sent before there were gestures
+BLINK_GESTURES = {"single_blink", "double_blink", "multiple_blinks", "long_close"}
+
+BLINK_DETECTIONS = {
+    blink_type: METRICS.counter("blink_detections_total", "Detected blink sequences.", {"type": blink_type})
+    for blink_type in ("single", "double", "multiple")
+}
+CURSOR_COMMAND_LATENCY = {
+    command: METRICS.histogram("cursor_command_seconds", "Time spent dispatching cursor commands.",
+                               {"command": command})
+    for command in ("move", "left_click", "double_left_click", "right_click")
+}
+TIME_TO_FIRST_ACTION = METRICS.gauge("time_to_first_action_seconds",
+                                     "Time from startup to the first cursor action.")
+
+# the time in ms, the frame id and capture time, and since when frames were skipped, in ms
+FrameContext = Tuple[float, Tuple[int, float], Optional[float]]
 
 
 class MainController(object):
-    def __init__(self) -> None:
-        self.sensor: SensorController = SensorController(address=SENSOR_ADDRESS, acc_callback=self.sensor_data_handler)
-        self.camera: CameraControllerDlib = CameraControllerDlib(eye_callback=self.event_driven_double_blink_algorithm,
-                                                                 blink_threshold=BLINK_DETECTION_RATIO)
-
-        self.cursor: Cursor = Cursor(use_center_as_starting_point=True, allow_external_movement=True)
-
-        # used to calibrate first position
-        self.first_x: Optional[int] = None
-        self.first_y: Optional[int] = None
+    def __init__(self, cursor: Optional[AbstractCursor] = None, use_camera: bool = True,
+                 use_sensor: bool = True, event_bus: Optional[GestureEventBus] = None,
+                 use_head_pose: bool = False, show_preview: bool = True,
+                 frame_publisher: Optional[FramePublisher] = None, low_cost_camera: bool = False,
+                 calibration_store: Optional[CalibrationStore] = None, user: Optional[str] = None,
+                 eye_flow: bool = False, clock: Callable[[], float] = perf_counter) -> None:
+        # gestures and the capture rate go by this, a virtual clock in offline runs
+        self.clock = clock
+
+        self.sensor: Optional[SensorController] = None
+        if use_sensor:
+            self.sensor = SensorController(address=SENSOR_ADDRESS, acc_callback=self.sensor_data_handler)
+
+        self.camera: Optional[CameraControllerDlib] = None
+        if use_camera:
+            if use_head_pose and low_cost_camera:
+                logging.error("The head pose needs the 68 face landmarks, which the low-cost camera does not find. "
+                              "The cursor will not move.")
+
+            # the haar controller finds the eyes without the shape predictor, for low-end machines
+            camera_class = CameraControllerHaar if low_cost_camera else CameraControllerDlib
+            # or the shape predictor runs only every few frames, and the eye points are tracked in between
+            backend = {"backend": FlowEyeBackend()} if eye_flow and not low_cost_camera else {}
+            self.camera = camera_class(eye_callback=self.gesture_algorithm,
+                                       blink_threshold=BLINK_DETECTION_RATIO,
+                                       frame_budget_ms=FRAME_BUDGET_MS,
+                                       # skipping frames while the eyes are idle would stall the cursor
+                                       rate_governor=None if use_head_pose else CaptureRateGovernor(
+                                           blink_threshold=BLINK_DETECTION_RATIO,
+                                           idle_interval_ms=IDLE_CAPTURE_INTERVAL_MS,
+                                           cpu_ceiling=CPU_CEILING),
+                                       head_pose_callback=self.head_pose_handler if use_head_pose else None,
+                                       show_preview=show_preview,
+                                       frame_publisher=frame_publisher,
+                                       motion_gate=MotionGate(MOTION_GATE_THRESHOLD, MOTION_GATE_REFRESH_FRAMES),
+                                       clock=clock,
+                                       **backend)
+
+        # opened during startup unless one is given
+        self.cursor: Optional[AbstractCursor] = cursor
+        # clicks wait between pressing and releasing, so a runtime that must not block can run them elsewhere.
+        # it has to run them one at a time, in order
+        self.click_executor: Optional[Executor] = None
+
+        # lets other local apps receive the detected gestures
+        self.event_bus = event_bus
+
+        # the neutral head pose, dead-zone and blink threshold, kept between runs if there is a store
+        self.calibration = Calibration(SENSOR_DEADZONE, BLINK_DETECTION_RATIO)
+        self.calibration_store = calibration_store
+        self.calibration_key: Optional[str] = None
+        if calibration_store:
+            self.calibration_key = calibration_key(
+                *([SENSOR_ADDRESS] if use_sensor else []),
+                *([f"camera-{'haar' if low_cost_camera else 'dlib'}"] if use_camera else []),
+                user=user)
+        if calibration_store and calibration_store.load(self.calibration_key, self.calibration):
+            logging.info(f"Loaded the calibration of {self.calibration_key}.")
 
         # individual eyes
         self.individual_eye_cache: Dict[Eye.Type, Dict[Eye.State, Tuple[bool, Optional[datetime]]]] = {
@@ -45,39 +147,169 @@ class MainController(object):
         # both eyes
         self.last_both_eyes_state: Optional[Tuple[Eye.State, datetime, bool]] = None
         self.last_eye_blink_times: List[datetime] = []
+        self._last_blink_frame: Tuple[int, float] = (0, 0.0)
         self.execute_action_at: Optional[datetime] = None
 
-        self.key_scan_thread = threading.Thread(target=self.check_reset_input)
+        # gestures, compiled once. adding one does not add anything to the per-frame work
+        self.gesture_scheduler = TimeoutScheduler()
+        self.gesture_recognizer = GestureRecognizer(compile_gestures(GESTURES), self.gesture_handler,
+                                                    self.gesture_scheduler, timeout_ms=EVENT_DETECTION_DURATION_MS)
+        self.eye_tokenizer = EyeTokenizer(self.calibration.blink_threshold, BLINK_SHORT_THRESHOLD_MS,
+                                          BLINK_LONG_THRESHOLD_MS)
+        self.head_tokenizer = HeadTokenizer(HEAD_GESTURE_THRESHOLD)
+
+        self.key_scan_thread = threading.Thread(target=self.check_reset_input, name="hotkeys", daemon=True)
+        self._trace_key_was_pressed = self._profile_key_was_pressed = False
+        self._stopped = threading.Event()
+
+        # startup
+        self._started_at: Optional[float] = None
+        self._first_action_done = False
+        self._sensor_started = False
+
+    def add_temporary_text(self, text: TemporaryText) -> None:
+        if self.camera:
+            self.camera.add_temporary_text(text)
+
+    def publish(self, event_type: EventType, *values) -> None:
+        if self.event_bus:
+            self.event_bus.publish(event_type, *values)
 
     def _reset_sensor_calibration_callback(self):
-        self.first_x = self.first_y = None
+        self.calibration.reset_neutral()
+
+    def save_calibration(self, only_if_due: bool = False) -> None:
+        if not self.calibration_store:
+            return
+
+        if only_if_due:
+            self.calibration_store.save_if_due(self.calibration_key, self.calibration)
+        else:
+            self.calibration_store.save(self.calibration_key, self.calibration)
 
     def check_reset_input(self):
         logging.info('Starting input scan.')
-        while True:
-            if self.cursor.key_is_pressed('R'):
-                logging.info('Resetting sensor calibration.')
-                self._reset_sensor_calibration_callback()
-
+        SCHEDULING.apply("hotkeys")
+        while not self._stopped.is_set():
+            self.poll_hotkeys()
+            self.save_calibration(only_if_due=True)
             time.sleep(0.1)
 
+    def poll_hotkeys(self) -> None:
+        if self.cursor.key_is_pressed('R'):
+            logging.info('Resetting sensor calibration.')
+            self._reset_sensor_calibration_callback()
+
+        # dump once per key press, not for as long as it is held
+        trace_key_is_pressed = TRACER.enabled and self.cursor.key_is_pressed('T')
+        if trace_key_is_pressed and not self._trace_key_was_pressed:
+            TRACER.dump(f"trace-{datetime.now():%Y%m%d-%H%M%S}.json")
+        self._trace_key_was_pressed = trace_key_is_pressed
+
+        profile_key_is_pressed = self.cursor.key_is_pressed('P')
+        if profile_key_is_pressed and not self._profile_key_was_pressed:
+            PROFILER.request("camera")
+        self._profile_key_was_pressed = profile_key_is_pressed
+
     def sensor_data_handler(self, x: float, y: float) -> None:
+        # profiled where the sample is handled, which is the loop's thread in the asyncio runtime
+        PROFILER.begin("sensor")
+        self._tilt_handler(x, y)
+        PROFILER.end("sensor")
+
+    def _tilt_handler(self, x: float, y: float) -> None:
         # make them int
         x_pos = x * 1000
         y_pos = y * -1000  # invert y
 
-        if self.first_x is None:
-            self.first_x, self.first_y = x_pos, y_pos
-
-        x_pos -= self.first_x
-        y_pos -= self.first_y
+        x_pos, y_pos = self.calibration.observe_tilt(x_pos, y_pos)
 
         # dead-zone check
-        x_pos = 0 if -SENSOR_DEADZONE < x_pos < SENSOR_DEADZONE else (x_pos - SENSOR_DEADZONE if x_pos > 0 else x_pos + SENSOR_DEADZONE)
-        y_pos = 0 if -SENSOR_DEADZONE < y_pos < SENSOR_DEADZONE else (y_pos - SENSOR_DEADZONE if y_pos > 0 else y_pos + SENSOR_DEADZONE)
+        deadzone = self.calibration.deadzone
+        x_pos = 0 if -deadzone < x_pos < deadzone else (x_pos - deadzone if x_pos > 0 else x_pos + deadzone)
+        y_pos = 0 if -deadzone < y_pos < deadzone else (y_pos - deadzone if y_pos > 0 else y_pos + deadzone)
+
+        self.publish(EventType.SENSOR_DELTA, x_pos, y_pos)
+
+        now_ms = self.clock() * 1000
+        token = self.head_tokenizer.feed(x_pos, y_pos, now_ms)
+        if token:
+            self.gesture_recognizer.feed(token, now_ms)
+        self.gesture_scheduler.poll(now_ms)
+
+        started = perf_counter()
+        self.cursor.move(x_pos // (1000 // SENSOR_SENSITIVITY), y_pos // (1000 // SENSOR_SENSITIVITY))
+        CURSOR_COMMAND_LATENCY["move"].observe(perf_counter() - started)
+
+        if not self._first_action_done and (x_pos or y_pos):
+            self._record_first_action()
+
+    def head_pose_handler(self, yaw: float, pitch: float) -> None:
+        """Moves the cursor with the head pose the camera sees, the same way the sensor does."""
+        # the sensor reports the tilt as the sine of the angle, in g
+        self._tilt_handler(math.sin(yaw) * HEAD_POSE_GAIN, -math.sin(pitch) * HEAD_POSE_GAIN)
+
+    def frame_context(self) -> FrameContext:
+        """
+        When the current frame is being handled, the frame itself, and since when frames were skipped before it.
+        Read on the camera's thread, before it moves on to the next frame.
+        """
+        # a closure may have begun on a frame the governor skipped
+        governor = self.camera.rate_governor if self.camera else None
+        closed_after_ms = governor.skipped_since * 1000 if governor and governor.skipped_since is not None else None
+
+        return self.clock() * 1000, TRACER.current_frame, closed_after_ms
+
+    def gesture_algorithm(self, left_eye: Eye, right_eye: Eye, context: Optional[FrameContext] = None) -> None:
+        """
+        Feeds the eyes into the gesture recognizer, which calls `gesture_handler`.
+        `context` is the `frame_context` of the frame the eyes are from, read now if not given.
+        """
+        self.publish(EventType.EYE_RATIOS, left_eye.closeness_ratio, right_eye.closeness_ratio)
+
+        self.calibration.observe_eyes(left_eye.closeness_ratio, right_eye.closeness_ratio)
+        self.eye_tokenizer.threshold = self.calibration.blink_threshold
+        if self.camera:
+            self.camera.blink_threshold = self.eye_tokenizer.threshold
+
+        now_ms, frame, closed_after_ms = context or self.frame_context()
+        token = self.eye_tokenizer.feed(left_eye.closeness_ratio, right_eye.closeness_ratio, now_ms, closed_after_ms)
+        if token:
+            # a gesture may be reported later from a timeout, when another frame is current
+            self.gesture_recognizer.feed(token, now_ms, frame)
+        self.gesture_scheduler.poll(now_ms)
+
+    def gesture_handler(self, gesture: str, frame: Optional[Tuple[int, float]] = None, tokens: int = 1) -> None:
+        """
+        `frame` is the id and capture time of the frame the gesture ended on, None for the sensor's gestures.
+        `tokens` is the number of tokens the gesture was made of.
+        """
+        logging.info(f"Gesture recognized: {gesture}.")
+        self.publish(EventType.GESTURE, gesture.encode())
+        if gesture in BLINK_GESTURES:
+            self.publish(EventType.BLINK, min(tokens, 255))
+        self.add_temporary_text(TemporaryText(gesture.replace("_", " ").capitalize()))
+
+        if gesture not in GESTURE_COMMANDS.keys():
+            return
 
-        self.cursor.move_in_x_axis(x_pos // (1000 // SENSOR_SENSITIVITY))
-        self.cursor.move_in_y_axis(y_pos // (1000 // SENSOR_SENSITIVITY))
+        command, blink_type = GESTURE_COMMANDS[gesture]
+        if self.click_executor:
+            self.click_executor.submit(self._click, command, blink_type, frame)
+        else:
+            self._click(command, blink_type, frame)
+
+    def _click(self, command: str, blink_type: str, frame: Optional[Tuple[int, float]]) -> None:
+        started = perf_counter()
+        getattr(self.cursor, command)()
+        finished = perf_counter()
+
+        CURSOR_COMMAND_LATENCY[command].observe(finished - started)
+        if not self._first_action_done:
+            self._record_first_action()
+        frame_id, captured_at = frame or (0, started)
+        TRACER.record(command, started, finished, frame_id, captured_at)
+        BLINK_DETECTIONS[blink_type].inc()
 
     def state_driven_individual_blink_algorithm(self, left_eye: Eye, right_eye: Eye) -> None:
         def blink_handler(_eye: Eye) -> None:
@@ -150,18 +382,34 @@ class MainController(object):
         def decide_action_and_execute():
             if len(self.last_eye_blink_times) == 0:
                 return
-            elif len(self.last_eye_blink_times) == 1:
+
+            self.publish(EventType.BLINK, min(len(self.last_eye_blink_times), 255))
+
+            started = perf_counter()
+            if len(self.last_eye_blink_times) == 1:
                 self.cursor.left_click()
-                self.camera.add_temporary_text(TemporaryText("Single blink"))
+                command, blink_type = "left_click", "single"
+                self.add_temporary_text(TemporaryText("Single blink"))
             elif len(self.last_eye_blink_times) == 2:
                 self.cursor.double_left_click()
-                self.camera.add_temporary_text(TemporaryText("Double blink"))
+                command, blink_type = "double_left_click", "double"
+                self.add_temporary_text(TemporaryText("Double blink"))
             else:
                 self.cursor.right_click()
-                self.camera.add_temporary_text(TemporaryText("Triple or more blinks"))
+                command, blink_type = "right_click", "multiple"
+                self.add_temporary_text(TemporaryText("Triple or more blinks"))
+
+            finished = perf_counter()
+            CURSOR_COMMAND_LATENCY[command].observe(finished - started)
+            if not self._first_action_done:
+                self._record_first_action()
+            TRACER.record(command, started, finished, *self._last_blink_frame)
+            BLINK_DETECTIONS[blink_type].inc()
 
         now = datetime.now()
 
+        self.publish(EventType.EYE_RATIOS, left_eye.closeness_ratio, right_eye.closeness_ratio)
+
         # threshold check
         ratio = (left_eye.closeness_ratio + right_eye.closeness_ratio) / 2
         current_state: Eye.State = Eye.State.CLOSED if ratio > BLINK_DETECTION_RATIO else Eye.State.OPEN
@@ -182,6 +430,8 @@ class MainController(object):
             if before_state == Eye.State.CLOSED and diff_in_ms > BLINK_SHORT_THRESHOLD_MS:
                 logging.info("Blink detected.")
                 self.last_eye_blink_times.append(now)
+                # the action runs on a later frame
+                self._last_blink_frame = TRACER.current_frame
                 if not self.execute_action_at:
                     self.execute_action_at = now + timedelta(milliseconds=EVENT_DETECTION_DURATION_MS)
                 else:
@@ -193,18 +443,91 @@ class MainController(object):
             self.execute_action_at = None
             self.last_eye_blink_times.clear()
 
+    def _record_first_action(self) -> None:
+        self._first_action_done = True
+        if self._started_at is None:
+            return
+
+        time_to_first_action = perf_counter() - self._started_at
+        TIME_TO_FIRST_ACTION.set(time_to_first_action)
+        logging.info(f"First cursor action {time_to_first_action:.2f} seconds after startup.")
+
+    def _open_cursor(self) -> None:
+        if self.cursor is None:
+            self.cursor = Cursor(use_center_as_starting_point=True, allow_external_movement=True)
+
+    def _start_sensor(self, cursor_ready) -> bool:
+        if not self.sensor.connect():
+            return False
+
+        # samples move the cursor, so it has to be there first
+        cursor_ready.result()
+        self.sensor.start_acc_capturing()
+        self._sensor_started = True
+
+        logging.info("Sensor is ready, head movement is enabled.")
+        return True
+
     def run(self):
+        """Opens everything concurrently and starts with whichever input is ready first."""
+        self._started_at = perf_counter()
+
+        if self.event_bus:
+            self.event_bus.start()
+
+        executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="startup",
+                                      initializer=functools.partial(SCHEDULING.apply, "startup"))
+        cursor_ready = executor.submit(self._open_cursor)
+        camera_ready = executor.submit(self.camera.open_device) if self.camera else None
+        models_ready = executor.submit(self.camera.load_models) if self.camera else None
+        sensor_ready = executor.submit(self._start_sensor, cursor_ready) if self.sensor else None
+        executor.shutdown(wait=False)
+
+        cursor_ready.result()
         self.key_scan_thread.start()
 
-        self.sensor.connect()
-        self.sensor.start_acc_capturing()
+        if camera_ready and camera_ready.result():
+            models_ready.result()
+            if sensor_ready and not sensor_ready.done():
+                logging.info("Camera is ready, starting in blink-only mode until the sensor connects.")
+
+            # the camera loop has to run on the main thread because of the preview window
+            SCHEDULING.apply("camera")
+            self.camera.start_capturing()
+
+        elif sensor_ready and sensor_ready.result():
+            logging.info("Camera is not available, running in sensor-only mode.")
+            self._stopped.wait()
 
-        self.camera.start_capturing()
+        elif not self._stopped.is_set():
+            logging.error("Neither the camera nor the sensor is available.")
+
+        # do not keep retrying the sensor after the camera loop has ended
+        if self.sensor:
+            self.sensor.cancel_connect()
 
     def stop(self):
-        self.key_scan_thread.join()
+        self._stopped.set()
+        if self.sensor:
+            # a startup thread may still be retrying the connection, which keeps the process alive
+            self.sensor.cancel_connect()
+
+        if self.key_scan_thread.is_alive():
+            self.key_scan_thread.join()
+
+        if self.camera:
+            self.camera.stop()
+
+        if self.sensor:
+            if self._sensor_started:
+                self.sensor.stop_acc_capturing()
+                self.sensor.disconnect()
+
+        if self.event_bus:
+            self.event_bus.stop()
 
-        self.camera.stop()
+        # opened during startup, which may have failed before it
+        if self.cursor:
+            self.cursor.close()
 
-        self.sensor.stop_acc_capturing()
-        self.sensor.disconnect()
+        self.save_calibration()
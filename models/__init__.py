@@ -1,8 +1,12 @@
+import os
 import platform
 
 # Cursor
 if platform.system() == "Windows":
     from .cursor_win32 import WindowsCursor as Cursor
+elif os.environ.get('WAYLAND_DISPLAY') or not os.environ.get('DISPLAY'):
+    # XTest needs an X display, so use a virtual uinput pointer instead
+    from .cursor_uinput import UInputCursor as Cursor
 else:
     from .cursor_xlib import LinuxCursor as Cursor
 
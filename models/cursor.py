@@ -64,6 +64,18 @@ class AbstractCursor(ABC):
 
         return self.x
 
+    def move(self, x_magnitude: int = 0, y_magnitude: int = 0) -> Tuple[int, int]:
+        """Moves in both axes with a single position update."""
+        if self.allow_external_movement:
+            self._update_coords_from_os()
+
+        new_x, new_y = self.x + int(x_magnitude), self.y + int(y_magnitude)
+        if (new_x, new_y) != (self.x, self.y):
+            self._x, self._y = new_x, new_y
+            self.update_pos()
+
+        return self.x, self.y
+
     def left_click(self) -> None:
         logging.debug("Left clicking...")
         self.press_left_click()
@@ -83,6 +95,10 @@ class AbstractCursor(ABC):
         time.sleep(0.05)
         self.left_click()
 
+    def close(self) -> None:
+        """Releases what the cursor holds on to, if anything."""
+        pass
+
     def _update_coords_from_os(self) -> None:
         # this is useful if we're getting out of bounds
         # or if the cursor was moved externally
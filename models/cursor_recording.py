@@ -0,0 +1,50 @@
+from collections import deque
+from typing import Deque, Tuple
+
+from models.cursor import AbstractCursor
+
+
+class RecordingCursor(AbstractCursor):
+    """Only records what it is asked to do, for benchmarks and offline runs."""
+
+    def __init__(self, *args, screen_size: Tuple[int, int] = (1920, 1080), history: int = 10000, **kwargs):
+        self._screen_size = screen_size
+
+        # the last (command, x, y) in order
+        self.commands: Deque[Tuple[str, int, int]] = deque(maxlen=history)
+
+        super(RecordingCursor, self).__init__(*args, **kwargs)
+
+    def get_screen_size(self) -> Tuple[int, int]:
+        return self._screen_size
+
+    def get_current_pos(self) -> Tuple[int, int]:
+        return self.x, self.y
+
+    def press_left_click(self) -> None:
+        self.commands.append(("press_left_click", self.x, self.y))
+
+    def release_left_click(self) -> None:
+        self.commands.append(("release_left_click", self.x, self.y))
+
+    def press_right_click(self) -> None:
+        self.commands.append(("press_right_click", self.x, self.y))
+
+    def release_right_click(self) -> None:
+        self.commands.append(("release_right_click", self.x, self.y))
+
+    def update_pos(self) -> None:
+        self.commands.append(("move", self.x, self.y))
+
+    def key_is_pressed(self, key: str) -> bool:
+        return False
+
+    # clicks are recorded without the pauses a real click needs
+    def left_click(self) -> None:
+        self.commands.append(("left_click", self.x, self.y))
+
+    def right_click(self) -> None:
+        self.commands.append(("right_click", self.x, self.y))
+
+    def double_left_click(self) -> None:
+        self.commands.append(("double_left_click", self.x, self.y))
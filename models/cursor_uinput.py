@@ -0,0 +1,196 @@
+# https://www.kernel.org/doc/html/latest/input/uinput.html
+
+import fcntl
+import logging
+import os
+import struct
+import threading
+from typing import List, Optional, Tuple
+
+from models.cursor import AbstractCursor
+
+__all__ = ['UInputCursor', 'UInputDevice', 'RecordingUInputDevice']
+
+UINPUT_PATH = "/dev/uinput"
+UINPUT_DEVICE_NAME = b"CursorControlWithGestures"
+
+# linux/input-event-codes.h
+EV_SYN = 0x00
+EV_KEY = 0x01
+EV_REL = 0x02
+SYN_REPORT = 0x00
+REL_X = 0x00
+REL_Y = 0x01
+BTN_LEFT = 0x110
+BTN_RIGHT = 0x111
+BUS_VIRTUAL = 0x06
+
+# linux/uinput.h
+UI_DEV_CREATE = 0x5501
+UI_DEV_DESTROY = 0x5502
+UI_SET_EVBIT = 0x40045564
+UI_SET_KEYBIT = 0x40045565
+UI_SET_RELBIT = 0x40045566
+
+# struct input_event { struct timeval time; __u16 type; __u16 code; __s32 value; }
+INPUT_EVENT = struct.Struct('llHHi')
+# struct uinput_user_dev { char name[80]; struct input_id id; __u32 ff_effects_max; __s32 abs*[64] x 4; }
+UINPUT_USER_DEV = struct.Struct('80sHHHHI256i')
+
+Event = Tuple[int, int, int]  # type, code, value
+
+
+class UInputDevice(object):
+    """A virtual relative pointer created through /dev/uinput."""
+
+    def __init__(self, path: str = UINPUT_PATH, name: bytes = UINPUT_DEVICE_NAME) -> None:
+        self._fd = os.open(path, os.O_WRONLY | os.O_NONBLOCK)
+
+        fcntl.ioctl(self._fd, UI_SET_EVBIT, EV_SYN)
+        fcntl.ioctl(self._fd, UI_SET_EVBIT, EV_KEY)
+        fcntl.ioctl(self._fd, UI_SET_EVBIT, EV_REL)
+        for button in (BTN_LEFT, BTN_RIGHT):
+            fcntl.ioctl(self._fd, UI_SET_KEYBIT, button)
+        for axis in (REL_X, REL_Y):
+            fcntl.ioctl(self._fd, UI_SET_RELBIT, axis)
+
+        # legacy setup is used because UI_DEV_SETUP needs kernel 4.5+
+        os.write(self._fd, UINPUT_USER_DEV.pack(name, BUS_VIRTUAL, 0x1, 0x1, 1, 0, *([0] * 256)))
+        fcntl.ioctl(self._fd, UI_DEV_CREATE)
+
+        logging.info(f"Created uinput device at {path}.")
+
+    def write(self, data: bytes) -> None:
+        os.write(self._fd, data)
+
+    def close(self) -> None:
+        if self._fd is None:
+            return
+
+        fcntl.ioctl(self._fd, UI_DEV_DESTROY)
+        os.close(self._fd)
+        self._fd = None
+
+
+class RecordingUInputDevice(object):
+    """Stand-in for `UInputDevice` that keeps everything written to it in memory."""
+
+    def __init__(self) -> None:
+        self.writes: List[bytes] = []
+        self.closed = False
+
+    def write(self, data: bytes) -> None:
+        self.writes.append(data)
+
+    def close(self) -> None:
+        self.closed = True
+
+    @property
+    def events(self) -> List[Event]:
+        """Every written event in order, including the SYN_REPORTs."""
+        events = []
+        for data in self.writes:
+            for _, _, event_type, code, value in INPUT_EVENT.iter_unpack(data):
+                events.append((event_type, code, value))
+
+        return events
+
+    @property
+    def reports(self) -> List[List[Event]]:
+        """Written events grouped by the SYN_REPORT that terminates them."""
+        reports, current = [], []
+        for event in self.events:
+            if event == (EV_SYN, SYN_REPORT, 0):
+                reports.append(current)
+                current = []
+            else:
+                current.append(event)
+
+        return reports
+
+
+class UInputCursor(AbstractCursor):
+    """
+    Moves the cursor with relative events, so it does not need an X display.
+    Works under Wayland and in headless sessions as long as /dev/uinput is writable.
+
+    The position is only tracked locally; the compositor may apply pointer acceleration to the deltas.
+    """
+
+    def __init__(self, *args, device: Optional[UInputDevice] = None, screen_size: Tuple[int, int] = (1920, 1080),
+                 **kwargs):
+        self._device = device or UInputDevice()
+        self._screen_size = screen_size
+
+        # events waiting for the next SYN_REPORT.
+        # clicks may come from another thread than the moves, each report is queued and written under the lock
+        self._pending: List[Event] = []
+        self._lock = threading.Lock()
+
+        super(UInputCursor, self).__init__(*args, **kwargs)
+
+        # the position the device has been moved to so far
+        self._emitted_x, self._emitted_y = self.x, self.y
+
+        logging.warning("The uinput cursor cannot read the keyboard, so the reset and trace hotkeys are unavailable.")
+
+    def get_screen_size(self) -> Tuple[int, int]:
+        return self._screen_size
+
+    def get_current_pos(self) -> Tuple[int, int]:
+        # uinput is write-only, so there is nothing to query
+        return self.x, self.y
+
+    def press_left_click(self) -> None:
+        self._send(EV_KEY, BTN_LEFT, 1)
+
+    def release_left_click(self) -> None:
+        self._send(EV_KEY, BTN_LEFT, 0)
+
+    def press_right_click(self) -> None:
+        self._send(EV_KEY, BTN_RIGHT, 1)
+
+    def release_right_click(self) -> None:
+        self._send(EV_KEY, BTN_RIGHT, 0)
+
+    def update_pos(self) -> None:
+        with self._lock:
+            self._queue_motion()
+            self._flush()
+
+    def key_is_pressed(self, key: str) -> bool:
+        # uinput only emits events, it cannot read the keyboard
+        return False
+
+    def close(self) -> None:
+        self._device.close()
+
+    def _send(self, event_type: int, code: int, value: int) -> None:
+        with self._lock:
+            self._queue(event_type, code, value)
+            self._flush()
+
+    def _queue(self, event_type: int, code: int, value: int) -> None:
+        # pending motion goes first so a click lands where the cursor is meant to be
+        if event_type != EV_REL:
+            self._queue_motion()
+
+        self._pending.append((event_type, code, value))
+
+    def _queue_motion(self) -> None:
+        dx, dy = self.x - self._emitted_x, self.y - self._emitted_y
+        if dx:
+            self._pending.append((EV_REL, REL_X, dx))
+        if dy:
+            self._pending.append((EV_REL, REL_Y, dy))
+
+        self._emitted_x, self._emitted_y = self.x, self.y
+
+    def _flush(self) -> None:
+        """Writes the pending events and a single SYN_REPORT in one system call."""
+        if not self._pending:
+            return
+
+        self._pending.append((EV_SYN, SYN_REPORT, 0))
+        self._device.write(b''.join(INPUT_EVENT.pack(0, 0, *event) for event in self._pending))
+        self._pending.clear()
@@ -2,7 +2,7 @@ import logging
 import os
 from typing import Tuple
 
-from Xlib import X
+from Xlib import X, XK
 from Xlib.display import Display
 from Xlib.ext.xtest import fake_input
 
@@ -47,6 +47,11 @@ class LinuxCursor(AbstractCursor):
         fake_input(self._display, X.MotionNotify, x=self.x, y=self.y)
         self._sync_display()
 
+    def key_is_pressed(self, key: str) -> bool:
+        keycode = self._display.keysym_to_keycode(XK.string_to_keysym(key.lower()))
+        keymap = self._display.query_keymap()
+        return bool(keymap[keycode // 8] & (1 << (keycode % 8)))
+
     def _sync_display(self):
         try:
             self._display.sync()
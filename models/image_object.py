@@ -94,6 +94,11 @@ class Eye(DetectedObject):
             point: _dlib_pybind11.point = all_landmarks.part(_landmark)
             landmarks.append((point.x, point.y))
 
+        return cls.get_from_points(base_image, face, eye_type, landmarks, state_threshold)
+
+    @classmethod
+    def get_from_points(cls, base_image: np.ndarray, face: Face, eye_type: Type,
+                        landmarks: List[Tuple[int, int]], state_threshold: float = 6.0) -> Eye:
         # generate rectangle coordinates
         highest_y = max(landmarks[1][1], landmarks[2][1]) - face.y1
         lowest_y = min(landmarks[4][1], landmarks[5][1]) - face.y1
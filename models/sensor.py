@@ -1,6 +1,7 @@
 # https://github.com/mbientlab/MetaWear-SDK-Python
 
 import logging
+import threading
 import time
 
 from mbientlab.metawear import MetaWear
@@ -13,9 +14,12 @@ class Sensor(MetaWear):
     def __init__(self, address: str, **kwargs) -> None:
         super(Sensor, self).__init__(address, **kwargs)
 
-    def connect(self) -> None:
+        # lets another thread give up on connecting
+        self._connect_cancelled = threading.Event()
+
+    def connect(self) -> bool:
         attempts = 0
-        while attempts < 1000:
+        while attempts < 1000 and not self._connect_cancelled.is_set():
             try:
                 super(Sensor, self).connect()
 
@@ -23,9 +27,14 @@ class Sensor(MetaWear):
                 logging.warning("Sensor connection could not be established. This is normal on Windows. Re-trying...")
                 logging.error(e)
                 attempts += 1
-                time.sleep(0.5)
+                self._connect_cancelled.wait(0.5)
 
             else:
-                return logging.info("Sensor connection successful.")
+                logging.info("Sensor connection successful.")
+                return True
 
         logging.error("Could not establish connection with the sensor.")
+        return False
+
+    def cancel_connect(self) -> None:
+        self._connect_cancelled.set()
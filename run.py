@@ -1,12 +1,66 @@
+import argparse
+import asyncio
 import logging
+import platform
 
 from main import MainController
+from runtime import AsyncRuntime
+from server.event_bus import GestureEventBus
+from server.frame_publisher import FramePublisher
+from server.metrics_exporter import MetricsExporter
+from utils import CalibrationStore, PROFILER, SCHEDULING, TRACER, parse_cpus
+
+EVENT_BUS_PATH = "/tmp/cursor-control-events.sock"
+METRICS_PORT = 9464
 
 
 class Runner:
-    def __init__(self):
+    def __init__(self, args: argparse.Namespace):
         self.prepare_logger()
-        self.main_controller = MainController()
+
+        # spans are dumped with the T key
+        TRACER.enabled = args.trace
+
+        # applied by each stage's thread when it starts
+        if args.realtime:
+            SCHEDULING.configure_realtime(opencv_threads=args.opencv_threads)
+        elif args.pin or args.elevate or args.opencv_threads is not None:
+            SCHEDULING.configure(
+                affinity={stage: parse_cpus(cpus) for stage, _, cpus in (pin.partition("=") for pin in args.pin)},
+                elevated=args.elevate, opencv_threads=args.opencv_threads)
+        logging.info(f"Scheduling: {SCHEDULING.describe()}.")
+
+        # profiles are started with the P key, SIGUSR1 (see utils/profiling.py) or from the command line
+        PROFILER.install_signal_handler()
+        if args.profile:
+            PROFILER.request(args.profile, args.profile_mode, args.profile_iterations)
+
+        self.main_controller = MainController(
+            # the camera moves the cursor instead of the sensor
+            use_sensor=not args.head_pose,
+            use_head_pose=args.head_pose,
+            low_cost_camera=args.low_cost,
+            eye_flow=args.eye_flow,
+            # the neutral pose and eye ratios of the last run, so it does not start uncalibrated
+            calibration_store=CalibrationStore(args.calibration_file) if not args.no_calibration else None,
+            user=args.user,
+            # viewers can attach with python -m server.frame_viewer
+            show_preview=not args.no_preview,
+            frame_publisher=FramePublisher(annotated=not args.publish_raw) if args.publish_frames else None,
+            # unix domain sockets are not available on Windows
+            event_bus=GestureEventBus(args.event_bus)
+            if not args.no_event_bus and platform.system() != "Windows" else None)
+
+        # another process may hold the port, which is no reason not to run
+        self.metrics_exporter = None
+        if args.metrics_port is not None:
+            try:
+                self.metrics_exporter = MetricsExporter(args.metrics_port)
+            except OSError as e:
+                logging.warning(f"Could not serve metrics on port {args.metrics_port}, running without them: {e}")
+
+        # the threaded loops are kept for platforms where the asyncio runtime misbehaves
+        self.runtime = AsyncRuntime(self.main_controller) if not args.threaded else None
 
     @staticmethod
     def prepare_logger():
@@ -17,12 +71,61 @@ class Runner:
             level=logging.INFO)
 
     def run(self):
+        if self.metrics_exporter:
+            self.metrics_exporter.start()
+
+        if self.runtime:
+            # shuts itself down on errors, q, SIGINT and SIGTERM
+            asyncio.run(self.runtime.run())
+            return
+
         try:
             self.main_controller.run()
+        except KeyboardInterrupt:
+            # also ends a sensor-only run, or a startup still waiting for the sensor
+            logging.info("Interrupted, stopping.")
+            self.main_controller.stop()
         except Exception as e:
             logging.exception(e)
             self.main_controller.stop()
 
 
 if __name__ == '__main__':
-    Runner().run()
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--threaded', action='store_true', help="Run the loops on threads instead of asyncio.")
+    parser.add_argument('--trace', action='store_true', help="Record per-frame spans, press T to dump them.")
+    parser.add_argument('--head-pose', action='store_true', help="Move the cursor with the head pose, without the sensor.")
+    parser.add_argument('--low-cost', action='store_true', help="Find the eyes with Haar cascades, for slow machines.")
+    parser.add_argument('--eye-flow', action='store_true',
+                        help="Run the shape predictor every few frames and track the eyes with optical flow in between.")
+    parser.add_argument('--user', help="Whose calibration to use, the login name by default.")
+    parser.add_argument('--calibration-file', help="Where calibrations are kept, ~/.config/cursor-control by default.")
+    parser.add_argument('--no-calibration', action='store_true', help="Start uncalibrated and do not save.")
+    parser.add_argument('--realtime', action='store_true',
+                        help="Pin the camera away from the input and output threads and raise their priority.")
+    parser.add_argument('--pin', action='append', default=[], metavar='STAGE=CPUS',
+                        help="Pin a stage (camera, sensor, hotkeys, loop, startup) to CPUs, e.g. camera=1-3. "
+                             "Repeatable.")
+    parser.add_argument('--elevate', action='append', default=[], metavar='STAGE',
+                        help="Raise the priority of a stage's thread. Repeatable.")
+    parser.add_argument('--opencv-threads', type=int, help="Size of OpenCV's thread pool.")
+    parser.add_argument('--no-preview', action='store_true', help="Do not show the camera window.")
+    parser.add_argument('--event-bus', default=EVENT_BUS_PATH, metavar='PATH',
+                        help=f"Socket to publish the gestures on, {EVENT_BUS_PATH} by default.")
+    parser.add_argument('--no-event-bus', action='store_true', help="Do not publish the gestures.")
+    parser.add_argument('--metrics-port', type=int, nargs='?', const=METRICS_PORT, metavar='PORT',
+                        help=f"Serve Prometheus metrics on localhost, on port {METRICS_PORT} if no port is given.")
+    parser.add_argument('--publish-frames', action='store_true', help="Publish frames to shared memory for viewers.")
+    parser.add_argument('--publish-raw', action='store_true', help="Publish the raw frames instead of annotated ones.")
+    parser.add_argument('--profile', choices=("camera", "sensor"), help="Profile the first iterations of a loop.")
+    parser.add_argument('--profile-mode', choices=("cprofile", "sampling"), default="cprofile")
+    parser.add_argument('--profile-iterations', type=int, default=300)
+
+    args = parser.parse_args()
+
+    if args.head_pose and args.low_cost:
+        parser.error("--head-pose needs the face landmarks, which --low-cost does not find.")
+    if args.realtime and (args.pin or args.elevate):
+        parser.error("--realtime pins and elevates the stages itself, it can not be combined with --pin or --elevate.")
+
+    Runner(args).run()
@@ -0,0 +1,232 @@
+import asyncio
+import functools
+import logging
+import signal
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
+from typing import Any, Callable, List, Optional
+
+import cv2
+
+from main import MainController
+from utils import METRICS, SCHEDULING
+
+__all__ = ['AsyncRuntime']
+
+HOTKEY_INTERVAL_S = 0.1
+LAG_PROBE_INTERVAL_S = 0.25
+
+EVENT_LATENCY = {
+    source: METRICS.histogram("event_loop_latency_seconds",
+                              "Time from an event being due or posted to the loop until it is handled.",
+                              {"source": source})
+    for source in ("sensor", "frame", "timer", "probe")
+}
+
+
+class AsyncRuntime:
+    """
+    Runs a MainController on one asyncio loop.
+
+    Sensor samples from the BLE threads and eye results and head poses from the camera executor are posted to the
+    loop, hotkeys are polled on it and gesture timeouts are loop timers, so every handler runs on the loop's thread,
+    one at a time.
+    Blocking work runs in bounded executors: one thread processes frames, one clicks, a few more open the devices
+    and models.
+    `stop` cancels everything and waits for the frame in progress, from any thread or on SIGINT/SIGTERM.
+    """
+
+    def __init__(self, controller: MainController) -> None:
+        self.controller = controller
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._stopping: Optional[asyncio.Event] = None
+        self._tasks: List[asyncio.Task] = []
+
+        # frames are processed one at a time, in order
+        self._camera_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="camera",
+                                                   initializer=functools.partial(SCHEDULING.apply, "camera"))
+        # created from the loop's thread, so they would run where the loop does and at its priority
+        self._startup_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="startup",
+                                                    initializer=functools.partial(SCHEDULING.apply, "startup"))
+        # clicks sleep between pressing and releasing, one at a time so they stay in order. moves stay on the loop
+        self._click_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="clicks")
+
+        # the loop timer for the earliest gesture timeout
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._timer_deadline: Optional[float] = None
+
+        controller.click_executor = self._click_executor
+
+        # every handler runs on the loop from now on
+        if controller.sensor:
+            controller.sensor.acc_callback = self._post(controller.sensor_data_handler, "sensor")
+        if controller.camera:
+            # the camera goes on to the next frame while the eyes wait for the loop
+            controller.camera.callback = self._post(controller.camera.callback, "frame", controller.frame_context)
+            # the head pose moves the cursor like the sensor does
+            if controller.camera.head_pose_callback:
+                controller.camera.head_pose_callback = self._post(controller.camera.head_pose_callback, "sensor")
+
+    def _post(self, handler: Callable, source: str, context: Optional[Callable[[], Any]] = None) -> Callable:
+        """
+        Wraps a handler so calling it from any thread runs it on the loop.
+        `context` is read on the calling thread when the handler is posted, and passed to it as its last argument.
+        """
+        histogram = EVENT_LATENCY[source]
+
+        def post(*args) -> None:
+            if context:
+                args += (context(),)
+            if self._loop is not None and not self._loop.is_closed():
+                self._loop.call_soon_threadsafe(self._handle, handler, histogram, perf_counter(), args)
+
+        return post
+
+    def _handle(self, handler: Callable, histogram, posted_at: float, args: tuple) -> None:
+        histogram.observe(perf_counter() - posted_at)
+        handler(*args)
+        self._arm_timer()
+
+    def _arm_timer(self) -> None:
+        """Makes sure a loop timer fires at the gesture scheduler's earliest deadline."""
+        deadline = self.controller.gesture_scheduler.next_deadline
+        if deadline == self._timer_deadline:
+            return
+
+        if self._timer:
+            self._timer.cancel()
+            self._timer = None
+
+        self._timer_deadline = deadline
+        if deadline is not None:
+            self._timer = self._loop.call_later(max(0.0, deadline / 1000 - self.controller.clock()),
+                                                self._fire_timers)
+
+    def _fire_timers(self) -> None:
+        # deadlines are on the controller's clock
+        now = self.controller.clock()
+        EVENT_LATENCY["timer"].observe(max(0.0, now - self._timer_deadline / 1000))
+
+        self._timer = self._timer_deadline = None
+        self.controller.gesture_scheduler.poll(now * 1000)
+        self._arm_timer()
+
+    async def _poll_hotkeys(self) -> None:
+        while True:
+            self.controller.poll_hotkeys()
+            self.controller.save_calibration(only_if_due=True)
+            await asyncio.sleep(HOTKEY_INTERVAL_S)
+
+    async def _probe_lag(self) -> None:
+        """Measures how late the loop wakes up, which is how long the handlers block it."""
+        while True:
+            due = perf_counter() + LAG_PROBE_INTERVAL_S
+            await asyncio.sleep(LAG_PROBE_INTERVAL_S)
+            EVENT_LATENCY["probe"].observe(max(0.0, perf_counter() - due))
+
+    async def _run_camera(self) -> None:
+        camera = self.controller.camera
+
+        while await self._loop.run_in_executor(self._camera_executor, camera.step):
+            # the preview window belongs to the loop's thread
+            if camera.show_preview and not camera.show():
+                break
+
+        self.stop()
+
+    async def run(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._stopping = asyncio.Event()
+        # every handler and cursor movement runs on this thread
+        SCHEDULING.apply("loop")
+
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            try:
+                self._loop.add_signal_handler(signum, self.stop)
+            except (NotImplementedError, RuntimeError):
+                pass  # not available on Windows
+
+        controller = self.controller
+        controller._started_at = perf_counter()
+
+        try:
+            if controller.event_bus:
+                controller.event_bus.start()
+
+            # open everything at once, like MainController.run does
+            cursor_ready = self._startup_executor.submit(controller._open_cursor)
+            camera_ready = self._startup_executor.submit(controller.camera.open_device) if controller.camera else None
+            models_ready = self._startup_executor.submit(controller.camera.load_models) if controller.camera else None
+            sensor_ready = self._startup_executor.submit(controller._start_sensor, cursor_ready) \
+                if controller.sensor else None
+
+            await asyncio.wrap_future(cursor_ready)
+            self._tasks.append(self._loop.create_task(self._poll_hotkeys()))
+            self._tasks.append(self._loop.create_task(self._probe_lag()))
+
+            if camera_ready and await asyncio.wrap_future(camera_ready):
+                await asyncio.wrap_future(models_ready)
+                if sensor_ready and not sensor_ready.done():
+                    logging.info("Camera is ready, starting in blink-only mode until the sensor connects.")
+
+                self._tasks.append(self._loop.create_task(self._run_camera()))
+            elif sensor_ready and await asyncio.wrap_future(sensor_ready):
+                logging.info("Camera is not available, running in sensor-only mode.")
+            else:
+                logging.error("Neither the camera nor the sensor is available.")
+                self.stop()
+
+            await self._stopping.wait()
+        finally:
+            await self._shutdown()
+
+    def stop(self) -> None:
+        """Starts a clean shutdown, from any thread."""
+        if self._loop is None or self._loop.is_closed():
+            return
+
+        if self.controller.sensor:
+            # connecting blocks a startup thread, so it has to be told to give up
+            self.controller.sensor.cancel_connect()
+
+        self._loop.call_soon_threadsafe(self._stopping.set)
+
+    async def _shutdown(self) -> None:
+        controller = self.controller
+
+        if self._timer:
+            self._timer.cancel()
+
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+        if controller.sensor:
+            # stop() is not called when startup fails, and the executor would wait for the retries to run out
+            controller.sensor.cancel_connect()
+
+        # let the frame being processed finish before the device goes away
+        self._camera_executor.shutdown(wait=True)
+        self._startup_executor.shutdown(wait=True)
+        # and the clicks before the cursor does
+        self._click_executor.shutdown(wait=True)
+
+        if controller.camera:
+            cv2.destroyAllWindows()
+            controller.camera.stop()
+
+        if controller.sensor and controller._sensor_started:
+            controller.sensor.stop_acc_capturing()
+            controller.sensor.disconnect()
+
+        if controller.event_bus:
+            controller.event_bus.stop()
+
+        # opened during startup, which may have failed before it
+        if controller.cursor:
+            controller.cursor.close()
+
+        controller.save_calibration()
+
+        logging.info("Stopped.")
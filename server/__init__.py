@@ -0,0 +1,4 @@
+# multi_seat depends on main, so it is imported directly as server.multi_seat
+from .event_bus import *
+from .frame_publisher import *
+from .metrics_exporter import *
@@ -0,0 +1,220 @@
+import asyncio
+import logging
+import errno
+import os
+import socket
+import struct
+import threading
+import time
+from enum import IntEnum
+from typing import AsyncIterator, List, Optional, Set, Tuple
+
+__all__ = ['EventType', 'GestureEventBus', 'EventDecoder', 'encode_event', 'subscribe']
+
+# type, payload length, timestamp (seconds since epoch)
+EVENT_HEADER = struct.Struct('<BHd')
+
+
+class EventType(IntEnum):
+    EYE_RATIOS = 1  # left ratio, right ratio
+    BLINK = 2  # number of blinks in the sequence
+    SENSOR_DELTA = 3  # x, y after the dead-zone
+    GESTURE = 4  # name of a recognized gesture, utf-8 and zero padded
+
+
+EVENT_PAYLOADS = {
+    EventType.EYE_RATIOS  : struct.Struct('<ff'),
+    EventType.BLINK       : struct.Struct('<B'),
+    EventType.SENSOR_DELTA: struct.Struct('<ff'),
+    EventType.GESTURE     : struct.Struct('<32s'),
+}
+
+Event = Tuple[EventType, float, tuple]
+
+
+def encode_event(event_type: EventType, timestamp: float, *values) -> bytes:
+    payload = EVENT_PAYLOADS[event_type].pack(*values)
+    return EVENT_HEADER.pack(event_type, len(payload), timestamp) + payload
+
+
+class EventDecoder:
+    """Splits a byte stream back into events. Unknown event types are skipped."""
+
+    def __init__(self) -> None:
+        self._buffer = bytearray()
+
+    def feed(self, data: bytes) -> List[Event]:
+        self._buffer += data
+
+        events, offset = [], 0
+        while len(self._buffer) - offset >= EVENT_HEADER.size:
+            event_type, length, timestamp = EVENT_HEADER.unpack_from(self._buffer, offset)
+            end = offset + EVENT_HEADER.size + length
+            if len(self._buffer) < end:
+                break
+
+            if event_type in EVENT_PAYLOADS.keys():
+                values = EVENT_PAYLOADS[event_type].unpack_from(self._buffer, offset + EVENT_HEADER.size)
+                events.append((EventType(event_type), timestamp, values))
+            offset = end
+
+        del self._buffer[:offset]
+        return events
+
+
+class _Subscriber:
+    def __init__(self, queue_size: int) -> None:
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.dropped = 0
+
+
+class GestureEventBus:
+    """
+    Publishes gesture events to local subscribers over a Unix domain socket.
+
+    The bus runs its own event loop on a daemon thread. `publish` only hands the encoded event over to that loop,
+    so it never blocks the caller. Each subscriber has a bounded queue, and when a slow subscriber's queue is full
+    its oldest event is dropped.
+    """
+
+    def __init__(self, path: str, queue_size: int = 256) -> None:
+        self.path = path
+        self.queue_size = queue_size
+
+        self._subscribers: Set[_Subscriber] = set()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread = threading.Thread(target=self._run, name="event-bus", daemon=True)
+        self._ready = threading.Event()
+        self._stop_lock = threading.Lock()
+        # why the bus could not start listening, raised by `start`
+        self._error: Optional[BaseException] = None
+
+    def start(self) -> None:
+        """Starts listening, raises OSError if the socket can not be created."""
+        self._thread.start()
+        self._ready.wait()
+
+        if self._error is not None:
+            self._thread.join()
+            raise self._error
+
+    def stop(self) -> None:
+        """Stops the bus and disconnects the subscribers. Does nothing if it is not running."""
+        with self._stop_lock:
+            if self._loop is None or self._loop.is_closed() or not self._thread.is_alive():
+                return
+
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+
+    def publish(self, event_type: EventType, *values) -> None:
+        # nobody to send it to, so don't even encode it
+        if not self._subscribers:
+            return
+
+        self._loop.call_soon_threadsafe(self._fan_out, encode_event(event_type, time.time(), *values))
+
+    def _fan_out(self, data: bytes) -> None:
+        for subscriber in self._subscribers:
+            if subscriber.queue.full():
+                subscriber.queue.get_nowait()
+                subscriber.dropped += 1
+
+            subscriber.queue.put_nowait(data)
+
+    def _remove_stale_socket(self) -> None:
+        """Removes the socket a previous run left behind, unless another bus is still listening on it."""
+        if not os.path.exists(self.path):
+            return
+
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+            try:
+                probe.connect(self.path)
+            except (ConnectionRefusedError, FileNotFoundError):
+                pass
+            else:
+                raise OSError(errno.EADDRINUSE, "Another event bus is listening", self.path)
+
+        os.unlink(self.path)
+
+    def _run(self) -> None:
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+
+        try:
+            self._remove_stale_socket()
+            server = loop.run_until_complete(asyncio.start_unix_server(self._serve, path=self.path))
+            self._loop = loop
+        except Exception as e:
+            self._error = e
+            loop.close()
+            return
+        finally:
+            # `start` waits for this either way
+            self._ready.set()
+
+        logging.info(f"Event bus listening on {self.path}.")
+
+        try:
+            self._loop.run_forever()
+        finally:
+            server.close()
+
+            # disconnect the subscribers that are still waiting for events
+            tasks = asyncio.all_tasks(self._loop)
+            for task in tasks:
+                task.cancel()
+            self._loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+
+            self._loop.close()
+            if os.path.exists(self.path):
+                os.unlink(self.path)
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        subscriber = _Subscriber(self.queue_size)
+        self._subscribers.add(subscriber)
+        logging.info(f"Event bus subscriber connected ({len(self._subscribers)} in total).")
+
+        try:
+            while True:
+                data = [await subscriber.queue.get()]
+                # send everything that piled up in one write
+                while not subscriber.queue.empty():
+                    data.append(subscriber.queue.get_nowait())
+
+                writer.write(b''.join(data))
+                await writer.drain()
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            self._subscribers.discard(subscriber)
+            writer.close()
+            logging.info(f"Event bus subscriber disconnected, {subscriber.dropped} events were dropped for it.")
+
+
+async def subscribe(path: str) -> AsyncIterator[Event]:
+    """Yields the events of a running bus."""
+    reader, writer = await asyncio.open_unix_connection(path)
+    decoder = EventDecoder()
+
+    try:
+        while True:
+            data = await reader.read(4096)
+            if not data:
+                return
+
+            for event in decoder.feed(data):
+                yield event
+    finally:
+        writer.close()
+
+
+async def _print_events(path: str) -> None:
+    async for event_type, timestamp, values in subscribe(path):
+        print(f"{timestamp:.3f} {event_type.name} {values}")
+
+
+if __name__ == '__main__':
+    import sys
+
+    asyncio.run(_print_events(sys.argv[1]))
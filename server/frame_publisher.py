@@ -0,0 +1,172 @@
+import logging
+import struct
+import time
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+from typing import List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+__all__ = ['FrameInfo', 'FramePublisher', 'FrameSubscriber', 'FRAME_SEGMENT_NAME']
+
+FRAME_SEGMENT_NAME = "cursor-control-frames"
+
+# magic, version, latest sequence, height, width, channels
+SEGMENT_HEADER = struct.Struct('<4sB3xQIII')
+SEGMENT_MAGIC = b'CCFR'
+SEGMENT_VERSION = 1
+LATEST_SEQUENCE = struct.Struct('<Q')
+LATEST_SEQUENCE_OFFSET = 8
+
+# sequence, frame id, timestamp (seconds since epoch), annotated
+SLOT_HEADER = struct.Struct('<QQd?')
+# both headers are padded, which keeps the pixels aligned
+SEGMENT_HEADER_SIZE = 64
+SLOT_HEADER_SIZE = 64
+SLOT_COUNT = 2
+
+
+class FrameInfo(NamedTuple):
+    sequence: int
+    frame_id: int
+    timestamp: float
+    annotated: bool
+
+
+def _frame_views(buffer: memoryview, shape: Tuple[int, int, int]) -> List[np.ndarray]:
+    """Maps an array onto the pixels of each slot, without copying."""
+    frame_size = shape[0] * shape[1] * shape[2]
+    slot_size = SLOT_HEADER_SIZE + frame_size
+
+    return [
+        np.ndarray(shape, dtype=np.uint8, buffer=buffer,
+                   offset=SEGMENT_HEADER_SIZE + slot * slot_size + SLOT_HEADER_SIZE)
+        for slot in range(SLOT_COUNT)
+    ]
+
+
+def _slot_offset(slot: int, shape: Tuple[int, int, int]) -> int:
+    return SEGMENT_HEADER_SIZE + slot * (SLOT_HEADER_SIZE + shape[0] * shape[1] * shape[2])
+
+
+class FramePublisher:
+    """
+    Publishes the latest camera frame into a double-buffered shared-memory segment for viewers in other processes.
+
+    Each frame goes into the slot the last one is not in, and the segment's sequence counter is bumped only after
+    the slot is complete, so readers always find a whole frame. Publishing is one copy of the frame and never waits
+    for readers, which can attach and detach at any time.
+    The segment is created with the first frame's size.
+    """
+
+    def __init__(self, name: str = FRAME_SEGMENT_NAME, annotated: bool = True) -> None:
+        self.name = name
+        # whether to publish the annotated preview or the raw camera frame
+        self.annotated = annotated
+
+        self._memory: Optional[SharedMemory] = None
+        self._frames: List[np.ndarray] = []
+        self._shape: Optional[Tuple[int, int, int]] = None
+        self._sequence = 0
+
+    def _create(self, shape: Tuple[int, int, int]) -> None:
+        size = SEGMENT_HEADER_SIZE + SLOT_COUNT * (SLOT_HEADER_SIZE + shape[0] * shape[1] * shape[2])
+        try:
+            self._memory = SharedMemory(self.name, create=True, size=size)
+        except FileExistsError:
+            # left over from a publisher that did not exit cleanly
+            stale = SharedMemory(self.name)
+            stale.close()
+            stale.unlink()
+            self._memory = SharedMemory(self.name, create=True, size=size)
+
+        SEGMENT_HEADER.pack_into(self._memory.buf, 0, SEGMENT_MAGIC, SEGMENT_VERSION, 0, *shape)
+        self._frames = _frame_views(self._memory.buf, shape)
+        self._shape = shape
+
+        logging.info(f"Publishing {shape[1]}x{shape[0]} frames to shared memory segment {self.name}.")
+
+    def publish(self, frame: np.ndarray, frame_id: int) -> None:
+        if frame.ndim == 2:
+            frame = frame[:, :, np.newaxis]
+
+        if self._memory is None:
+            self._create(frame.shape)
+        elif frame.shape != self._shape:
+            logging.warning(f"Not publishing a {frame.shape} frame into a {self._shape} segment.")
+            return
+
+        sequence = self._sequence + 1
+        slot = sequence % SLOT_COUNT
+        offset = _slot_offset(slot, self._shape)
+
+        # readers ignore the slot until it has its new sequence
+        SLOT_HEADER.pack_into(self._memory.buf, offset, 0, 0, 0.0, False)
+        np.copyto(self._frames[slot], frame)
+        SLOT_HEADER.pack_into(self._memory.buf, offset, sequence, frame_id, time.time(), self.annotated)
+
+        LATEST_SEQUENCE.pack_into(self._memory.buf, LATEST_SEQUENCE_OFFSET, sequence)
+        self._sequence = sequence
+
+    def close(self) -> None:
+        if self._memory is None:
+            return
+
+        # views have to go before the memory can be closed
+        self._frames = []
+        self._memory.close()
+        self._memory.unlink()
+        self._memory = None
+
+
+class FrameSubscriber:
+    """
+    Reads the frames a `FramePublisher` in another process writes, without copying them.
+
+    A frame returned by `read` stays valid until the publisher comes back to its slot, two frames later.
+    `is_intact` tells whether that has happened yet, so it should be checked once the frame has been used.
+    """
+
+    def __init__(self, name: str = FRAME_SEGMENT_NAME) -> None:
+        try:
+            self._memory = SharedMemory(name, track=False)
+        except TypeError:
+            # before 3.13 attaching also registers the segment, and the tracker would remove it when we exit
+            self._memory = SharedMemory(name)
+            resource_tracker.unregister(self._memory._name, "shared_memory")
+
+        magic, version, _, *shape = SEGMENT_HEADER.unpack_from(self._memory.buf, 0)
+        if magic != SEGMENT_MAGIC or version != SEGMENT_VERSION:
+            self._memory.close()
+            raise ValueError(f"{name} is not a version {SEGMENT_VERSION} frame segment.")
+
+        self._shape: Tuple[int, int, int] = tuple(shape)
+        self._frames = _frame_views(self._memory.buf, self._shape)
+        self._last_sequence = 0
+
+    @property
+    def latest_sequence(self) -> int:
+        return LATEST_SEQUENCE.unpack_from(self._memory.buf, LATEST_SEQUENCE_OFFSET)[0]
+
+    def read(self) -> Optional[Tuple[FrameInfo, np.ndarray]]:
+        """Returns the latest frame if there is a new one."""
+        sequence = self.latest_sequence
+        if sequence == 0 or sequence == self._last_sequence:
+            return None
+
+        slot = sequence % SLOT_COUNT
+        info = FrameInfo(*SLOT_HEADER.unpack_from(self._memory.buf, _slot_offset(slot, self._shape)))
+        if info.sequence != sequence:
+            return None  # the publisher has already lapped us
+
+        self._last_sequence = sequence
+        return info, self._frames[slot]
+
+    def is_intact(self, info: FrameInfo) -> bool:
+        """Whether the frame of `info` has not been overwritten since it was read."""
+        slot = info.sequence % SLOT_COUNT
+        return SLOT_HEADER.unpack_from(self._memory.buf, _slot_offset(slot, self._shape))[0] == info.sequence
+
+    def close(self) -> None:
+        self._frames = []
+        self._memory.close()
@@ -0,0 +1,70 @@
+"""
+Shows the frames a running instance publishes to shared memory (run.py --publish-frames).
+The viewer can be started and closed at any time without affecting the running instance.
+
+    python -m server.frame_viewer
+"""
+import argparse
+import time
+from typing import Optional
+
+import cv2
+
+from server.frame_publisher import FRAME_SEGMENT_NAME, FrameSubscriber
+
+# without a new frame for this long, the publisher may have restarted with a new segment
+REATTACH_AFTER_S = 2.0
+
+
+def _attach(name: str) -> Optional[FrameSubscriber]:
+    try:
+        return FrameSubscriber(name)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def view(name: str) -> None:
+    subscriber, last_frame_at = None, time.monotonic()
+    shown = torn = 0
+
+    while cv2.waitKey(1) != ord('q'):
+        if subscriber is None or time.monotonic() - last_frame_at > REATTACH_AFTER_S:
+            if subscriber:
+                subscriber.close()
+            subscriber, last_frame_at = _attach(name), time.monotonic()
+
+            if subscriber is None:
+                time.sleep(0.5)
+                continue
+
+        latest = subscriber.read()
+        if latest is None:
+            time.sleep(0.005)
+            continue
+
+        info, frame = latest
+        last_frame_at = time.monotonic()
+
+        # imshow copies the frame, so it is enough to check it once it is shown.
+        # a torn frame stays on screen only until the next one
+        cv2.imshow(name, frame)
+        if not subscriber.is_intact(info):
+            torn += 1
+            continue
+
+        shown += 1
+        if shown % 300 == 0:
+            latency_ms = (time.time() - info.timestamp) * 1000
+            print(f"frame {info.frame_id}: {latency_ms:.1f} ms behind, {torn} torn frames so far")
+
+    if subscriber:
+        subscriber.close()
+    cv2.destroyAllWindows()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--name', default=FRAME_SEGMENT_NAME, help="Name of the shared memory segment.")
+    args = parser.parse_args()
+
+    view(args.name)
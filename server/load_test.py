@@ -0,0 +1,78 @@
+import argparse
+import logging
+import multiprocessing
+from time import perf_counter
+from typing import Dict, List
+
+import cv2
+
+from models.cursor_uinput import RecordingUInputDevice, UInputCursor
+from server.multi_seat import Seat, SeatServer
+
+
+class ClipSource:
+    """Reads at most `max_frames` frames of a recorded clip."""
+
+    def __init__(self, path: str, max_frames: int) -> None:
+        self.capture_device = cv2.VideoCapture(path)
+        self.remaining = max_frames
+
+    def read(self):
+        if self.remaining <= 0:
+            return False, None
+
+        self.remaining -= 1
+        return self.capture_device.read()
+
+    def release(self) -> None:
+        self.capture_device.release()
+
+
+def run_load_test(clips: List[str], seats: int, workers: int, frames: int, slo_ms: float) -> Dict[str, float]:
+    # enough frames in flight to keep every worker busy, since clips are not allowed to drop frames
+    max_in_flight = -(-workers // seats) + 1
+
+    server = SeatServer(
+        [
+            Seat(f"seat{i}", ClipSource(clips[i % len(clips)], frames),
+                 UInputCursor(device=RecordingUInputDevice(), allow_external_movement=False),
+                 slo_ms=slo_ms, drop_frames=False, max_in_flight=max_in_flight)
+            for i in range(seats)
+        ],
+        workers=workers)
+
+    started = perf_counter()
+    server.run()
+    elapsed = perf_counter() - started
+
+    summaries = server.summary().values()
+    processed = sum(summary["frames"] for summary in summaries)
+    return {
+        "workers": workers,
+        "frames": processed,
+        "seconds": elapsed,
+        "fps": processed / elapsed,
+        "worst_p95_ms": max(summary["p95_ms"] for summary in summaries),
+        "slo_violations": sum(summary["slo_violations"] for summary in summaries),
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Measures how multi-seat throughput scales with the worker count.")
+    parser.add_argument('clips', nargs='+', help="Recorded clips, assigned to the seats in turn.")
+    parser.add_argument('--seats', type=int, default=4)
+    parser.add_argument('--frames', type=int, default=300, help="Frames per seat.")
+    parser.add_argument('--workers', type=int, nargs='+',
+                        default=sorted({1, 2, 4, 8, multiprocessing.cpu_count()} & set(range(1, multiprocessing.cpu_count() + 1))))
+    parser.add_argument('--slo-ms', type=float, default=100.0)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+
+    baseline = None
+    print(f"{'workers':>7} {'frames':>7} {'fps':>8} {'speedup':>8} {'p95 ms':>8} {'slo miss':>8}")
+    for worker_count in args.workers:
+        result = run_load_test(args.clips, args.seats, worker_count, args.frames, args.slo_ms)
+        baseline = baseline or result["fps"]
+        print(f"{worker_count:>7} {result['frames']:>7} {result['fps']:>8.1f} {result['fps'] / baseline:>8.2f} "
+              f"{result['worst_p95_ms']:>8.1f} {result['slo_violations']:>8}")
@@ -0,0 +1,44 @@
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from utils.metrics import METRICS, MetricsRegistry
+
+__all__ = ['MetricsExporter']
+
+
+class MetricsExporter:
+    """Serves the metrics in Prometheus text format on its own thread. Only listens on the loopback interface."""
+
+    def __init__(self, port: int, registry: MetricsRegistry = METRICS, host: str = "127.0.0.1") -> None:
+        self.registry = registry
+
+        exporter = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self) -> None:
+                if self.path != "/metrics":
+                    self.send_error(404)
+                    return
+
+                body = exporter.registry.render().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args) -> None:
+                pass  # scrapes would flood the log
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, name="metrics-exporter", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+        logging.info(f"Serving metrics on http://{self._server.server_address[0]}:{self._server.server_address[1]}/metrics")
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
@@ -0,0 +1,259 @@
+import functools
+import logging
+import multiprocessing
+import queue
+import threading
+from collections import deque
+from time import perf_counter
+from typing import Deque, Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from controllers import Detection, DetectorBackend, DlibHogBackend
+from main import MainController
+from models import Eye, Face
+from models.cursor import AbstractCursor
+from utils import percentile
+
+__all__ = ['Seat', 'SeatServer', 'LatencyTracker']
+
+# the backend of each worker process, loaded once by the pool initializer
+_worker_backend: Optional[DetectorBackend] = None
+_worker_detection_scale = 1.0
+
+# seat id, frame id, captured at, detection. captured at is None if the frame failed in the pool
+WorkerResult = Tuple[str, int, Optional[float], Optional[Detection]]
+
+
+def _init_worker(detection_scale: float) -> None:
+    global _worker_backend, _worker_detection_scale
+    _worker_backend = DlibHogBackend()
+    _worker_backend.load()
+    _worker_detection_scale = detection_scale
+
+
+def _process_frame(seat_id: str, frame_id: int, captured_at: float, gray: np.ndarray) -> WorkerResult:
+    try:
+        gray = cv2.bilateralFilter(gray, 5, 1, 1)  # remove impurities
+
+        # workers are shared between seats, so no per-seat tracking state is kept here
+        faces = _worker_backend.detect_faces(gray, _worker_detection_scale)
+        if not faces:
+            return seat_id, frame_id, captured_at, None
+
+        # the full landmark object cannot be pickled back
+        return seat_id, frame_id, captured_at, _worker_backend.predict(gray, faces[0])._replace(landmarks=None)
+    except Exception as e:
+        # the seat has to get its frame back either way, otherwise it would wait for it forever
+        logging.exception(e)
+        return seat_id, frame_id, captured_at, None
+
+
+class LatencyTracker:
+    """Keeps the recent capture-to-action latencies of a seat and counts the ones over the SLO."""
+
+    def __init__(self, slo_ms: float, window: int = 1000) -> None:
+        self.slo_ms = slo_ms
+        self.latencies: Deque[float] = deque(maxlen=window)
+
+        self.total = 0
+        self.violations = 0
+
+    def record(self, latency_ms: float) -> None:
+        self.latencies.append(latency_ms)
+        self.total += 1
+        if latency_ms > self.slo_ms:
+            self.violations += 1
+
+    def summary(self) -> Dict[str, float]:
+        return {
+            "frames": self.total,
+            "p50_ms": percentile(self.latencies, 50),
+            "p95_ms": percentile(self.latencies, 95),
+            "p99_ms": percentile(self.latencies, 99),
+            "slo_violations": self.violations,
+        }
+
+
+class Seat:
+    """
+    A frame source, its own gesture recognizer and calibration, and its own cursor.
+
+    `source` can be anything with `read()` and `release()` like `cv2.VideoCapture`.
+    Live cameras should use `drop_frames` so that only the latest frame waits for a worker.
+    """
+
+    def __init__(self, seat_id: str, source, cursor: AbstractCursor, slo_ms: float = 100.0,
+                 drop_frames: bool = True, max_in_flight: int = 1) -> None:
+        self.id = seat_id
+        self.source = source
+        self.drop_frames = drop_frames
+        self.max_in_flight = max_in_flight
+
+        self.controller = MainController(cursor=cursor, use_camera=False, use_sensor=False)
+        self.latency = LatencyTracker(slo_ms)
+
+        self.frames: queue.Queue = queue.Queue(maxsize=1 if drop_frames else max_in_flight)
+        self.dropped_frames = 0
+        self.exhausted = False
+        self.in_flight = 0
+
+        # results can come back out of order, so they are delivered by frame id
+        self._next_frame_id = 0
+        self._results: Dict[int, WorkerResult] = {}
+
+        self._reader = threading.Thread(target=self._read_frames, name=f"seat-{seat_id}-reader", daemon=True)
+
+    @property
+    def finished(self) -> bool:
+        return self.exhausted and self.frames.empty() and self.in_flight == 0
+
+    def start(self) -> None:
+        self._reader.start()
+
+    def _read_frames(self) -> None:
+        frame_id = 0
+        while True:
+            successful, img = self.source.read()
+            if not successful:
+                break
+
+            item = frame_id, perf_counter(), cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+            frame_id += 1
+
+            if not self.drop_frames:
+                self.frames.put(item)
+                continue
+
+            try:
+                self.frames.put_nowait(item)
+            except queue.Full:
+                # replace the stale frame with the latest one
+                try:
+                    self.frames.get_nowait()
+                    self.dropped_frames += 1
+                except queue.Empty:
+                    pass
+                self.frames.put_nowait(item)
+
+        self.source.release()
+        self.exhausted = True
+
+    def deliver(self, result: WorkerResult) -> None:
+        self.in_flight -= 1
+        frame_id = result[1]
+
+        if self.drop_frames:
+            # frame ids have gaps when frames are dropped, and a result older than the last one is stale
+            if frame_id >= self._next_frame_id:
+                self._next_frame_id = frame_id + 1
+                self._handle(result)
+            return
+
+        self._results[frame_id] = result
+        while self._next_frame_id in self._results:
+            self._handle(self._results.pop(self._next_frame_id))
+            self._next_frame_id += 1
+
+    def _handle(self, result: WorkerResult) -> None:
+        _, _, captured_at, detection = result
+        if captured_at is None:
+            # still handled in order, so the frames after it are not held back
+            self.dropped_frames += 1
+            return
+
+        if detection is not None:
+            threshold = self.controller.calibration.blink_threshold
+            face = Face(None, detection.face)
+            left_eye = Eye.get_from_points(None, face, Eye.Type.LEFT, detection.left_eye, state_threshold=threshold)
+            right_eye = Eye.get_from_points(None, face, Eye.Type.RIGHT, detection.right_eye, state_threshold=threshold)
+            # the same path as a single user's camera
+            self.controller.gesture_algorithm(left_eye, right_eye)
+
+        self.latency.record((perf_counter() - captured_at) * 1000)
+
+    def poll_gestures(self, now_ms: Optional[float] = None) -> None:
+        """Fires the gesture timeouts that are due, also while no frames of this seat come back."""
+        controller = self.controller
+        controller.gesture_scheduler.poll(controller.clock() * 1000 if now_ms is None else now_ms)
+
+
+class SeatServer:
+    """
+    Schedules the frames of many seats over one pool of worker processes.
+
+    Each worker loads the models once. Seats are served round-robin and each may only have
+    `max_in_flight` frames in the pool, so a busy seat cannot starve the others.
+    """
+
+    def __init__(self, seats: List[Seat], workers: Optional[int] = None, detection_scale: float = 1.0) -> None:
+        self.seats = seats
+        self.workers = workers or multiprocessing.cpu_count()
+        self.detection_scale = detection_scale
+
+        self._results: queue.Queue = queue.Queue()
+        self._next_seat = 0
+        self._stopped = threading.Event()
+
+    def stop(self) -> None:
+        self._stopped.set()
+
+    def run(self) -> None:
+        logging.info(f"Serving {len(self.seats)} seats with {self.workers} workers.")
+
+        # the pool is forked before the reader threads exist
+        with multiprocessing.Pool(self.workers, initializer=_init_worker, initargs=(self.detection_scale,)) as pool:
+            for seat in self.seats:
+                seat.start()
+
+            seats_by_id = {seat.id: seat for seat in self.seats}
+            while not self._stopped.is_set() and not all(seat.finished for seat in self.seats):
+                self._schedule(pool)
+                for seat in self.seats:
+                    seat.poll_gestures()
+
+                try:
+                    result = self._results.get(timeout=0.005)
+                except queue.Empty:
+                    continue
+
+                seats_by_id[result[0]].deliver(result)
+
+                # deliver everything else that is ready before scheduling again
+                while not self._results.empty():
+                    result = self._results.get_nowait()
+                    seats_by_id[result[0]].deliver(result)
+
+        for seat in self.seats:
+            # gestures still waiting to see whether they go on end with the session
+            seat.poll_gestures(float('inf'))
+            logging.info(f"Seat {seat.id}: {seat.latency.summary()}, dropped frames: {seat.dropped_frames}")
+
+    def _schedule(self, pool: multiprocessing.Pool) -> None:
+        """Submits at most one frame per seat per round, starting after the seat served last."""
+        start = self._next_seat
+        for i in range(len(self.seats)):
+            index = (start + i) % len(self.seats)
+            seat = self.seats[index]
+            if seat.in_flight >= seat.max_in_flight:
+                continue
+
+            try:
+                frame_id, captured_at, gray = seat.frames.get_nowait()
+            except queue.Empty:
+                continue
+
+            seat.in_flight += 1
+            pool.apply_async(_process_frame, (seat.id, frame_id, captured_at, gray), callback=self._results.put,
+                             error_callback=functools.partial(self._frame_failed, seat.id, frame_id))
+            self._next_seat = (index + 1) % len(self.seats)
+
+    def _frame_failed(self, seat_id: str, frame_id: int, error: BaseException) -> None:
+        """Called on the pool's thread when a frame or its result could not be sent between the processes."""
+        logging.error(f"Seat {seat_id}: dropping frame {frame_id}, it failed in the pool: {error!r}")
+        # seats are only touched by the scheduling thread, so the failure is delivered like a result
+        self._results.put((seat_id, frame_id, None, None))
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        return {seat.id: seat.latency.summary() for seat in self.seats}
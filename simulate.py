@@ -0,0 +1,172 @@
+"""
+Runs the whole pipeline offline on a recorded session, faster than real time and with the same output every run.
+
+    python simulate.py --clip session.mp4 [--sensor session.csv] [--output actions.csv] [--expect SHA256]
+
+The camera reads the clip instead of a device, sensor samples come from a CSV file with timestamp_ms, x and y
+columns (in g, the way the sensor reports them), and the cursor only records what it is asked to do.
+Everything runs on this thread on a virtual clock: each frame and sample is handled at its recorded time,
+gesture timeouts fire at their deadlines in between, and nothing waits. The adaptive quality ladder and
+the governor's CPU ceiling, which go by measured time, are turned off.
+
+The output has one line per gesture and cursor command, at its virtual time, and its SHA-256 is printed so runs
+can be compared with --expect. With the same OpenCV and dlib builds, a session gives the same output anywhere.
+"""
+import argparse
+import hashlib
+import logging
+import sys
+from time import perf_counter
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+
+from benchmarks.soak import load_sensor_session
+from main import MainController
+from models.cursor_recording import RecordingCursor
+from utils import VirtualClock
+
+SensorSample = Tuple[float, float, float]  # timestamp_ms, x, y
+
+OUTPUT_HEADER = "time_ms,kind,name,x,y"
+
+
+class Simulation(object):
+    def __init__(self, clip: Optional[str], sensor_samples: List[SensorSample], head_pose: bool = False,
+                 low_cost: bool = False, eye_flow: bool = False) -> None:
+        self.clip = clip
+        self.sensor_samples = sensor_samples
+
+        self.clock = VirtualClock()
+        self.cursor = RecordingCursor(allow_external_movement=True)
+        self.controller = MainController(cursor=self.cursor, use_camera=clip is not None, use_sensor=False,
+                                         use_head_pose=head_pose, show_preview=False, low_cost_camera=low_cost,
+                                         eye_flow=eye_flow, clock=self.clock)
+
+        camera = self.controller.camera
+        if camera:
+            camera.video_source = clip
+            # both would depend on how fast this machine is
+            camera.quality.budget_ms = float('inf')
+            if camera.rate_governor:
+                camera.rate_governor.cpu_ceiling = None
+
+        # gestures are part of the output too
+        self.controller.gesture_recognizer.on_gesture = self._on_gesture
+
+        self.output: List[str] = [OUTPUT_HEADER]
+
+    def _on_gesture(self, gesture: str, frame: Optional[Tuple[int, float]], tokens: int) -> None:
+        self._collect_cursor_commands()
+        self.output.append(f"{self.clock() * 1000:.3f},gesture,{gesture},,")
+        self.controller.gesture_handler(gesture, frame, tokens)
+
+    def _collect_cursor_commands(self) -> None:
+        commands = self.cursor.commands
+        while commands:
+            command, x, y = commands.popleft()
+            self.output.append(f"{self.clock() * 1000:.3f},cursor,{command},{x},{y}")
+
+    def _run_timeouts_until(self, seconds: float) -> None:
+        """Fires the gesture timeouts that are due by `seconds`, each at its own deadline."""
+        scheduler = self.controller.gesture_scheduler
+        while scheduler.next_deadline is not None and scheduler.next_deadline / 1000 <= seconds:
+            deadline = scheduler.next_deadline
+            self.clock.advance_to(deadline / 1000)
+            scheduler.poll(deadline)
+            self._collect_cursor_commands()
+
+    def run(self) -> Dict[str, float]:
+        camera = self.controller.camera
+        fps, frame_count = 0.0, 0
+        if camera:
+            camera.load_models()
+            if not camera.open_device():
+                sys.exit(f"Could not open {self.clip}.")
+
+            fps = camera.capture_device.get(cv2.CAP_PROP_FPS) or 30.0
+            frame_count = int(camera.capture_device.get(cv2.CAP_PROP_FRAME_COUNT))
+
+        started = perf_counter()
+        frames = samples = 0
+        camera_done = camera is None
+        first_sample_ms = self.sensor_samples[0][0] if self.sensor_samples else 0.0
+
+        while not camera_done or samples < len(self.sensor_samples):
+            frame_time = frames / fps if not camera_done else float('inf')
+            sample_time = (self.sensor_samples[samples][0] - first_sample_ms) / 1000 \
+                if samples < len(self.sensor_samples) else float('inf')
+
+            event_time = min(frame_time, sample_time)
+            self._run_timeouts_until(event_time)
+            self.clock.advance_to(event_time)
+
+            if frame_time <= sample_time:
+                # the frame count of some containers is off, so running out of frames ends the clip too
+                if (frame_count and frames >= frame_count) or not camera.step():
+                    camera_done = True
+                    continue
+                frames += 1
+            else:
+                _, x, y = self.sensor_samples[samples]
+                self.controller.sensor_data_handler(x, y)
+                samples += 1
+
+            self._collect_cursor_commands()
+
+        # whatever is still pending times out after the session
+        self._run_timeouts_until(float('inf'))
+        wall_time = perf_counter() - started
+
+        if camera:
+            camera.capture_device.release()
+
+        return {
+            "frames": frames,
+            "sensor_samples": samples,
+            "simulated_s": self.clock(),
+            "wall_s": wall_time,
+            "speedup": self.clock() / wall_time if wall_time else 0.0,
+            "frames_per_s": frames / wall_time if wall_time else 0.0,
+            "actions": len(self.output) - 1,
+        }
+
+    @property
+    def digest(self) -> str:
+        return hashlib.sha256("\n".join(self.output).encode()).hexdigest()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--clip', help="Recorded camera session.")
+    parser.add_argument('--sensor', help="Recorded sensor session.")
+    parser.add_argument('--head-pose', action='store_true', help="Move the cursor with the head pose.")
+    parser.add_argument('--low-cost', action='store_true', help="Find the eyes with Haar cascades.")
+    parser.add_argument('--eye-flow', action='store_true', help="Track the eyes with optical flow in between.")
+    parser.add_argument('--output', help="Write the gestures and cursor commands here.")
+    parser.add_argument('--expect', metavar='SHA256', help="Fail unless the output has this digest.")
+    parser.add_argument('-v', '--verbose', action='store_true')
+    args = parser.parse_args()
+
+    if not args.clip and not args.sensor:
+        parser.error("Nothing to simulate, give --clip, --sensor or both.")
+    if args.head_pose and args.low_cost:
+        parser.error("--head-pose needs the face landmarks, which --low-cost does not find.")
+
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING,
+                        format='[{levelname:<7}] {message}', style='{')
+
+    simulation = Simulation(args.clip, load_sensor_session(args.sensor) if args.sensor else [],
+                            head_pose=args.head_pose, low_cost=args.low_cost, eye_flow=args.eye_flow)
+    report = simulation.run()
+
+    for key, value in report.items():
+        print(f"{key}: {value:.3f}" if isinstance(value, float) else f"{key}: {value}")
+    print(f"sha256: {simulation.digest}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write("\n".join(simulation.output) + "\n")
+
+    if args.expect and args.expect != simulation.digest:
+        sys.exit("FAILED: the output differs from the expected one.")
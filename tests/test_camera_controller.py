@@ -0,0 +1,59 @@
+import time
+import unittest
+from typing import List, Optional
+
+import numpy as np
+
+from controllers import CameraControllerDlib
+from controllers.detector_backends import Detection, DetectorBackend, QualityLevel, Rectangle
+from utils import AdaptiveQuality
+
+FACE = (200, 150, 440, 390)
+LEFT_EYE = [(260, 240), (275, 232), (290, 232), (305, 240), (290, 248), (275, 248)]
+RIGHT_EYE = [(335, 240), (350, 232), (365, 232), (380, 240), (365, 248), (350, 248)]
+BUDGET_MS = 20
+
+
+class FixedBackend(DetectorBackend):
+    """Finds the same face and eyes in every frame, taking `delay` seconds to do it."""
+    name = "fixed"
+
+    def __init__(self, delay: float = 0.0) -> None:
+        super(FixedBackend, self).__init__()
+        self.delay = delay
+
+    def load(self) -> None:
+        pass
+
+    def _detect_faces(self, gray: np.ndarray) -> List[Rectangle]:
+        return [FACE]
+
+    def predict(self, gray: np.ndarray, face: Rectangle) -> Optional[Detection]:
+        time.sleep(self.delay)
+        return Detection(face, LEFT_EYE, RIGHT_EYE)
+
+
+class CameraControllerQualityTest(unittest.TestCase):
+    def run_frames(self, backend: DetectorBackend, callback_delay: float) -> CameraControllerDlib:
+        camera = CameraControllerDlib(eye_callback=lambda left_eye, right_eye: time.sleep(callback_delay),
+                                      backend=backend, show_preview=False)
+        camera.quality = AdaptiveQuality([QualityLevel(backend), QualityLevel(FixedBackend())], budget_ms=BUDGET_MS)
+        camera.frame = np.zeros((480, 640, 3), dtype=np.uint8)
+
+        for _ in range(camera.quality._frame_times.maxlen):
+            camera.frame_counter += 1
+            camera.process_frame()
+
+        return camera
+
+    def test_a_slow_callback_does_not_step_the_detector_down(self) -> None:
+        camera = self.run_frames(FixedBackend(), callback_delay=BUDGET_MS * 2 / 1000)
+        self.assertEqual(camera.quality.index, 0)
+
+    def test_a_slow_detector_steps_down(self) -> None:
+        camera = self.run_frames(FixedBackend(delay=BUDGET_MS * 2 / 1000), callback_delay=0)
+        self.assertEqual(camera.quality.index, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+import unittest
+
+from models.cursor_uinput import (BTN_LEFT, EV_KEY, EV_REL, EV_SYN, REL_X, REL_Y, SYN_REPORT,
+                                  RecordingUInputDevice, UInputCursor)
+
+
+class UInputCursorTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.device = RecordingUInputDevice()
+        with self.assertLogs(level='WARNING'):
+            self.cursor = UInputCursor(device=self.device)
+
+    def test_move_is_one_report_in_one_write(self) -> None:
+        self.cursor.move(5, -3)
+
+        self.assertEqual(len(self.device.writes), 1)
+        self.assertEqual(self.device.events, [(EV_REL, REL_X, 5), (EV_REL, REL_Y, -3), (EV_SYN, SYN_REPORT, 0)])
+
+    def test_unchanged_axis_is_left_out(self) -> None:
+        self.cursor.move(0, 7)
+
+        self.assertEqual(self.device.reports, [[(EV_REL, REL_Y, 7)]])
+
+    def test_no_movement_writes_nothing(self) -> None:
+        self.cursor.move(0, 0)
+
+        self.assertEqual(self.device.writes, [])
+
+    def test_deltas_follow_the_emitted_position(self) -> None:
+        self.cursor.move(10, 0)
+        self.cursor.move(-4, 2)
+
+        self.assertEqual(self.device.reports, [[(EV_REL, REL_X, 10)], [(EV_REL, REL_X, -4), (EV_REL, REL_Y, 2)]])
+
+    def test_click_comes_after_the_motion_before_it(self) -> None:
+        self.cursor.move(3, 4)
+        self.cursor.press_left_click()
+        self.cursor.release_left_click()
+
+        self.assertEqual(self.device.reports, [
+            [(EV_REL, REL_X, 3), (EV_REL, REL_Y, 4)],
+            [(EV_KEY, BTN_LEFT, 1)],
+            [(EV_KEY, BTN_LEFT, 0)],
+        ])
+        # every write ends with its SYN_REPORT
+        self.assertEqual(self.device.events[-1], (EV_SYN, SYN_REPORT, 0))
+        self.assertEqual(len(self.device.writes), 3)
+
+    def test_unsynced_motion_goes_out_with_the_click(self) -> None:
+        # a position that was never written out
+        self.cursor._x += 2
+        self.cursor.press_left_click()
+
+        self.assertEqual(self.device.reports, [[(EV_REL, REL_X, 2), (EV_KEY, BTN_LEFT, 1)]])
+
+    def test_close_releases_the_device(self) -> None:
+        self.cursor.close()
+
+        self.assertTrue(self.device.closed)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,29 @@
+import unittest
+
+import numpy as np
+
+from controllers import HaarEyeBackend
+
+FRAME_SHAPE = (480, 640)
+
+
+class HaarEyeBackendTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.backend = HaarEyeBackend()
+        self.backend.load()
+        self.gray = np.zeros(FRAME_SHAPE, dtype=np.uint8)
+
+    def test_a_face_past_the_edges_is_cropped_to_the_frame(self) -> None:
+        detection = self.backend.predict(self.gray, (560, -40, 720, 120))
+
+        self.assertIsNotNone(detection)
+        for x, y in detection.left_eye + detection.right_eye:
+            self.assertTrue(560 <= x <= FRAME_SHAPE[1], (x, y))
+
+    def test_a_face_outside_the_frame_has_no_eyes(self) -> None:
+        self.assertIsNone(self.backend.predict(self.gray, (650, 100, 800, 260)))
+        self.assertIsNone(self.backend.predict(self.gray, (100, 500, 260, 660)))
+
+
+if __name__ == '__main__':
+    unittest.main()
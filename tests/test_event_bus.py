@@ -0,0 +1,148 @@
+import os
+import socket
+import tempfile
+import time
+import unittest
+from types import SimpleNamespace
+from typing import List
+
+from main import EVENT_DETECTION_DURATION_MS, MainController
+from models.cursor_recording import RecordingCursor
+from server.event_bus import Event, EventDecoder, EventType, GestureEventBus
+from utils import VirtualClock
+
+OPEN, CLOSED = 4.0, 9.0
+
+
+@unittest.skipUnless(hasattr(socket, "AF_UNIX"), "the bus needs Unix domain sockets")
+class GestureEventsTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.bus = GestureEventBus(os.path.join(self.directory.name, "events.sock"))
+        self.bus.start()
+
+        self.subscriber = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.subscriber.connect(self.bus.path)
+        self.subscriber.settimeout(2)
+        # events are only sent once the bus has registered the subscriber
+        deadline = time.monotonic() + 2
+        while not self.bus._subscribers and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+        self.clock = VirtualClock()
+        self.controller = MainController(cursor=RecordingCursor(), use_camera=False, use_sensor=False,
+                                         event_bus=self.bus, clock=self.clock)
+
+    def tearDown(self) -> None:
+        self.subscriber.close()
+        self.bus.stop()
+        self.directory.cleanup()
+
+    def _eyes(self, ratio: float, at_ms: float) -> None:
+        self.clock.advance_to(at_ms / 1000)
+        eye = SimpleNamespace(closeness_ratio=ratio)
+        self.controller.gesture_algorithm(eye, eye)
+
+    def _receive_until(self, event_type: EventType) -> List[Event]:
+        decoder, events = EventDecoder(), []
+        while not any(event[0] == event_type for event in events):
+            data = self.subscriber.recv(4096)
+            if not data:
+                break
+            events.extend(decoder.feed(data))
+
+        return events
+
+    def test_double_blink_is_published_as_gesture_and_blink(self) -> None:
+        for ratio, at_ms in ((OPEN, 0), (CLOSED, 100), (OPEN, 300), (CLOSED, 400), (OPEN, 600)):
+            self._eyes(ratio, at_ms)
+
+        # nothing follows the second blink, so the gesture is reported when the timeout fires
+        self.clock.advance_to((600 + EVENT_DETECTION_DURATION_MS) / 1000)
+        self.controller.gesture_scheduler.poll(self.clock() * 1000)
+
+        events = self._receive_until(EventType.BLINK)
+        gestures = [values[0].rstrip(b"\0") for event_type, _, values in events if event_type == EventType.GESTURE]
+        blinks = [values[0] for event_type, _, values in events if event_type == EventType.BLINK]
+
+        self.assertEqual(gestures, [b"double_blink"])
+        self.assertEqual(blinks, [2])
+        self.assertEqual(self.controller.cursor.commands[-1][0], "double_left_click")
+
+    def test_multiple_blinks_are_published_with_their_count(self) -> None:
+        for i in range(4):
+            self._eyes(OPEN, i * 300)
+            self._eyes(CLOSED, i * 300 + 100)
+        self._eyes(OPEN, 1200)
+
+        self.clock.advance_to((1200 + EVENT_DETECTION_DURATION_MS) / 1000)
+        self.controller.gesture_scheduler.poll(self.clock() * 1000)
+
+        blinks = [values[0] for event_type, _, values in self._receive_until(EventType.BLINK)
+                  if event_type == EventType.BLINK]
+        self.assertEqual(blinks, [4])
+        self.assertEqual(self.controller.cursor.commands[-1][0], "right_click")
+
+    def test_a_long_closure_clicks_like_a_blink(self) -> None:
+        for ratio, at_ms in ((OPEN, 0), (CLOSED, 100), (CLOSED, 700), (OPEN, 800)):
+            self._eyes(ratio, at_ms)
+
+        events = self._receive_until(EventType.BLINK)
+        gestures = [values[0].rstrip(b"\0") for event_type, _, values in events if event_type == EventType.GESTURE]
+        blinks = [values[0] for event_type, _, values in events if event_type == EventType.BLINK]
+
+        self.assertEqual(gestures, [b"long_close"])
+        self.assertEqual(blinks, [1])
+        self.assertEqual(self.controller.cursor.commands[-1][0], "left_click")
+
+
+@unittest.skipUnless(hasattr(socket, "AF_UNIX"), "the bus needs Unix domain sockets")
+class GestureEventBusLifecycleTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "events.sock")
+
+    def tearDown(self) -> None:
+        self.directory.cleanup()
+
+    def test_a_socket_left_behind_is_replaced(self) -> None:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as stale:
+            stale.bind(self.path)
+
+        bus = GestureEventBus(self.path)
+        bus.start()
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as subscriber:
+            subscriber.connect(self.path)
+        bus.stop()
+
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_the_socket_of_a_running_bus_is_not_taken(self) -> None:
+        running = GestureEventBus(self.path)
+        running.start()
+        try:
+            with self.assertRaises(OSError):
+                GestureEventBus(self.path).start()
+
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as subscriber:
+                subscriber.connect(self.path)
+        finally:
+            running.stop()
+
+    def test_a_socket_that_can_not_be_created_fails_the_start(self) -> None:
+        bus = GestureEventBus(os.path.join(self.directory.name, "missing", "events.sock"))
+
+        with self.assertRaises(OSError):
+            bus.start()
+        bus.stop()
+
+    def test_stopping_twice(self) -> None:
+        bus = GestureEventBus(self.path)
+        bus.start()
+
+        bus.stop()
+        bus.stop()
+
+
+if __name__ == '__main__':
+    unittest.main()
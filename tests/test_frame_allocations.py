@@ -0,0 +1,71 @@
+import os
+import tempfile
+import unittest
+from typing import List
+
+import cv2
+import numpy as np
+
+from benchmarks.frame_allocations import check, measure
+from controllers.detector_backends import Detection, DetectorBackend, Rectangle
+
+FRAME_SIZE = (640, 480)
+FRAMES = 90
+DETECTION = Detection((200, 150, 440, 390),
+                      [(260, 240), (275, 232), (290, 232), (305, 240), (290, 248), (275, 248)],
+                      [(335, 240), (350, 232), (365, 232), (380, 240), (365, 248), (350, 248)])
+
+
+def write_clip(path: str) -> None:
+    """A gradient that moves a little every frame, so each frame decodes to different pixels."""
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'MJPG'), 30, FRAME_SIZE)
+    columns = np.arange(FRAME_SIZE[0], dtype=np.uint16)
+    for i in range(FRAMES):
+        row = ((columns + i * 4) % 256).astype(np.uint8)
+        writer.write(cv2.merge([np.tile(row, (FRAME_SIZE[1], 1))] * 3))
+    writer.release()
+
+
+class FixedBackend(DetectorBackend):
+    """Finds the same face and eyes in every frame, so the frames go through the eyes and the callback path."""
+    name = "fixed"
+
+    def load(self) -> None:
+        pass
+
+    def _detect_faces(self, gray: np.ndarray) -> List[Rectangle]:
+        return [DETECTION.face]
+
+    def predict(self, gray: np.ndarray, face: Rectangle) -> Detection:
+        return DETECTION
+
+
+class FrameAllocationsTest(unittest.TestCase):
+    def measure(self, **kwargs) -> dict:
+        with tempfile.TemporaryDirectory() as directory:
+            clip = os.path.join(directory, "clip.avi")
+            write_clip(clip)
+
+            return measure(clip, frames=FRAMES - 30, warmup=30, **kwargs)
+
+    def test_steady_state_frames_stay_within_budget(self) -> None:
+        result = self.measure()
+
+        self.assertEqual(result["frames"], FRAMES - 30)
+        self.assertEqual(check(result), [])
+
+    def test_frames_with_a_face_stay_within_budget(self) -> None:
+        result = self.measure(backend=FixedBackend())
+
+        self.assertEqual(result["frames_with_eyes"], FRAMES - 30)
+        self.assertEqual(check(result), [])
+
+    def test_a_frame_sized_allocation_fails(self) -> None:
+        result = {"frames": 10, "frames_with_eyes": 0, "frame_bytes": 921600, "worst_frame_peak_bytes": 307200,
+                  "traced_growth_bytes": 0, "rss_growth_kb": 0}
+
+        self.assertEqual(len(check(result)), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
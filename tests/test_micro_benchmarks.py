@@ -0,0 +1,25 @@
+import unittest
+
+from benchmarks.micro import BENCHMARKS, THRESHOLDS_PATH, load_thresholds, run
+
+
+class MicroBenchmarksTest(unittest.TestCase):
+    def test_every_benchmark_runs(self) -> None:
+        results, _ = run(rounds=1, thresholds={}, verbose=False)
+
+        self.assertEqual(set(results), set(BENCHMARKS))
+
+    def test_no_benchmark_is_slower_than_its_threshold(self) -> None:
+        thresholds = load_thresholds()
+        # a benchmark without a threshold would never fail
+        self.assertEqual(set(thresholds), set(BENCHMARKS), f"regenerate {THRESHOLDS_PATH}")
+
+        _, failures = run(thresholds=thresholds, verbose=False)
+        # measured once more, so a busy moment of the machine does not fail the suite
+        failures = [name for name in failures if run(name, thresholds=thresholds, verbose=False)[1]]
+
+        self.assertEqual(failures, [], "slower than the threshold")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,51 @@
+import unittest
+
+import numpy as np
+
+from models.cursor_recording import RecordingCursor
+from server.multi_seat import Seat, SeatServer
+
+FRAME = np.zeros((48, 64), dtype=np.uint8)
+
+
+class FailingPool:
+    """Fails every frame the way a pool does when a result cannot be sent back."""
+
+    def apply_async(self, func, args, callback=None, error_callback=None) -> None:
+        error_callback(RuntimeError("result could not be pickled"))
+
+
+class SeatServerTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.seat = Seat("a", source=None, cursor=RecordingCursor(), drop_frames=False, max_in_flight=2)
+        self.server = SeatServer([self.seat], workers=1)
+
+    def schedule_failing_frame(self, frame_id: int) -> None:
+        self.seat.frames.put((frame_id, 0.0, FRAME))
+        with self.assertLogs(level="ERROR"):
+            self.server._schedule(FailingPool())
+
+    def test_a_failed_frame_is_dropped_and_frees_its_slot(self) -> None:
+        self.schedule_failing_frame(0)
+        self.assertEqual(self.seat.in_flight, 1)
+
+        self.seat.deliver(self.server._results.get_nowait())
+
+        self.assertEqual(self.seat.in_flight, 0)
+        self.assertEqual(self.seat.dropped_frames, 1)
+        self.assertEqual(self.seat.latency.total, 0)
+
+    def test_the_frames_after_a_failed_one_are_delivered(self) -> None:
+        self.schedule_failing_frame(0)
+
+        # the next frame comes back first, and waits for the failed one
+        self.seat.in_flight += 1
+        self.seat.deliver(("a", 1, 0.0, None))
+        self.assertEqual(self.seat.latency.total, 0)
+
+        self.seat.deliver(self.server._results.get_nowait())
+        self.assertEqual(self.seat.latency.total, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
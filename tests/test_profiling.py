@@ -0,0 +1,68 @@
+import json
+import os
+import signal
+import tempfile
+import unittest
+
+from main import MainController
+from models.cursor_recording import RecordingCursor
+from utils import PROFILER
+from utils.profiling import _request_path
+
+
+class LoopProfilerTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.output_dir, PROFILER.output_dir = PROFILER.output_dir, self.directory.name
+
+    def tearDown(self) -> None:
+        PROFILER.output_dir = self.output_dir
+        self.directory.cleanup()
+
+    def test_sensor_samples_are_profiled_where_they_are_handled(self) -> None:
+        controller = MainController(cursor=RecordingCursor(), use_camera=False, use_sensor=False)
+        PROFILER.request("sensor", "cprofile", iterations=2)
+
+        for _ in range(2):
+            # what the asyncio runtime calls on the loop for each posted sample
+            controller.sensor_data_handler(0.5, 0.5)
+
+        self.assertTrue(PROFILER.idle)
+        self.assertEqual(len(os.listdir(self.directory.name)), 1)
+
+    @unittest.skipUnless(hasattr(signal, "SIGUSR1"), "requests are sent with SIGUSR1")
+    def test_bad_requests_are_ignored(self) -> None:
+        previous = signal.getsignal(signal.SIGUSR1)
+        PROFILER.install_signal_handler()
+        try:
+            for request in ('{"target": "camera", "frames": 10}', '["camera"]', '{"iterations": "all"}', '{'):
+                with open(_request_path(os.getpid()), "w") as f:
+                    f.write(request)
+
+                with self.assertLogs(level="ERROR"):
+                    os.kill(os.getpid(), signal.SIGUSR1)
+                self.assertTrue(PROFILER.idle)
+        finally:
+            signal.signal(signal.SIGUSR1, previous)
+            if os.path.exists(_request_path(os.getpid())):
+                os.remove(_request_path(os.getpid()))
+
+    @unittest.skipUnless(hasattr(signal, "SIGUSR1"), "requests are sent with SIGUSR1")
+    def test_a_request_from_another_process_starts_a_profile(self) -> None:
+        previous = signal.getsignal(signal.SIGUSR1)
+        PROFILER.install_signal_handler()
+        try:
+            with open(_request_path(os.getpid()), "w") as f:
+                json.dump({"target": "camera", "mode": "sampling", "iterations": 1}, f)
+            os.kill(os.getpid(), signal.SIGUSR1)
+
+            self.assertFalse(PROFILER.idle)
+            PROFILER.begin("camera")
+            PROFILER.end("camera")
+            self.assertTrue(PROFILER.idle)
+        finally:
+            signal.signal(signal.SIGUSR1, previous)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+import random
+import unittest
+from typing import List, Optional, Tuple
+
+from utils import CaptureRateGovernor, EyeTokenizer, Token
+from utils.rate_governor import evaluate_session
+
+OPEN, CLOSED = 4.0, 9.0
+THRESHOLD = 6.5
+FRAME_MS = 1000 / 30
+
+
+def synthetic_session(minutes: float, seed: int = 1) -> Tuple[List[float], List[Optional[float]]]:
+    """30 fps of open eyes with a closure of 60-400 ms every 2-8 seconds."""
+    rng = random.Random(seed)
+    timestamps, ratios = [], []
+
+    now, next_closure, closure_end = 0.0, 3000.0, None
+    while now < minutes * 60000:
+        if closure_end is None and now >= next_closure:
+            closure_end = now + rng.uniform(60, 400)
+        if closure_end is not None and now >= closure_end:
+            closure_end, next_closure = None, now + rng.uniform(2000, 8000)
+
+        timestamps.append(now)
+        ratios.append(CLOSED if closure_end is not None else OPEN + rng.uniform(-0.2, 0.2))
+        now += FRAME_MS
+
+    return timestamps, ratios
+
+
+class EyeTokenizerTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tokenizer = EyeTokenizer(THRESHOLD, short_ms=135, long_ms=550)
+
+    def test_skipped_frames_do_not_make_a_blink(self) -> None:
+        self.tokenizer.feed(OPEN, OPEN, 0)
+        self.tokenizer.feed(CLOSED, CLOSED, 100, closed_after_ms=50)
+
+        # 180 ms counted from the skipped frame, but only 130 ms were seen
+        self.assertIsNone(self.tokenizer.feed(OPEN, OPEN, 230))
+        self.assertEqual(self.tokenizer.last_closure_ms, 130)
+
+    def test_a_blink_is_counted_from_the_skipped_frame(self) -> None:
+        self.tokenizer.feed(OPEN, OPEN, 0)
+        self.tokenizer.feed(CLOSED, CLOSED, 100, closed_after_ms=50)
+
+        self.assertEqual(self.tokenizer.feed(OPEN, OPEN, 300), Token.BLINK)
+        self.assertEqual(self.tokenizer.last_closure_ms, 250)
+
+
+class CaptureRateGovernorTest(unittest.TestCase):
+    def test_no_blink_is_made_up(self) -> None:
+        report = evaluate_session(*synthetic_session(minutes=10), blink_threshold=THRESHOLD, frame_cost_ms=30)
+
+        self.assertGreater(report["blinks"], 50)
+        self.assertEqual(report["extra_blinks"], 0)
+        self.assertLessEqual(report["worst_blink_delay_ms"], 50)
+        self.assertGreater(report["cpu_saved_fraction"], 0.2)
+
+    def test_a_degenerate_first_frame_is_not_the_baseline(self) -> None:
+        governor = CaptureRateGovernor(THRESHOLD)
+        governor.observe(0.0, 0.0)
+        governor.observe(OPEN, 0.1)
+        self.assertFalse(governor.is_active)
+
+        governor.observe(OPEN * 1.5, 0.2)
+        self.assertTrue(governor.is_active)
+
+
+if __name__ == '__main__':
+    unittest.main()
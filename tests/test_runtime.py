@@ -0,0 +1,71 @@
+import asyncio
+import threading
+import time
+import unittest
+from types import SimpleNamespace
+
+from main import MainController
+from models.cursor_recording import RecordingCursor
+from runtime import AsyncRuntime
+from utils import TRACER, Token, VirtualClock
+
+OPEN, CLOSED = 4.0, 9.0
+
+
+class SlowCursor(RecordingCursor):
+    """Takes as long to click as a real cursor does."""
+
+    def left_click(self) -> None:
+        time.sleep(0.2)
+        super(SlowCursor, self).left_click()
+
+
+class AsyncRuntimeTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.clock = VirtualClock()
+        self.controller = MainController(cursor=SlowCursor(), use_camera=False, use_sensor=False, clock=self.clock)
+        self.runtime = AsyncRuntime(self.controller)
+
+    def tearDown(self) -> None:
+        self.runtime._click_executor.shutdown(wait=True)
+        TRACER.begin_frame(0, 0.0)
+
+    def test_eyes_are_handled_with_the_frame_they_were_posted_with(self) -> None:
+        tokens = []
+        self.controller.gesture_recognizer.feed = lambda token, now_ms, source=None: tokens.append(
+            (token, now_ms, source))
+        post = self.runtime._post(self.controller.gesture_algorithm, "frame", self.controller.frame_context)
+
+        def camera(ratio: float, at_ms: float, frame_id: int) -> None:
+            self.clock.advance_to(at_ms / 1000)
+            TRACER.begin_frame(frame_id, frame_id / 30)
+            eye = SimpleNamespace(closeness_ratio=ratio)
+            post(eye, eye)
+
+        async def scenario() -> None:
+            self.runtime._loop = asyncio.get_running_loop()
+
+            # the camera gets through a few frames before the loop handles the first
+            thread = threading.Thread(target=lambda: [camera(*frame) for frame in
+                                                      ((OPEN, 0, 1), (CLOSED, 100, 2), (OPEN, 300, 3), (OPEN, 900, 4))])
+            thread.start()
+            thread.join()
+            await asyncio.sleep(0)
+
+        asyncio.run(scenario())
+
+        self.assertEqual(tokens, [(Token.BLINK, 300, (3, 3 / 30))])
+
+    def test_clicks_do_not_block_and_stay_in_order(self) -> None:
+        started = time.perf_counter()
+        self.controller.gesture_handler("single_blink")
+        self.controller.gesture_handler("double_blink")
+        self.assertLess(time.perf_counter() - started, 0.1)
+
+        self.runtime._click_executor.shutdown(wait=True)
+        self.assertEqual([command for command, _, _ in self.controller.cursor.commands],
+                         ["left_click", "double_left_click"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,40 @@
+import functools
+import os
+import sys
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from utils import SchedulingProfile
+
+
+def _nice() -> int:
+    return os.getpriority(os.PRIO_PROCESS, threading.get_native_id())
+
+
+@unittest.skipUnless(sys.platform.startswith("linux"), "priorities are only per thread on Linux")
+class SchedulingProfileTest(unittest.TestCase):
+    def test_startup_threads_do_not_inherit_the_loops_priority(self) -> None:
+        profile = SchedulingProfile()
+        profile.configure(elevated=("loop",))
+        niceness = {}
+
+        def loop() -> None:
+            profile.apply("loop")
+            niceness["loop"] = _nice()
+
+            # threads are created from the loop's thread, like the runtime's executors
+            with ThreadPoolExecutor(max_workers=1, initializer=functools.partial(profile.apply, "startup")) as startup:
+                niceness["startup"] = startup.submit(_nice).result()
+
+        thread = threading.Thread(target=loop)
+        thread.start()
+        thread.join()
+
+        if niceness["loop"] == _nice():
+            self.skipTest("raising a priority needs CAP_SYS_NICE")
+        self.assertEqual(niceness["startup"], _nice())
+
+
+if __name__ == '__main__':
+    unittest.main()
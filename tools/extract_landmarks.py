@@ -0,0 +1,255 @@
+"""
+Runs the detection and landmark pipeline over a directory of recorded videos, on every core.
+
+    python -m tools.extract_landmarks videos/ landmarks/ [--workers N]
+
+Each video goes to <output>/<sha256 of its content>/ as numbered .npz parts with one array per column,
+and a meta.json written once every part is there. Videos that already have a meta.json are skipped,
+even if they were renamed or moved. A video that could not be read has no meta.json, so it is tried again next run. Coordinates and left/right are in the mirrored frame, like in the live loop.
+
+Columns:
+    frame         frame index in the video, as the decoder reports it
+    timestamp_ms  position of the frame in the video
+    face          x1, y1, x2, y2, -1 if no face was found
+    left_eye      6 (x, y) landmarks, -1 if no face was found
+    right_eye     6 (x, y) landmarks, -1 if no face was found
+    left_ratio    closeness ratio, NaN if no face was found
+    right_ratio   closeness ratio, NaN if no face was found
+"""
+import argparse
+import glob
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+from collections import defaultdict
+from typing import Dict, List, Optional, Set, Tuple
+
+import cv2
+import numpy as np
+
+from controllers import DetectorBackend, DlibHogBackend, mirror_detection
+from models import Eye, Face
+
+VIDEO_EXTENSIONS = (".mp4", ".avi", ".mkv", ".mov", ".webm")
+# long videos are split so a few of them still keep every core busy
+SEGMENT_FRAMES = 3000
+HASH_BLOCK_SIZE = 1 << 20
+FORMAT_VERSION = 1
+
+# the backend of each worker process, loaded once by the pool initializer
+_worker_backend: Optional[DetectorBackend] = None
+
+VideoInfo = Tuple[str, str, int, float]  # path, content hash, frame count, fps
+Segment = Tuple[str, str, int, int, str]  # path, content hash, first frame, frame count, output directory
+
+
+def _init_worker() -> None:
+    global _worker_backend
+
+    # one process per core already, more threads would only compete with each other
+    cv2.setNumThreads(1)
+
+    _worker_backend = DlibHogBackend()
+    _worker_backend.load()
+
+
+def content_hash(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b""):
+            digest.update(block)
+
+    return digest.hexdigest()
+
+
+def _inspect(path: str) -> Optional[VideoInfo]:
+    try:
+        capture_device = cv2.VideoCapture(path)
+        frame_count = int(capture_device.get(cv2.CAP_PROP_FRAME_COUNT))
+        fps = capture_device.get(cv2.CAP_PROP_FPS)
+        capture_device.release()
+
+        return path, content_hash(path), frame_count, fps
+    except Exception as e:
+        logging.error(f"{path}: could not be inspected, skipping: {e}")
+        return None
+
+
+def _open_at(path: str, first_frame: int) -> cv2.VideoCapture:
+    """Opens a video so that the next frame read is `first_frame`."""
+    capture_device = cv2.VideoCapture(path)
+    if not first_frame:
+        return capture_device
+
+    capture_device.set(cv2.CAP_PROP_POS_FRAMES, first_frame)
+    if int(capture_device.get(cv2.CAP_PROP_POS_FRAMES)) == first_frame:
+        return capture_device
+
+    # seeks land near a keyframe instead in variable frame rate containers, so the frames are skipped one by one
+    logging.debug(f"{path}: seeking to frame {first_frame} missed, skipping to it instead.")
+    capture_device.release()
+    capture_device = cv2.VideoCapture(path)
+    for _ in range(first_frame):
+        if not capture_device.grab():
+            break
+
+    return capture_device
+
+
+def _closeness_ratio(face: Face, eye_type: Eye.Type, points) -> float:
+    try:
+        return Eye.get_from_points(None, face, eye_type, points).closeness_ratio
+    except ZeroDivisionError:
+        return float('inf')  # fully closed
+
+
+def _extract_segment(segment: Segment) -> Tuple[str, int, Optional[int]]:
+    """Returns the content hash, the first frame and the number of frames written, None if the segment failed."""
+    path, digest, first_frame, _, _ = segment
+    try:
+        return digest, first_frame, _extract_frames(segment)
+    except Exception as e:
+        # one broken video should not end a batch that runs for hours
+        logging.error(f"{path}: frames from {first_frame} could not be processed: {e}")
+        return digest, first_frame, None
+
+
+def _extract_frames(segment: Segment) -> int:
+    path, digest, first_frame, frame_count, output_dir = segment
+    _worker_backend.reset()
+
+    columns = {
+        "frame"       : np.full(frame_count, -1, dtype=np.int32),
+        "timestamp_ms": np.full(frame_count, np.nan, dtype=np.float64),
+        "face"        : np.full((frame_count, 4), -1, dtype=np.int32),
+        "left_eye"    : np.full((frame_count, 6, 2), -1, dtype=np.int32),
+        "right_eye"   : np.full((frame_count, 6, 2), -1, dtype=np.int32),
+        "left_ratio"  : np.full(frame_count, np.nan, dtype=np.float32),
+        "right_ratio" : np.full(frame_count, np.nan, dtype=np.float32),
+    }
+
+    capture_device = _open_at(path, first_frame)
+
+    frame = gray = filtered = None
+    written = 0
+    while written < frame_count:
+        successful, frame = capture_device.read(frame)
+        if not successful:
+            break
+
+        # the position is that of the next frame
+        columns["frame"][written] = int(capture_device.get(cv2.CAP_PROP_POS_FRAMES)) - 1
+        columns["timestamp_ms"][written] = capture_device.get(cv2.CAP_PROP_POS_MSEC)
+
+        # same preprocessing as the live loop
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY, dst=gray)
+        filtered = cv2.bilateralFilter(gray, 5, 1, 1, dst=filtered)
+
+        face_coordinates = _worker_backend.locate_face(filtered)
+        if face_coordinates is not None:
+            detection = mirror_detection(_worker_backend.predict(filtered, face_coordinates), frame.shape[1])
+            face = Face(None, detection.face)
+
+            columns["face"][written] = detection.face
+            columns["left_eye"][written] = detection.left_eye
+            columns["right_eye"][written] = detection.right_eye
+            columns["left_ratio"][written] = _closeness_ratio(face, Eye.Type.LEFT, detection.left_eye)
+            columns["right_ratio"][written] = _closeness_ratio(face, Eye.Type.RIGHT, detection.right_eye)
+
+        written += 1
+
+    capture_device.release()
+
+    # written under a temporary name first, so a killed run never leaves a half written part behind
+    part_path = os.path.join(output_dir, digest, f"part-{first_frame:09d}.npz")
+    with open(part_path + ".tmp", "wb") as f:
+        np.savez_compressed(f, **{name: column[:written] for name, column in columns.items()})
+    os.replace(part_path + ".tmp", part_path)
+
+    return written
+
+
+def load_landmarks(directory: str) -> Dict[str, np.ndarray]:
+    """Reads the parts of a processed video back into one array per column."""
+    parts = sorted(glob.glob(os.path.join(directory, "part-*.npz")))
+
+    columns: Dict[str, List[np.ndarray]] = defaultdict(list)
+    for part in parts:
+        with np.load(part) as data:
+            for name in data.files:
+                columns[name].append(data[name])
+
+    return {name: np.concatenate(values) for name, values in columns.items()}
+
+
+def extract(input_dir: str, output_dir: str, workers: int, segment_frames: int = SEGMENT_FRAMES) -> None:
+    paths = sorted(
+        path for path in glob.glob(os.path.join(input_dir, "**", "*"), recursive=True)
+        if path.lower().endswith(VIDEO_EXTENSIONS)
+    )
+    os.makedirs(output_dir, exist_ok=True)
+
+    with multiprocessing.Pool(workers, initializer=_init_worker) as pool:
+        # hashing reads every byte of every video, so that is spread over the pool too
+        videos = [video for video in pool.imap_unordered(_inspect, paths)
+                  if video and not os.path.exists(os.path.join(output_dir, video[1], "meta.json"))]
+        logging.info(f"{len(paths) - len(videos)} of {len(paths)} videos were already processed.")
+
+        segments: List[Segment] = []
+        remaining: Dict[str, int] = {}
+        for path, digest, frame_count, fps in videos:
+            if digest in remaining.keys():
+                continue  # the same video twice
+            if frame_count <= 0:
+                logging.warning(f"{path}: could not read the number of frames, skipping.")
+                continue
+
+            os.makedirs(os.path.join(output_dir, digest), exist_ok=True)
+            starts = range(0, frame_count, segment_frames)
+            segments.extend((path, digest, start, min(segment_frames, frame_count - start), output_dir)
+                            for start in starts)
+            remaining[digest] = len(starts)
+
+        # the longest videos first, so the last segments are not all from one of them
+        segments.sort(key=lambda segment: -remaining[segment[1]])
+
+        written: Dict[str, int] = defaultdict(int)
+        failed: Set[str] = set()
+        videos_by_hash = {video[1]: video for video in videos}
+        for digest, first_frame, frames in pool.imap_unordered(_extract_segment, segments):
+            if frames is None:
+                failed.add(digest)
+            else:
+                written[digest] += frames
+            remaining[digest] -= 1
+            if remaining[digest]:
+                continue
+
+            path, _, frame_count, fps = videos_by_hash[digest]
+            if digest in failed:
+                # the parts that were written are kept, but without meta.json the video is processed again
+                logging.warning(f"{path}: some frames could not be processed, it will be retried next run.")
+                continue
+
+            with open(os.path.join(output_dir, digest, "meta.json"), "w") as f:
+                json.dump({"version": FORMAT_VERSION, "source": os.path.relpath(path, input_dir),
+                           "frames": written[digest], "fps": fps}, f, indent=2)
+
+            if written[digest] != frame_count:
+                logging.warning(f"{path}: expected {frame_count} frames, read {written[digest]}.")
+            logging.info(f"Processed {path}.")
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='[{levelname:<7}] {message}', style='{')
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('input_dir')
+    parser.add_argument('output_dir')
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--segment-frames', type=int, default=SEGMENT_FRAMES)
+    args = parser.parse_args()
+
+    extract(args.input_dir, args.output_dir, args.workers, args.segment_frames)
@@ -1,2 +1,12 @@
+from .calibration import *
+from .clock import *
 from .drawing import *
+from .gestures import *
+from .metrics import *
+from .motion_gate import *
+from .profiling import *
+from .scheduling import *
 from .timer import *
+from .tracing import *
+from .adaptive_quality import *
+from .rate_governor import *
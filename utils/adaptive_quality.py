@@ -0,0 +1,75 @@
+import logging
+from collections import deque
+from typing import Deque, Generic, List, TypeVar
+
+from .timer import percentile
+
+__all__ = ['AdaptiveQuality']
+
+T = TypeVar('T')
+
+
+class AdaptiveQuality(Generic[T]):
+    """
+    Walks a list of levels (ordered from the most expensive to the cheapest)
+    so that the 95th percentile frame time stays within the budget.
+    """
+
+    def __init__(self, levels: List[T], budget_ms: float, window: int = 30,
+                 headroom: float = 0.6, recovery_windows: int = 3) -> None:
+        self.levels = levels
+        self.budget_ms = budget_ms
+        # step back up only if p95 is below this fraction of the budget
+        self.headroom = headroom
+
+        self.index = 0
+        self._frame_times: Deque[float] = deque(maxlen=window)
+
+        # good windows needed before stepping up into each level.
+        # doubled each time a level turns out to be too expensive right after stepping up into it
+        self._patience: List[int] = [recovery_windows] * len(levels)
+        self._good_windows = 0
+        self._just_stepped_up = False
+
+    @property
+    def level(self) -> T:
+        return self.levels[self.index]
+
+    def record(self, frame_time_ms: float) -> bool:
+        """Records a frame time and returns whether the level has changed."""
+        self._frame_times.append(frame_time_ms)
+        if len(self._frame_times) < self._frame_times.maxlen:
+            return False
+
+        p95 = percentile(self._frame_times, 95)
+        self._frame_times.clear()
+
+        if p95 > self.budget_ms:
+            self._good_windows = 0
+            if self.index == len(self.levels) - 1:
+                return False
+
+            if self._just_stepped_up:
+                self._patience[self.index] *= 2
+
+            return self._change_level(self.index + 1, p95)
+
+        self._just_stepped_up = False
+
+        if p95 < self.budget_ms * self.headroom and self.index > 0:
+            self._good_windows += 1
+            if self._good_windows >= self._patience[self.index - 1]:
+                self._good_windows = 0
+                self._just_stepped_up = True
+                return self._change_level(self.index - 1, p95)
+        else:
+            self._good_windows = 0
+
+        return False
+
+    def _change_level(self, index: int, p95: float) -> bool:
+        direction = "down" if index > self.index else "up"
+        self.index = index
+        logging.info(f"p95 frame time is {p95:.1f} ms (budget: {self.budget_ms} ms), "
+                     f"stepping {direction} to: {self.level}")
+        return True
@@ -0,0 +1,184 @@
+import getpass
+import json
+import logging
+import math
+import os
+import platform
+import threading
+from time import perf_counter
+from typing import Any, Dict, Optional, Tuple
+
+__all__ = ['Calibration', 'CalibrationStore', 'calibration_key', 'default_calibration_path']
+
+FORMAT_VERSION = 1
+
+# how fast the neutral pose follows the head while it rests, per sample
+NEUTRAL_DRIFT_RATE = 0.002
+# the dead-zone is this many times the sample to sample jitter at rest, but never below the configured one
+DEADZONE_JITTER_FACTOR = 2.0
+DEADZONE_MAX_FACTOR = 3.0
+# eye ratios needed in each state before the blink threshold is moved away from the default
+EYE_SAMPLES_NEEDED = 30
+EYE_BASELINE_RATE = 0.02
+# the threshold stays within this factor of the default either way
+BLINK_THRESHOLD_MAX_FACTOR = 1.5
+
+
+def default_calibration_path() -> str:
+    config_dir = os.environ.get("XDG_CONFIG_HOME") or os.path.join(os.path.expanduser("~"), ".config")
+    return os.path.join(config_dir, "cursor-control", "calibration.json")
+
+
+def calibration_key(*hardware, user: Optional[str] = None) -> str:
+    """One calibration per user, machine and the devices they use, e.g. the sensor address or the camera index."""
+    return "/".join([user or getpass.getuser(), platform.node()] + [str(part) for part in hardware])
+
+
+class Calibration(object):
+    """
+    What is learned about one user on one set of hardware, refined while running.
+
+    The sensor's neutral pose follows the head slowly while it rests, and the dead-zone grows with the sensor's
+    jitter at rest. Open and closed eye ratios are averaged separately, and once both have been seen enough,
+    the blink threshold sits halfway between them.
+    """
+
+    def __init__(self, deadzone: float, blink_threshold: float) -> None:
+        # the configured values, which the learned ones start from and are bounded by
+        self.default_deadzone = deadzone
+        self.default_blink_threshold = blink_threshold
+
+        # sensor
+        self.neutral: Optional[Tuple[float, float]] = None
+        self.jitter = 0.0
+        self._last_tilt: Optional[Tuple[float, float]] = None
+
+        # eyes
+        self.open_eye_ratio: Optional[float] = None
+        self.closed_eye_ratio: Optional[float] = None
+        self.open_eye_samples = 0
+        self.closed_eye_samples = 0
+
+    @property
+    def deadzone(self) -> float:
+        return min(max(self.default_deadzone, self.jitter * DEADZONE_JITTER_FACTOR),
+                   self.default_deadzone * DEADZONE_MAX_FACTOR)
+
+    @property
+    def blink_threshold(self) -> float:
+        if self.open_eye_samples < EYE_SAMPLES_NEEDED or self.closed_eye_samples < EYE_SAMPLES_NEEDED:
+            return self.default_blink_threshold
+
+        threshold = (self.open_eye_ratio + self.closed_eye_ratio) / 2
+        return min(max(threshold, self.default_blink_threshold / BLINK_THRESHOLD_MAX_FACTOR),
+                   self.default_blink_threshold * BLINK_THRESHOLD_MAX_FACTOR)
+
+    def reset_neutral(self) -> None:
+        """The next tilt becomes the neutral pose."""
+        self.neutral = None
+
+    def observe_tilt(self, x: float, y: float) -> Tuple[float, float]:
+        """Feeds a sensor sample, returns it relative to the neutral pose."""
+        if self.neutral is None:
+            self.neutral = x, y
+
+        neutral_x, neutral_y = self.neutral
+        dx, dy = x - neutral_x, y - neutral_y
+
+        if abs(dx) < self.deadzone and abs(dy) < self.deadzone:
+            # at rest, so slow drift of the sensor or the posture is taken out
+            self.neutral = neutral_x + dx * NEUTRAL_DRIFT_RATE, neutral_y + dy * NEUTRAL_DRIFT_RATE
+
+            if self._last_tilt is not None:
+                last_x, last_y = self._last_tilt
+                self.jitter += (max(abs(x - last_x), abs(y - last_y)) - self.jitter) * NEUTRAL_DRIFT_RATE
+
+        self._last_tilt = x, y
+        return dx, dy
+
+    def observe_eyes(self, left_ratio: float, right_ratio: float) -> None:
+        ratio = (left_ratio + right_ratio) / 2
+        if not math.isfinite(ratio):
+            return
+
+        if ratio > self.blink_threshold:
+            self.closed_eye_samples += 1
+            self.closed_eye_ratio = ratio if self.closed_eye_ratio is None \
+                else self.closed_eye_ratio + (ratio - self.closed_eye_ratio) * EYE_BASELINE_RATE
+        else:
+            self.open_eye_samples += 1
+            self.open_eye_ratio = ratio if self.open_eye_ratio is None \
+                else self.open_eye_ratio + (ratio - self.open_eye_ratio) * EYE_BASELINE_RATE
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "neutral"           : list(self.neutral) if self.neutral else None,
+            "jitter"            : self.jitter,
+            "open_eye_ratio"    : self.open_eye_ratio,
+            "closed_eye_ratio"  : self.closed_eye_ratio,
+            "open_eye_samples"  : self.open_eye_samples,
+            "closed_eye_samples": self.closed_eye_samples,
+        }
+
+    def update_from_dict(self, values: Dict[str, Any]) -> None:
+        neutral = values.get("neutral")
+        self.neutral = tuple(neutral) if neutral else None
+        self.jitter = values.get("jitter", 0.0)
+        self.open_eye_ratio = values.get("open_eye_ratio")
+        self.closed_eye_ratio = values.get("closed_eye_ratio")
+        self.open_eye_samples = values.get("open_eye_samples", 0)
+        self.closed_eye_samples = values.get("closed_eye_samples", 0)
+
+
+class CalibrationStore(object):
+    """Keeps every calibration in one JSON file, rewritten as a whole under a temporary name."""
+
+    def __init__(self, path: Optional[str] = None, save_interval_s: float = 60.0) -> None:
+        self.path = path or default_calibration_path()
+        self.save_interval = save_interval_s
+
+        self._last_saved = perf_counter()
+        # saved from the hotkey loop and on stop, which may be different threads
+        self._lock = threading.Lock()
+
+    def _read(self) -> Dict[str, Dict[str, Any]]:
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logging.warning(f"Could not read the calibrations in {self.path}, starting over: {e}")
+            return {}
+
+        if data.get("version") != FORMAT_VERSION:
+            return {}
+        return data.get("calibrations", {})
+
+    def load(self, key: str, calibration: Calibration) -> bool:
+        """Fills `calibration` with what was saved under `key`, returns whether there was anything."""
+        values = self._read().get(key)
+        if values is None:
+            return False
+
+        calibration.update_from_dict(values)
+        return True
+
+    def save(self, key: str, calibration: Calibration) -> None:
+        with self._lock:
+            calibrations = self._read()
+            calibrations[key] = calibration.to_dict()
+
+            try:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                with open(self.path + ".tmp", "w") as f:
+                    json.dump({"version": FORMAT_VERSION, "calibrations": calibrations}, f, indent=2, sort_keys=True)
+                os.replace(self.path + ".tmp", self.path)
+            except OSError as e:
+                logging.warning(f"Could not save the calibration to {self.path}: {e}")
+
+            self._last_saved = perf_counter()
+
+    def save_if_due(self, key: str, calibration: Calibration) -> None:
+        if perf_counter() - self._last_saved >= self.save_interval:
+            self.save(key, calibration)
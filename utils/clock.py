@@ -0,0 +1,19 @@
+__all__ = ['VirtualClock']
+
+
+class VirtualClock(object):
+    """
+    Stands in for `perf_counter` in offline runs. Time only moves when the run moves it,
+    so the same inputs always meet the same timeouts and intervals.
+    """
+
+    def __init__(self, start: float = 0.0) -> None:
+        self.now = start
+
+    def __call__(self) -> float:
+        return self.now
+
+    def advance_to(self, seconds: float) -> None:
+        # never backwards, like a monotonic clock
+        if seconds > self.now:
+            self.now = seconds
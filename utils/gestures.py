@@ -0,0 +1,305 @@
+import functools
+import heapq
+import itertools
+import threading
+from enum import IntEnum
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+__all__ = [
+    'Token', 'Gesture', 'GestureAutomaton', 'GestureRecognizer', 'TimeoutScheduler', 'EyeTokenizer', 'HeadTokenizer',
+    'compile_gestures'
+]
+
+
+class Token(IntEnum):
+    """What the gestures are made of. Tokenizers turn frames and samples into these."""
+    BLINK = 1  # both eyes closed briefly
+    LONG_CLOSE = 2  # both eyes closed for long, sent while they are still closed
+    WINK_LEFT = 3
+    WINK_RIGHT = 4
+    HEAD_UP = 5  # a quick tilt to one side and back
+    HEAD_DOWN = 6
+    HEAD_LEFT = 7
+    HEAD_RIGHT = 8
+
+
+class Gesture(NamedTuple):
+    name: str
+    tokens: Tuple[Token, ...]
+    # the last token may repeat any number of times
+    repeat_last: bool = False
+
+
+class GestureAutomaton(NamedTuple):
+    # state -> token -> next state, 0 being the start
+    transitions: List[Dict[Token, int]]
+    # state -> the gesture that ends there
+    accepts: List[Optional[str]]
+
+
+def compile_gestures(gestures: Iterable[Gesture]) -> GestureAutomaton:
+    """Compiles the gestures into a deterministic automaton, with one state per distinct prefix."""
+    transitions: List[Dict[Token, int]] = [{}]
+    accepts: List[Optional[str]] = [None]
+
+    for gesture in gestures:
+        if not gesture.tokens:
+            raise ValueError(f"{gesture.name} has no tokens.")
+
+        state = 0
+        for token in gesture.tokens:
+            next_state = transitions[state].get(token)
+            if next_state is None:
+                transitions.append({})
+                accepts.append(None)
+                next_state = transitions[state][token] = len(transitions) - 1
+            state = next_state
+
+        if accepts[state] is not None:
+            raise ValueError(f"{gesture.name} can not be told apart from {accepts[state]}.")
+        accepts[state] = gesture.name
+
+        if gesture.repeat_last:
+            if transitions[state].get(gesture.tokens[-1], state) != state:
+                raise ValueError(f"{gesture.name} repeats into a longer gesture.")
+            transitions[state][gesture.tokens[-1]] = state
+
+    return GestureAutomaton(transitions, accepts)
+
+
+class TimeoutScheduler:
+    """
+    Calls callbacks once their deadline has passed.
+
+    Nothing runs on its own; the loops that feed events call `poll`, which only compares the earliest deadline
+    with the time when nothing is due.
+    """
+
+    def __init__(self) -> None:
+        # deadline, handle, callback
+        self._heap: List[Tuple[float, int, Callable[[], None]]] = []
+        # handles still in the heap, so cancelling one that already ran does not leave it in `_cancelled` forever
+        self._pending: Set[int] = set()
+        self._cancelled: Set[int] = set()
+        self._handles = itertools.count()
+        self._lock = threading.Lock()
+
+    def schedule(self, deadline_ms: float, callback: Callable[[], None]) -> int:
+        handle = next(self._handles)
+        with self._lock:
+            heapq.heappush(self._heap, (deadline_ms, handle, callback))
+            self._pending.add(handle)
+
+        return handle
+
+    def cancel(self, handle: int) -> None:
+        # removed from the heap once it comes up
+        with self._lock:
+            if handle in self._pending:
+                self._cancelled.add(handle)
+
+    @property
+    def next_deadline(self) -> Optional[float]:
+        return self._heap[0][0] if self._heap else None
+
+    def poll(self, now_ms: float) -> int:
+        """Runs the callbacks that are due, returns how many ran."""
+        ran = 0
+        while self._heap and self._heap[0][0] <= now_ms:
+            with self._lock:
+                if not self._heap or self._heap[0][0] > now_ms:
+                    break
+                _, handle, callback = heapq.heappop(self._heap)
+                self._pending.discard(handle)
+                if handle in self._cancelled:
+                    self._cancelled.remove(handle)
+                    continue
+
+            callback()
+            ran += 1
+
+        return ran
+
+
+class GestureRecognizer:
+    """
+    Runs the tokens through a compiled gesture automaton, one table lookup per token.
+
+    A gesture that can not grow into a longer one is reported right away. Otherwise it is reported when no token
+    follows within `timeout_ms`, or when the next token does not continue it. Half finished sequences are dropped
+    after the same timeout.
+
+    Each token may come with a `source`, like the frame it was seen on. A gesture is reported with the source of
+    its last token, even when a timeout reports it later, and with the number of tokens it was made of, which
+    tells how often the last token of a repeating gesture came.
+    """
+
+    def __init__(self, automaton: GestureAutomaton, on_gesture: Callable[[str, Any, int], None],
+                 scheduler: TimeoutScheduler, timeout_ms: float = 750) -> None:
+        self.automaton = automaton
+        self.on_gesture = on_gesture
+        self.scheduler = scheduler
+        self.timeout_ms = timeout_ms
+
+        self._state = 0
+        # the source of the token that led to the current state, and the tokens that led there
+        self._source: Any = None
+        self._tokens = 0
+        self._timeout: Optional[int] = None
+        # tells a timeout that fired late, after the state has moved on, apart from the current one
+        self._generation = 0
+        # tokens come from both the camera and the sensor threads
+        self._lock = threading.Lock()
+
+    def feed(self, token: Token, now_ms: float, source: Any = None) -> None:
+        transitions, accepts = self.automaton
+
+        recognized: List[Tuple[str, Any, int]] = []
+        with self._lock:
+            next_state = transitions[self._state].get(token)
+            tokens = self._tokens + 1
+            if next_state is None:
+                # whatever was complete so far is done, and the token may start something new
+                if accepts[self._state]:
+                    recognized.append((accepts[self._state], self._source, self._tokens))
+                next_state = transitions[0].get(token, 0)
+                tokens = 1 if next_state else 0
+
+            if accepts[next_state] and not transitions[next_state]:
+                recognized.append((accepts[next_state], source, tokens))
+                next_state = tokens = 0
+
+            self._state = next_state
+            self._source = source
+            self._tokens = tokens
+            self._reschedule(now_ms)
+
+        for gesture, gesture_source, gesture_tokens in recognized:
+            self.on_gesture(gesture, gesture_source, gesture_tokens)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._state = self._tokens = 0
+            self._reschedule(None)
+
+    def _reschedule(self, now_ms: Optional[float]) -> None:
+        self._generation += 1
+        if self._timeout is not None:
+            self.scheduler.cancel(self._timeout)
+            self._timeout = None
+
+        if now_ms is not None and self._state != 0:
+            self._timeout = self.scheduler.schedule(now_ms + self.timeout_ms,
+                                                    functools.partial(self._expire, self._generation))
+
+    def _expire(self, generation: int) -> None:
+        with self._lock:
+            if generation != self._generation:
+                return
+
+            gesture, source, tokens = self.automaton.accepts[self._state], self._source, self._tokens
+            self._state = self._tokens = 0
+            self._timeout = None
+
+        if gesture:
+            self.on_gesture(gesture, source, tokens)
+
+
+class EyeTokenizer:
+    """Turns per-frame eye ratios into blink, long close and wink tokens, with a few comparisons per frame."""
+
+    def __init__(self, threshold: float, short_ms: float = 135, long_ms: float = 550) -> None:
+        self.threshold = threshold
+        self.short_ms = short_ms
+        self.long_ms = long_ms
+
+        # the current closure, None while the eyes are open
+        self._closed_since: Optional[float] = None
+        # when the current closure was first seen, later than `_closed_since` when the start was back-dated
+        self._seen_since: Optional[float] = None
+        self._both = self._left = self._right = False
+        self._long_sent = False
+
+        # how long the last closure lasted, and how many there were
+        self.last_closure_ms = 0.0
+        self.closures = 0
+
+    @property
+    def closed_since(self) -> Optional[float]:
+        """When the current closure began, None while the eyes are open."""
+        return self._closed_since
+
+    def feed(self, left_ratio: float, right_ratio: float, now_ms: float,
+             closed_after_ms: Optional[float] = None) -> Optional[Token]:
+        """
+        `closed_after_ms` is the earliest the eyes could have closed when the frames before this one were skipped.
+        A closure that starts on this frame is counted from there, but only once it has lasted `short_ms` from
+        this frame on, so the frames that were not seen can not make a blink out of a shorter closure.
+        """
+        # both eyes are judged by their average, like the blink algorithms do
+        both_closed = (left_ratio + right_ratio) / 2 > self.threshold
+        left_closed = left_ratio > self.threshold
+        right_closed = right_ratio > self.threshold
+
+        if both_closed or left_closed or right_closed:
+            if self._closed_since is None:
+                self._seen_since = now_ms
+                self._closed_since = now_ms if closed_after_ms is None else min(closed_after_ms, now_ms)
+                self._both = self._left = self._right = self._long_sent = False
+
+            self._both |= both_closed
+            self._left |= left_closed
+            self._right |= right_closed
+
+            if self._both and not self._long_sent and now_ms - self._seen_since >= self.short_ms and \
+                    now_ms - self._closed_since >= self.long_ms:
+                self._long_sent = True
+                return Token.LONG_CLOSE
+            return None
+
+        if self._closed_since is None:
+            return None
+
+        seen = now_ms - self._seen_since
+        duration = now_ms - self._closed_since if seen >= self.short_ms else seen
+        self._closed_since = self._seen_since = None
+        self.last_closure_ms = duration
+        self.closures += 1
+        if self._long_sent or duration < self.short_ms:
+            return None
+
+        if self._both:
+            return Token.BLINK
+        return Token.WINK_LEFT if self._left else Token.WINK_RIGHT
+
+
+class HeadTokenizer:
+    """
+    Turns head movement into a token when the head is tilted past `threshold` and back within `flick_ms`.
+    Holding a tilt to move the cursor is not a gesture.
+    """
+
+    def __init__(self, threshold: float = 250, flick_ms: float = 400) -> None:
+        self.threshold = threshold
+        self.flick_ms = flick_ms
+
+        # the direction the head has left the center to, and when
+        self._direction: Optional[Token] = None
+        self._since = 0.0
+
+    def feed(self, x: float, y: float, now_ms: float) -> Optional[Token]:
+        """x and y are relative to the calibrated center, y growing downwards."""
+        if abs(x) < self.threshold and abs(y) < self.threshold:
+            direction, self._direction = self._direction, None
+            if direction is not None and now_ms - self._since <= self.flick_ms:
+                return direction
+            return None
+
+        if self._direction is None:
+            if abs(x) >= abs(y):
+                self._direction = Token.HEAD_RIGHT if x > 0 else Token.HEAD_LEFT
+            else:
+                self._direction = Token.HEAD_DOWN if y > 0 else Token.HEAD_UP
+            self._since = now_ms
+
+        return None
@@ -0,0 +1,112 @@
+import bisect
+from typing import Dict, List, Optional, Sequence, Tuple
+
+__all__ = ['Counter', 'Gauge', 'Histogram', 'MetricsRegistry', 'METRICS']
+
+# seconds, from 0.5 ms to 1 s
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.02, 0.035, 0.05, 0.075, 0.1, 0.25, 0.5, 1.0)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _format_labels(labels: Labels, extra: str = "") -> str:
+    parts = [f'{key}="{value}"' for key, value in labels]
+    if extra:
+        parts.append(extra)
+
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Counter:
+    def __init__(self, labels: Labels = ()) -> None:
+        self.labels = labels
+        self.value = 0
+
+    def inc(self, amount: float = 1) -> None:
+        self.value += amount
+
+    def render(self, name: str) -> List[str]:
+        return [f"{name}{_format_labels(self.labels)} {self.value}"]
+
+
+class Gauge(Counter):
+    def set(self, value: float) -> None:
+        self.value = value
+
+
+class Histogram:
+    def __init__(self, labels: Labels = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> None:
+        self.labels = labels
+        self.buckets = tuple(buckets)
+
+        # the last one is +Inf. these are not cumulative, render() sums them up
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    def render(self, name: str) -> List[str]:
+        # copy first so the lines are consistent with each other even while observe() keeps running
+        counts, total = list(self.counts), self.sum
+
+        lines, cumulative = [], 0
+        for bound, count in zip(self.buckets + (float('inf'),), counts):
+            cumulative += count
+            le = '+Inf' if bound == float('inf') else repr(bound)
+            labels = _format_labels(self.labels, f'le="{le}"')
+            lines.append(f"{name}_bucket{labels} {cumulative}")
+
+        lines.append(f"{name}_sum{_format_labels(self.labels)} {total}")
+        lines.append(f"{name}_count{_format_labels(self.labels)} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    Holds the metrics of the running instance.
+
+    Metrics are meant to be created once and kept by the code that updates them. Updating is a plain
+    attribute write without any locks, and each metric should only be updated from one thread.
+    Rendering copies the values, so scraping never blocks the hot loops.
+    """
+
+    def __init__(self) -> None:
+        # name -> (type, help, {labels: metric})
+        self._metrics: Dict[str, Tuple[str, str, Dict[Labels, Counter]]] = {}
+
+    def counter(self, name: str, help_text: str, labels: Optional[Dict[str, str]] = None) -> Counter:
+        return self._get(Counter, "counter", name, help_text, labels)
+
+    def gauge(self, name: str, help_text: str, labels: Optional[Dict[str, str]] = None) -> Gauge:
+        return self._get(Gauge, "gauge", name, help_text, labels)
+
+    def histogram(self, name: str, help_text: str, labels: Optional[Dict[str, str]] = None) -> Histogram:
+        return self._get(Histogram, "histogram", name, help_text, labels)
+
+    def _get(self, cls, metric_type: str, name: str, help_text: str, labels: Optional[Dict[str, str]]):
+        labels = tuple(sorted((labels or {}).items()))
+
+        if name not in self._metrics.keys():
+            self._metrics[name] = metric_type, help_text, dict()
+
+        children = self._metrics[name][2]
+        if labels not in children.keys():
+            children[labels] = cls(labels)
+
+        return children[labels]
+
+    def render(self) -> str:
+        """Renders everything in Prometheus text format."""
+        lines = []
+        for name, (metric_type, help_text, children) in list(self._metrics.items()):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            for metric in list(children.values()):
+                lines.extend(metric.render(name))
+
+        return "\n".join(lines) + "\n"
+
+
+METRICS = MetricsRegistry()
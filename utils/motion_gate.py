@@ -0,0 +1,120 @@
+import logging
+from time import perf_counter
+from typing import Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+__all__ = ['MotionGate', 'eye_region']
+
+Rectangle = Tuple[int, int, int, int]  # x1, y1, x2, y2
+
+
+def eye_region(left_eye: Sequence[Tuple[int, int]], right_eye: Sequence[Tuple[int, int]],
+               image_shape: Tuple[int, ...], margin: float = 0.15) -> Optional[Rectangle]:
+    """The box around both eyes, with room for the lids and brows, clipped to the image."""
+    xs = [x for x, _ in left_eye] + [x for x, _ in right_eye]
+    ys = [y for _, y in left_eye] + [y for _, y in right_eye]
+
+    # closed eyes are flat, so the height is padded relative to the width
+    width = max(xs) - min(xs)
+    x1, x2 = int(min(xs) - width * margin), int(max(xs) + width * margin)
+    y1, y2 = int(min(ys) - width * margin * 2), int(max(ys) + width * margin * 2)
+
+    height, image_width = image_shape[:2]
+    x1, y1, x2, y2 = max(x1, 0), max(y1, 0), min(x2, image_width), min(y2, height)
+    if x2 - x1 < 2 or y2 - y1 < 2:
+        return None
+
+    return x1, y1, x2, y2
+
+
+class MotionGate:
+    """
+    Decides whether the last landmarks still hold for a new frame.
+
+    The eye region of the frame the landmarks came from is kept as a small thumbnail. A new frame whose thumbnail
+    differs from it by less than `threshold` gray levels on average reuses them, except that every
+    `refresh_interval`th frame in a row is inferred anyway. Comparing with that frame, not the previous one,
+    keeps a slow closing of the eyes from slipping through a frame at a time.
+    """
+
+    def __init__(self, threshold: float = 2.5, refresh_interval: int = 4,
+                 thumbnail_size: Tuple[int, int] = (32, 12)) -> None:
+        self.threshold = threshold
+        self.refresh_interval = refresh_interval
+        self.thumbnail_size = thumbnail_size
+
+        # the region and thumbnail of the frame the landmarks came from
+        self._region: Optional[Rectangle] = None
+        self._reference = np.empty(thumbnail_size[::-1], dtype=np.uint8)
+        # reused every frame
+        self._thumbnail = np.empty_like(self._reference)
+        self._difference = np.empty_like(self._reference)
+        self._reused_in_a_row = 0
+
+        # stats
+        self.reused_frames = 0
+        self.inferred_frames = 0
+        self.refreshed_frames = 0
+        self._average_cost = 0.0
+        self._gate_time = 0.0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.reused_frames + self.inferred_frames
+        return self.reused_frames / total if total else 0.0
+
+    @property
+    def cpu_time_saved(self) -> float:
+        """Estimated inference time saved by reusing landmarks, minus the time spent comparing, in seconds."""
+        return self.reused_frames * self._average_cost - self._gate_time
+
+    def _make_thumbnail(self, image: np.ndarray, region: Rectangle, dst: np.ndarray) -> None:
+        x1, y1, x2, y2 = region
+        cv2.resize(image[y1:y2, x1:x2], self.thumbnail_size, dst=dst, interpolation=cv2.INTER_AREA)
+
+    def should_reuse(self, image: np.ndarray) -> bool:
+        """Whether the landmarks of the reference frame can be used for `image`. Counts the frame either way."""
+        if self._region is None:
+            self.inferred_frames += 1
+            return False
+
+        if self._reused_in_a_row + 1 >= self.refresh_interval:
+            self.inferred_frames += 1
+            self.refreshed_frames += 1
+            return False
+
+        started = perf_counter()
+        self._make_thumbnail(image, self._region, self._thumbnail)
+        cv2.absdiff(self._thumbnail, self._reference, dst=self._difference)
+        unchanged = cv2.mean(self._difference)[0] < self.threshold
+        self._gate_time += perf_counter() - started
+
+        if not unchanged:
+            self.inferred_frames += 1
+            return False
+
+        self._reused_in_a_row += 1
+        self.reused_frames += 1
+        return True
+
+    def set_reference(self, image: np.ndarray, region: Optional[Rectangle], cost: float) -> None:
+        """Keeps the eye region of an inferred frame (None if no eyes were found) and what inferring it cost."""
+        self._average_cost += (cost - self._average_cost) * 0.05
+        self._reused_in_a_row = 0
+
+        self._region = region
+        if region is not None:
+            self._make_thumbnail(image, region, self._reference)
+
+    def reset(self) -> None:
+        self._region = None
+        self._reused_in_a_row = 0
+
+    def log_summary(self) -> None:
+        total = self.reused_frames + self.inferred_frames
+        if total:
+            logging.info(f"Reused the landmarks of {self.reused_frames} of {total} frames "
+                         f"({self.refreshed_frames} forced refreshes), "
+                         f"saving an estimated {self.cpu_time_saved:.1f} s of CPU time.")
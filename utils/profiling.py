@@ -0,0 +1,202 @@
+import argparse
+import cProfile
+import json
+import logging
+import os
+import signal
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from typing import Dict, Optional
+
+__all__ = ['LoopProfiler', 'PROFILER']
+
+TARGETS = ("camera", "sensor")
+MODES = ("cprofile", "sampling")
+# what `request_from_another_process` writes
+REQUEST_KEYS = {"target", "mode", "iterations"}
+
+
+def _request_path(pid: int) -> str:
+    return os.path.join(tempfile.gettempdir(), f"cursor-control-profile-{pid}.json")
+
+
+class _ProfileSession:
+    def __init__(self, target: str, mode: str, iterations: int, output_dir: str) -> None:
+        self.target = target
+        self.mode = mode
+        self.iterations = iterations
+        self.output_dir = output_dir
+        self.done = 0
+
+        self.profile = cProfile.Profile() if mode == "cprofile" else None
+
+        # sampling
+        self.thread_id: Optional[int] = None
+        self.inside = False
+        self.samples: Counter = Counter()
+        self.sampler: Optional[threading.Thread] = None
+        self.finished = threading.Event()
+
+    def begin(self) -> None:
+        if self.profile:
+            self.profile.enable()
+            return
+
+        if self.sampler is None:
+            self.thread_id = threading.get_ident()
+            self.sampler = threading.Thread(target=self._sample, name=f"{self.target}-sampler", daemon=True)
+            self.sampler.start()
+
+        self.inside = True
+
+    def end(self) -> bool:
+        """Returns whether the session has seen enough iterations."""
+        if self.profile:
+            self.profile.disable()
+        else:
+            self.inside = False
+
+        self.done += 1
+        return self.done >= self.iterations
+
+    def _sample(self, interval: float = 0.001) -> None:
+        while not self.finished.is_set():
+            if self.inside:
+                frame = sys._current_frames().get(self.thread_id)
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+
+                # the sampler itself is never in the stack since it reads another thread
+                self.samples[";".join(reversed(stack))] += 1
+
+            time.sleep(interval)
+
+    def save(self) -> str:
+        name = f"profile-{self.target}-{datetime.now():%Y%m%d-%H%M%S}"
+
+        if self.profile:
+            path = os.path.join(self.output_dir, f"{name}.pstats")
+            self.profile.dump_stats(path)
+        else:
+            self.finished.set()
+            path = os.path.join(self.output_dir, f"{name}.collapsed")
+            with open(path, "w") as f:
+                # flamegraph.pl, speedscope and inferno all read this format
+                for stack, count in self.samples.most_common():
+                    f.write(f"{stack} {count}\n")
+
+        return path
+
+
+class LoopProfiler:
+    """
+    Profiles the next N iterations of a hot loop when asked to, without restarting.
+
+    Loops call `begin` and `end` around each iteration. While nothing is requested that is a single
+    attribute check. `cprofile` mode writes a pstats file, `sampling` mode samples the loop's stack from
+    a side thread and writes collapsed stacks for flame graphs.
+    """
+
+    def __init__(self, output_dir: str = ".") -> None:
+        self.output_dir = output_dir
+
+        # target -> session, pending until the loop picks it up
+        self._pending: Dict[str, _ProfileSession] = {}
+        self._active: Dict[str, _ProfileSession] = {}
+        # reentrant, since the signal handler runs on the main thread which may be holding it
+        self._lock = threading.RLock()
+        self.idle = True
+
+    def request(self, target: str = "camera", mode: str = "cprofile", iterations: int = 300) -> None:
+        if target not in TARGETS or mode not in MODES:
+            logging.error(f"Can not profile {target} with {mode}.")
+            return
+        if not isinstance(iterations, int) or iterations < 1:
+            logging.error(f"Can not profile {iterations} iterations.")
+            return
+
+        logging.info(f"Profiling the next {iterations} {target} iterations with {mode}.")
+        with self._lock:
+            self._pending[target] = _ProfileSession(target, mode, iterations, self.output_dir)
+            self.idle = False
+
+    def begin(self, target: str) -> None:
+        if self.idle:
+            return
+
+        session = self._active.get(target)
+        if session is None:
+            session = self._pending.pop(target, None)
+            if session is None:
+                return
+            self._active[target] = session
+
+        session.begin()
+
+    def end(self, target: str) -> None:
+        if self.idle:
+            return
+
+        session = self._active.get(target)
+        if session is None or not session.end():
+            return
+
+        with self._lock:
+            del self._active[target]
+            self.idle = not self._active and not self._pending
+
+        logging.info(f"Wrote the {target} profile to {session.save()}.")
+
+    def install_signal_handler(self) -> None:
+        """Starts profiling on SIGUSR1, with the parameters written by `request_from_another_process`."""
+        if not hasattr(signal, "SIGUSR1"):
+            return  # no such signal on Windows
+
+        def handler(signum, frame) -> None:
+            # anyone can send the signal and write the file, and raising here would end the main thread
+            path = _request_path(os.getpid())
+            try:
+                with open(path) as f:
+                    request = json.load(f)
+                os.remove(path)
+            except FileNotFoundError:
+                request = {}
+            except (OSError, ValueError) as e:
+                logging.error(f"Could not read the profile request in {path}: {e}")
+                return
+
+            if not isinstance(request, dict) or not set(request.keys()) <= REQUEST_KEYS:
+                logging.error(f"Ignoring the profile request in {path}, expected only {', '.join(sorted(REQUEST_KEYS))}.")
+                return
+
+            self.request(**request)
+
+        signal.signal(signal.SIGUSR1, handler)
+
+
+def request_from_another_process(pid: int, target: str, mode: str, iterations: int) -> None:
+    with open(_request_path(pid), "w") as f:
+        json.dump({"target": target, "mode": mode, "iterations": iterations}, f)
+
+    os.kill(pid, signal.SIGUSR1)
+
+
+PROFILER = LoopProfiler()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Asks a running instance to profile one of its hot loops.")
+    parser.add_argument('pid', type=int)
+    parser.add_argument('--target', choices=TARGETS, default="camera")
+    parser.add_argument('--mode', choices=MODES, default="cprofile")
+    parser.add_argument('--iterations', type=int, default=300)
+    args = parser.parse_args()
+
+    request_from_another_process(args.pid, args.target, args.mode, args.iterations)
@@ -0,0 +1,221 @@
+import argparse
+import csv
+import logging
+import time
+from typing import Dict, Optional, Sequence, Tuple
+
+from .gestures import EyeTokenizer, Token
+
+__all__ = ['CaptureRateGovernor', 'evaluate_session']
+
+
+class CaptureRateGovernor:
+    """
+    Decides which camera frames get processed.
+
+    Every frame is processed while the eyes are moving. After the eye ratio has been calm for a while,
+    frames are only processed every `idle_interval_ms`, and the first ratio change switches back instantly.
+    On top of that, the idle interval is stretched whenever the process uses more CPU than `cpu_ceiling`.
+
+    A closure that begins while frames are skipped is first seen late, so `skipped_since` tells when the first
+    frame skipped before the current one came in, for the eye tokenizer to count a long enough closure from there.
+    """
+
+    def __init__(self, blink_threshold: float,
+                 active_interval_ms: float = 0.0,
+                 idle_interval_ms: float = 50.0,
+                 calm_after_ms: float = 1500.0,
+                 change_ratio: float = 0.15,
+                 cpu_ceiling: Optional[float] = None,
+                 cpu_window_s: float = 1.0) -> None:
+        self.blink_threshold = blink_threshold
+        self.active_interval = active_interval_ms / 1000
+        self.idle_interval = idle_interval_ms / 1000
+        self.calm_after = calm_after_ms / 1000
+        # relative deviation from the open eye baseline that counts as the beginning of a change
+        self.change_ratio = change_ratio
+        # in cores, i.e. 0.5 is half of one core
+        self.cpu_ceiling = cpu_ceiling
+        self.cpu_window = cpu_window_s
+
+        self._baseline: Optional[float] = None
+        self._last_processed = float('-inf')
+        self._active_until = float('-inf')
+
+        # the first frame skipped since the last processed one
+        self._first_skipped: Optional[float] = None
+        self.skipped_since: Optional[float] = None
+
+        # cpu ceiling
+        self._cpu_penalty = 0.0
+        self._cpu_window_start = (time.perf_counter(), time.process_time())
+
+        # stats
+        self.processed_frames = 0
+        self.skipped_frames = 0
+        self._average_cost = 0.0
+
+    @property
+    def is_active(self) -> bool:
+        return self._last_processed < self._active_until
+
+    @property
+    def interval(self) -> float:
+        """Minimum time between two processed frames, in seconds."""
+        # moving eyes are never throttled, that is when the gestures happen
+        if self.is_active:
+            return self.active_interval
+
+        return self.idle_interval + self._cpu_penalty
+
+    @property
+    def cpu_time_saved(self) -> float:
+        """Estimated processing time saved by skipping frames, in seconds."""
+        return self.skipped_frames * self._average_cost
+
+    def should_process(self, now: float) -> bool:
+        if now - self._last_processed < self.interval:
+            self.skipped_frames += 1
+            if self._first_skipped is None:
+                self._first_skipped = now
+            return False
+
+        self._last_processed = now
+        self.skipped_since, self._first_skipped = self._first_skipped, None
+        self.processed_frames += 1
+        return True
+
+    def observe(self, ratio: Optional[float], now: float, cost: float = 0.0) -> None:
+        """Feeds the average eye ratio of a processed frame (None if there was no face) and its processing cost."""
+        self._average_cost += (cost - self._average_cost) * 0.05
+
+        if ratio is not None:
+            # also when a degenerate frame left it at 0
+            if not self._baseline:
+                self._baseline = ratio
+
+            deviation = abs(ratio - self._baseline) / self._baseline if self._baseline else 0.0
+            if deviation > self.change_ratio or ratio > self.blink_threshold:
+                self._active_until = now + self.calm_after
+            else:
+                # only learn the baseline from open and steady eyes
+                self._baseline += (ratio - self._baseline) * 0.1
+
+        if self.cpu_ceiling is not None:
+            self._enforce_cpu_ceiling()
+
+    def _enforce_cpu_ceiling(self) -> None:
+        wall_start, cpu_start = self._cpu_window_start
+        wall, cpu = time.perf_counter(), time.process_time()
+        if wall - wall_start < self.cpu_window:
+            return
+
+        utilisation = (cpu - cpu_start) / (wall - wall_start)
+        if utilisation > self.cpu_ceiling:
+            self._cpu_penalty = min(self._cpu_penalty * 1.5 + 0.005, 1.0)
+            logging.debug(f"CPU utilisation is {utilisation:.2f}, "
+                          f"stretching the capture interval by {self._cpu_penalty * 1000:.0f} ms.")
+        else:
+            self._cpu_penalty *= 0.5
+
+        self._cpu_window_start = (wall, cpu)
+
+    def log_summary(self) -> None:
+        total = self.processed_frames + self.skipped_frames
+        if total:
+            logging.info(f"Processed {self.processed_frames} of {total} frames, "
+                         f"saving an estimated {self.cpu_time_saved:.1f} s of CPU time.")
+
+
+def evaluate_session(timestamps_ms: Sequence[float], ratios: Sequence[Optional[float]],
+                     blink_threshold: float, frame_cost_ms: float, short_ms: float = 135, long_ms: float = 550,
+                     **governor_kwargs) -> Dict[str, float]:
+    """
+    Replays the eye ratios of a recorded session through the governor and the eye tokenizer.
+
+    Every closure is tokenized twice, once from every frame and once from the frames the governor processes,
+    with their start back-dated the way the live loop does it. Reports the CPU time saved against how late each
+    blink was first seen, the blinks that were lost or made up, and how much shorter each blink was measured
+    than from every frame.
+    """
+    governor = CaptureRateGovernor(blink_threshold, **governor_kwargs)
+    every_frame = EyeTokenizer(blink_threshold, short_ms, long_ms)
+    governed = EyeTokenizer(blink_threshold, short_ms, long_ms)
+
+    # closure number -> the token it became and how long it was measured, in ms
+    reference: Dict[int, Tuple[Optional[Token], float]] = {}
+    measured: Dict[int, Tuple[Optional[Token], float]] = {}
+    # closure number -> how long after it began a processed frame first saw it, in ms
+    delays: Dict[int, float] = {}
+
+    for timestamp, ratio in zip(timestamps_ms, ratios):
+        now = timestamp / 1000
+
+        # frames without a face do not reach the tokenizer in the live loop either
+        if ratio is not None:
+            token = every_frame.feed(ratio, ratio, timestamp)
+            if every_frame.closures > len(reference):
+                reference[every_frame.closures] = (token, every_frame.last_closure_ms)
+
+        if not governor.should_process(now):
+            continue
+
+        governor.observe(ratio, now, frame_cost_ms / 1000)
+        if ratio is None:
+            continue
+
+        # the closure in progress, numbered the way it will be once it ends
+        closure = every_frame.closures + 1
+        if every_frame.closed_since is not None and ratio > blink_threshold and closure not in delays:
+            delays[closure] = timestamp - every_frame.closed_since
+
+        closed_after_ms = governor.skipped_since * 1000 if governor.skipped_since is not None else None
+        closures = governed.closures
+        token = governed.feed(ratio, ratio, timestamp, closed_after_ms)
+        if governed.closures > closures:
+            # the reference has seen this closure end by now, so it has the same number there
+            measured[every_frame.closures] = (token, governed.last_closure_ms)
+
+    blinks = [closure for closure, (token, _) in reference.items() if token == Token.BLINK]
+    missed = [closure for closure in blinks if measured.get(closure, (None,))[0] != Token.BLINK]
+    extra = [closure for closure, (token, _) in measured.items()
+             if token == Token.BLINK and reference[closure][0] != Token.BLINK]
+    lost = [reference[closure][1] - measured[closure][1] for closure in blinks if closure in measured]
+    late = [delays[closure] for closure in blinks if closure in delays]
+
+    return {
+        "frames": len(timestamps_ms),
+        "processed_frames": governor.processed_frames,
+        "cpu_saved_ms": governor.skipped_frames * frame_cost_ms,
+        "cpu_saved_fraction": governor.skipped_frames / max(len(timestamps_ms), 1),
+        "blinks": len(blinks),
+        "worst_blink_delay_ms": max(late, default=0.0),
+        "average_blink_delay_ms": sum(late) / len(late) if late else 0.0,
+        "missed_blinks": len(missed),
+        "extra_blinks": len(extra),
+        "worst_duration_lost_ms": max(lost, default=0.0),
+        "average_duration_lost_ms": sum(lost) / len(lost) if lost else 0.0,
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Evaluates the capture rate governor on recorded eye ratios.")
+    parser.add_argument('session', help="CSV file with timestamp_ms and ratio columns. Empty ratio means no face.")
+    parser.add_argument('--threshold', type=float, default=6.5)
+    parser.add_argument('--short-ms', type=float, default=135.0, help="Shortest closure that is a blink.")
+    parser.add_argument('--frame-cost-ms', type=float, default=30.0)
+    parser.add_argument('--idle-interval-ms', type=float, default=50.0)
+    parser.add_argument('--calm-after-ms', type=float, default=1500.0)
+    args = parser.parse_args()
+
+    with open(args.session, newline='') as f:
+        rows = list(csv.DictReader(f))
+
+    report = evaluate_session(
+        [float(row['timestamp_ms']) for row in rows],
+        [float(row['ratio']) if row['ratio'] else None for row in rows],
+        blink_threshold=args.threshold, frame_cost_ms=args.frame_cost_ms, short_ms=args.short_ms,
+        idle_interval_ms=args.idle_interval_ms, calm_after_ms=args.calm_after_ms)
+
+    for key, value in report.items():
+        print(f"{key}: {value}")
@@ -0,0 +1,158 @@
+import ctypes
+import logging
+import os
+import sys
+import threading
+from typing import Dict, FrozenSet, Iterable, Optional, Set
+
+import cv2
+
+__all__ = ['SchedulingProfile', 'SCHEDULING', 'parse_cpus']
+
+# where each piece of the pipeline runs:
+#   camera   capture and detection, the main thread or the runtime's camera executor
+#   sensor   the BLE library's callback thread
+#   hotkeys  the key poller of the threaded loops
+#   loop     the asyncio loop, which also moves the cursor. its clicks run on a thread it starts
+#   startup  the threads that open the devices and load the models
+STAGES = ("camera", "sensor", "hotkeys", "loop", "startup")
+
+# Linux prctl option that names the calling thread, as top -H and perf show it
+PR_SET_NAME = 15
+
+
+def parse_cpus(spec: str) -> FrozenSet[int]:
+    """'0,2-3' -> {0, 2, 3}"""
+    cpus: Set[int] = set()
+    for part in spec.split(","):
+        first, _, last = part.partition("-")
+        cpus.update(range(int(first), int(last or first) + 1))
+
+    return frozenset(cpus)
+
+
+def _set_os_thread_name(name: str) -> None:
+    if not sys.platform.startswith("linux"):
+        return
+
+    try:
+        ctypes.CDLL(None).prctl(PR_SET_NAME, name.encode()[:15], 0, 0, 0)
+    except (OSError, AttributeError):
+        pass
+
+
+class SchedulingProfile(object):
+    """
+    Where and how urgently each stage's thread runs.
+
+    Stages call `apply` once from their own thread. Threads other than the main one are always named after their
+    stage; pinning to CPUs, a higher priority for the input and output stages and the size of OpenCV's thread pool
+    are only changed when configured, and only where the platform allows it. Raising a priority needs CAP_SYS_NICE
+    on Linux, without it the stage keeps running at the default priority.
+    """
+
+    def __init__(self) -> None:
+        # stage -> CPUs its thread may run on
+        self.affinity: Dict[str, FrozenSet[int]] = {}
+        # stages that run with a lower nice value, by `priority_boost`
+        self.elevated: FrozenSet[str] = frozenset()
+        self.priority_boost = 5
+        self.opencv_threads: Optional[int] = None
+
+        # what the process started with. new threads inherit their creator's placement and priority on Linux,
+        # so stages that are not configured are put back to these
+        self._default_cpus: Optional[FrozenSet[int]] = None
+        self._default_nice = 0
+
+        self._lock = threading.Lock()
+        self._warned: Set[str] = set()
+
+    @property
+    def is_default(self) -> bool:
+        return not self.affinity and not self.elevated and self.opencv_threads is None
+
+    def configure(self, affinity: Optional[Dict[str, Iterable[int]]] = None, elevated: Iterable[str] = (),
+                  priority_boost: int = 5, opencv_threads: Optional[int] = None) -> None:
+        for stage in list((affinity or {}).keys()) + list(elevated):
+            if stage not in STAGES:
+                raise ValueError(f"Unknown stage {stage}, expected one of {', '.join(STAGES)}.")
+
+        if hasattr(os, "sched_getaffinity"):
+            self._default_cpus = frozenset(os.sched_getaffinity(0))
+        if hasattr(os, "getpriority"):
+            self._default_nice = os.getpriority(os.PRIO_PROCESS, 0)
+
+        self.affinity = {stage: frozenset(cpus) for stage, cpus in (affinity or {}).items()}
+        self.elevated = frozenset(elevated)
+        self.priority_boost = priority_boost
+
+        # OpenCV's pool runs next to dlib on the camera's CPUs, more threads than those only compete with each other
+        if opencv_threads is None and "camera" in self.affinity:
+            opencv_threads = len(self.affinity["camera"])
+        self.opencv_threads = opencv_threads
+        if opencv_threads is not None:
+            cv2.setNumThreads(opencv_threads)
+
+    def configure_realtime(self, opencv_threads: Optional[int] = None) -> None:
+        """The first CPU for the input and output stages, at a higher priority, the rest for the camera."""
+        cpus = sorted(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else list(range(os.cpu_count()))
+        if len(cpus) < 2:
+            self.configure(elevated=("sensor", "loop"), opencv_threads=opencv_threads)
+            return
+
+        io_cpus, camera_cpus = cpus[:1], cpus[1:]
+        self.configure(affinity={"camera": camera_cpus, "sensor": io_cpus, "hotkeys": io_cpus, "loop": io_cpus},
+                       elevated=("sensor", "loop"), opencv_threads=opencv_threads)
+
+    def apply(self, stage: str) -> None:
+        """
+        Applies the stage's placement and priority to the calling thread, and names it after `stage` unless it is
+        the main thread.
+        """
+        thread = threading.current_thread()
+        # renaming the main thread renames the process, and ps or pkill would no longer find it as python
+        if thread is not threading.main_thread():
+            thread.name = stage
+            _set_os_thread_name(stage)
+
+        if self.is_default:
+            return
+
+        cpus = self.affinity.get(stage, self._default_cpus)
+        if cpus and hasattr(os, "sched_setaffinity"):
+            try:
+                # 0 is the calling thread on Linux
+                os.sched_setaffinity(0, cpus)
+            except OSError as e:
+                self._warn_once(f"affinity-{stage}", f"Could not pin {stage} to CPUs {sorted(cpus)}: {e}")
+
+        # nice values are per thread only on Linux, elsewhere this would change the whole process
+        if self.elevated and sys.platform.startswith("linux"):
+            boost = self.priority_boost if stage in self.elevated else 0
+            try:
+                os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), self._default_nice - boost)
+            except OSError as e:
+                self._warn_once(f"priority-{stage}", f"Could not raise the priority of {stage}: {e}")
+
+    def _warn_once(self, key: str, message: str) -> None:
+        with self._lock:
+            if key in self._warned:
+                return
+            self._warned.add(key)
+
+        logging.warning(message)
+
+    def describe(self) -> str:
+        if self.is_default:
+            return "default scheduling"
+
+        parts = [f"{stage} on CPUs {','.join(map(str, sorted(cpus)))}" for stage, cpus in self.affinity.items()]
+        if self.elevated:
+            parts.append(f"{', '.join(sorted(self.elevated))} at nice -{self.priority_boost}")
+        if self.opencv_threads is not None:
+            parts.append(f"{self.opencv_threads} OpenCV threads")
+
+        return "; ".join(parts)
+
+
+SCHEDULING = SchedulingProfile()
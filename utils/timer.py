@@ -1,24 +1,46 @@
 import logging
+from collections import deque
 from time import perf_counter
+from typing import Deque, Dict, Iterable, List, Optional, Tuple
 
 import matplotlib.pyplot as plt
 
-__all__ = ['Timer']
+from .metrics import METRICS, Histogram
+from .tracing import TRACER
+
+__all__ = ['Timer', 'percentile']
+
+
+def percentile(values: Iterable[float], p: float) -> float:
+    """Nearest-rank percentile, p being between 0 and 100."""
+    values = sorted(values)
+    if not values:
+        return 0.0
+
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
 
 
 class Timer:
-    def __init__(self):
+    def __init__(self, name: Optional[str] = None, history: int = 3000):
         self._beginning = None
         self._last_time = None
 
-        self._time_data = dict()
+        # the last `history` (frame, seconds) of each process for the graph, and totals for the averages.
+        # the timer lives as long as the app, so nothing here may grow with the number of frames
+        self.history = history
+        self._time_data: Dict[str, Deque[Tuple[int, float]]] = dict()
+        self._totals: Dict[str, List[float]] = dict()
+
+        # named timers also export their stage latencies
+        self.name = name
+        self._histograms: Dict[str, Histogram] = dict()
 
     def start(self, set_beginning: bool = False):
         self._last_time = perf_counter()
         if not self._beginning or set_beginning:
             self._beginning = self._last_time
 
-    def capture(self, process_name: str, frame: int, use_beginning: bool = False):
+    def capture(self, process_name: str, frame: int, use_beginning: bool = False) -> float:
         if not self._last_time:
             raise Exception("You need to start the timer before ending it.")
 
@@ -29,19 +51,37 @@ class Timer:
             last_time = self._last_time
 
         if process_name not in self._time_data.keys():
-            self._time_data[process_name] = dict()
+            self._time_data[process_name] = deque(maxlen=self.history)
+            self._totals[process_name] = [0, 0.0]
 
-        self._time_data[process_name][frame] = now - last_time
+        self._time_data[process_name].append((frame, now - last_time))
+        totals = self._totals[process_name]
+        totals[0] += 1
+        totals[1] += now - last_time
         self._last_time = now
 
-    def show_graph(self):
-        # remove the first frame of face detection
-        # because it initially takes too long for some reason
-        self._time_data["face_detection"].pop(1)
-        self._time_data["total"].pop(1)
+        if self.name:
+            if process_name not in self._histograms.keys():
+                self._histograms[process_name] = METRICS.histogram(
+                    "pipeline_stage_seconds", "Processing time of each pipeline stage.",
+                    {"loop": self.name, "stage": process_name})
 
+            self._histograms[process_name].observe(now - last_time)
+
+        if TRACER.enabled:
+            TRACER.record(process_name, last_time, now, frame)
+
+        return now - last_time
+
+    def show_graph(self):
         for processing_type, values in self._time_data.items():
-            plt.plot(values.keys(), values.values(), label=processing_type, linewidth=1.0)
+            # remove the first frame of face detection
+            # because it initially takes too long for some reason
+            points = [(frame, seconds) for frame, seconds in values
+                      if frame != 1 or processing_type not in ("face_detection", "total")]
+            if points:
+                frames, seconds = zip(*points)
+                plt.plot(frames, seconds, label=processing_type, linewidth=1.0)
 
         plt.title("Processing Times")
         plt.ylabel("Seconds")
@@ -49,5 +89,5 @@ class Timer:
         plt.legend()
         plt.show()
 
-        for processing_type, values in self._time_data.items():
-            logging.info(f"Average {processing_type} processing time: {sum(values.values()) / len(values)}")
+        for processing_type, (count, total) in self._totals.items():
+            logging.info(f"Average {processing_type} processing time: {total / count}")
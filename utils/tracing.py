@@ -0,0 +1,95 @@
+import itertools
+import json
+import logging
+import os
+import threading
+from typing import List, Optional, Tuple
+
+__all__ = ['Tracer', 'TRACER']
+
+
+class Tracer:
+    """
+    Records timed spans into a preallocated ring buffer and dumps them as Chrome trace events.
+
+    Spans carry the id and capture time of the frame they belong to, so a cursor action can be
+    followed back to the frame that caused it. Frame ids start at 1, spans of frame 0 belong to no frame.
+    When disabled, `record` returns right away.
+    """
+
+    def __init__(self, capacity: int = 65536, enabled: bool = False) -> None:
+        self.enabled = enabled
+        self.capacity = capacity
+
+        # the frame being processed right now
+        self.frame_id = 0
+        self.captured_at = 0.0
+
+        self._names: List[Optional[str]] = [None] * capacity
+        self._frame_ids: List[int] = [0] * capacity
+        self._captured_ats: List[float] = [0.0] * capacity
+        self._starts: List[float] = [0.0] * capacity
+        self._ends: List[float] = [0.0] * capacity
+        self._thread_ids: List[int] = [0] * capacity
+
+        # next() on a count is atomic, so threads never get the same slot
+        self._counter = itertools.count()
+        self._recorded = 0
+
+    def begin_frame(self, frame_id: int, captured_at: float) -> None:
+        self.frame_id = frame_id
+        self.captured_at = captured_at
+
+    @property
+    def current_frame(self) -> Tuple[int, float]:
+        """The id and capture time of the frame being processed, to hand to work that finishes later."""
+        return self.frame_id, self.captured_at
+
+    def record(self, name: str, start: float, end: float, frame_id: Optional[int] = None,
+               captured_at: Optional[float] = None) -> None:
+        """Records a span between two `perf_counter` readings, by default for the current frame."""
+        if not self.enabled:
+            return
+
+        index = next(self._counter)
+        slot = index % self.capacity
+
+        self._names[slot] = name
+        self._frame_ids[slot] = self.frame_id if frame_id is None else frame_id
+        self._captured_ats[slot] = self.captured_at if captured_at is None else captured_at
+        self._starts[slot] = start
+        self._ends[slot] = end
+        self._thread_ids[slot] = threading.get_ident()
+        self._recorded = index + 1
+
+    def dump(self, path: str) -> None:
+        """Writes the recorded spans in Chrome trace-event format, to be opened in chrome://tracing or Perfetto."""
+        recorded = self._recorded
+        first = max(0, recorded - self.capacity)
+
+        events = []
+        for index in range(first, recorded):
+            slot = index % self.capacity
+            if self._names[slot] is None:
+                continue
+
+            events.append({
+                "name": self._names[slot],
+                "ph"  : "X",
+                "ts"  : self._starts[slot] * 1e6,
+                "dur" : (self._ends[slot] - self._starts[slot]) * 1e6,
+                "pid" : os.getpid(),
+                "tid" : self._thread_ids[slot],
+                "args": {
+                    "frame"            : self._frame_ids[slot],
+                    "since_capture_ms": (self._ends[slot] - self._captured_ats[slot]) * 1000,
+                },
+            })
+
+        with open(path, "w") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+
+        logging.info(f"Wrote {len(events)} trace spans to {path}.")
+
+
+TRACER = Tracer()